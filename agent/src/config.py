@@ -11,5 +11,33 @@ MQTT_BROKER_HOST = os.environ.get('MQTT_BROKER_HOST') or 'mqtt'
 MQTT_BROKER_PORT = try_parse(int, os.environ.get('MQTT_BROKER_PORT')) or 1883
 MQTT_TOPIC = os.environ.get('MQTT_TOPIC') or 'agent'
 MQTT_PARKING_TOPIC = os.environ.get('MQTT_PARKING_TOPIC') or 'parking'
+# Number of topic partitions: data is published to MQTT_TOPIC/<agent_id % N>/<agent_id> (0 - to MQTT_TOPIC itself)
+MQTT_TOPIC_PARTITIONS = try_parse(int, os.environ.get('MQTT_TOPIC_PARTITIONS')) or 0
 # Delay for sending data to mqtt in seconds
-DELAY = try_parse(float, os.environ.get('DELAY')) or 1
\ No newline at end of file
+DELAY = try_parse(float, os.environ.get('DELAY')) or 1
+# Agent identity (included in every message)
+AGENT_ID = try_parse(int, os.environ.get('AGENT_ID')) or 0
+# Fleet simulator: number of virtual agents (0 or 1 - single agent mode)
+FLEET_SIZE = try_parse(int, os.environ.get('FLEET_SIZE')) or 0
+# Fleet simulator: number of MQTT connections shared by virtual agents
+FLEET_CONNECTIONS = try_parse(int, os.environ.get('FLEET_CONNECTIONS')) or 4
+# Fleet simulator: max GPS route offset of a virtual agent in degrees
+FLEET_GPS_JITTER = try_parse(float, os.environ.get('FLEET_GPS_JITTER')) or 0.001
+# Fleet simulator: stats report interval in seconds
+FLEET_REPORT_INTERVAL = try_parse(float, os.environ.get('FLEET_REPORT_INTERVAL')) or 5
+# Fleet simulator: run duration in seconds (0 - run until stopped)
+FLEET_DURATION = try_parse(float, os.environ.get('FLEET_DURATION')) or 0
+# Recorded sensor rate in Hz (defaults to 1 / DELAY)
+RATE = try_parse(float, os.environ.get('RATE')) or 1 / DELAY
+# Replay speed-up factor relative to the recorded rate
+SPEEDUP = try_parse(float, os.environ.get('SPEEDUP')) or 1
+# Max MQTT publishes per second per topic; above it samples are sent in timestamped batches
+MAX_PUBLISH_RATE = try_parse(float, os.environ.get('MAX_PUBLISH_RATE')) or 200
+# Samples per batched frame (0 - batch only when the rate is above MAX_PUBLISH_RATE)
+BATCH_SIZE = try_parse(int, os.environ.get('BATCH_SIZE')) or 0
+# Lag in seconds after which the scheduler drops missed ticks (0 - catch up on everything)
+MAX_LAG = try_parse(float, os.environ.get('MAX_LAG')) or 0
+# Scheduler stats report interval in seconds
+STATS_INTERVAL = try_parse(float, os.environ.get('STATS_INTERVAL')) or 10
+# Wire codec for MQTT messages: json, msgpack or struct
+WIRE_CODEC = os.environ.get('WIRE_CODEC') or 'json'
@@ -1,20 +1,16 @@
-import random
-import csv
-
-def generate_parking_row(rows_number: int):
-    rows = [['empty_count', 'longitude', 'latitude']]
-
-    for _ in range(rows_number):
-        row = [int(random.uniform(10, 50)), random.uniform(10, 50), random.uniform(10, 50)]
-        rows.append(row)
+import numpy as np
 
+def generate_parking_row(rows_number: int, seed=None):
+    rng = np.random.default_rng(seed)
+    rows = np.column_stack([
+        rng.uniform(10, 50, rows_number).astype(int),
+        rng.uniform(10, 50, rows_number),
+        rng.uniform(10, 50, rows_number),
+    ])
     return rows
 
 file_path = "./parking.csv"
 rows_number = 1500
 rows = generate_parking_row(rows_number)
 
-
-with open(file_path, 'w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerows(rows)
+np.savetxt(file_path, rows, fmt=["%d", "%s", "%s"], delimiter=",", header="empty_count,longitude,latitude", comments="")
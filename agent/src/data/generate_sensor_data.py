@@ -0,0 +1,210 @@
+"""
+Генератор синтетичних записів датчиків для бенчмарків.
+
+Створює у вихідній теці файли у форматі, який читає FileDatasource:
+  accelerometer (x, y, z)            - шум навколо базового z = 16541 з вбудованими нерівностями
+  gps (longitude, latitude)          - рух уздовж ламаної, одна точка на GPS_PROPORTION показів
+  parking (empty_count, longitude, latitude)
+  labels (road_state)                - еталонна розмітка кожного показу: 0 normal, 1 bump, 2 pothole
+
+Дані генеруються частинами (chunk) і одразу записуються у CSV або .npy,
+тож пам'ять не залежить від кількості рядків. Результат детермінований для seed.
+
+Приклад: python generate_sensor_data.py --rows 5000000 --format npy --output-dir ./bench
+"""
+import argparse
+import os
+import numpy as np
+
+Z_BASELINE = 16541
+# Маршрут за замовчуванням: (longitude, latitude) у порядку колонок gps.csv
+DEFAULT_ROUTE = np.array([
+    [50.450386, 30.524547],
+    [50.452811, 30.522049],
+    [50.455120, 30.519310],
+    [50.457902, 30.521874],
+    [50.456433, 30.527705],
+    [50.452644, 30.528912],
+    [50.450386, 30.524547],
+])
+EARTH_RADIUS = 6371000.0
+
+FILES = {
+    "accelerometer": (["x", "y", "z"], np.int32, "%d"),
+    "gps": (["longitude", "latitude"], np.float64, "%.9f"),
+    "parking": (["empty_count", "longitude", "latitude"], np.float64, ["%d", "%.9f", "%.9f"]),
+    "labels": (["road_state"], np.uint8, "%d"),
+}
+
+
+def segment_lengths(route: np.ndarray) -> np.ndarray:
+    """Довжини відрізків ламаної в метрах (рівнопроміжна проєкція)"""
+    radians = np.radians(route)
+    mean_second = np.cos(radians[:, 1].mean())
+    delta = np.diff(radians, axis=0)
+    return EARTH_RADIUS * np.hypot(delta[:, 0], delta[:, 1] * mean_second)
+
+
+def route_points(route: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    """Точки на ламаній для відстаней від її початку (маршрут повторюється по колу)"""
+    cumulative = np.concatenate([[0.0], np.cumsum(segment_lengths(route))])
+    distances = np.mod(distances, cumulative[-1])
+    return np.column_stack([
+        np.interp(distances, cumulative, route[:, 0]),
+        np.interp(distances, cumulative, route[:, 1]),
+    ])
+
+
+def generate_accelerometer(rng, count: int, anomaly_rate: float, noise: float):
+    """Повертає count показників акселерометра та їх розмітку"""
+    accelerometer = np.empty((count, 3), dtype=np.int32)
+    accelerometer[:, 0] = rng.normal(0, 300, count)
+    accelerometer[:, 1] = rng.normal(0, 300, count)
+    z = rng.normal(Z_BASELINE, noise, count)
+    labels = np.zeros(count, dtype=np.uint8)
+
+    events = rng.poisson(anomaly_rate * count / 1000)
+    widths = rng.integers(5, 25, events)
+    positions = rng.integers(0, max(1, count - 25), events)
+    kinds = rng.integers(1, 3, events)
+    amplitudes = rng.uniform(2500, 7000, events)
+    for position, width, kind, amplitude in zip(positions, widths, kinds, amplitudes):
+        if labels[position:position + width].any():
+            continue
+        # Напівхвиля синуса: bump опускає z, pothole піднімає (як у класифікаторі edge)
+        pulse = amplitude * np.sin(np.linspace(0, np.pi, width + 2)[1:-1])
+        z[position:position + width] += -pulse if kind == 1 else pulse
+        labels[position:position + width] = kind
+    accelerometer[:, 2] = z
+    return accelerometer, labels
+
+
+def generate_parking(rng, count: int, lots: np.ndarray, occupancy: np.ndarray, capacity: int):
+    """Повертає показники паркування; occupancy (вільні місця по парковках) оновлюється на місці"""
+    lot_index = rng.integers(0, len(lots), count)
+    steps = rng.integers(-1, 2, count)
+    empty_count = np.empty(count)
+    for lot in range(len(lots)):
+        mask = lot_index == lot
+        walk = occupancy[lot] + np.cumsum(steps[mask])
+        np.clip(walk, 0, capacity, out=walk)
+        empty_count[mask] = walk
+        if walk.size:
+            occupancy[lot] = walk[-1]
+    return np.column_stack([empty_count, lots[lot_index]])
+
+
+class Writer:
+    """Послідовно дописує частини масиву у CSV або попередньо виділений .npy"""
+    def __init__(self, output_dir: str, name: str, rows: int, file_format: str):
+        columns, dtype, fmt = FILES[name]
+        self.fmt = fmt
+        self.position = 0
+        path = os.path.join(output_dir, f"{name}.{file_format}")
+        if file_format == "npy":
+            self.file = None
+            self.array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(rows, len(columns)))
+        else:
+            self.array = None
+            self.file = open(path, "w", newline="")
+            self.file.write(",".join(columns) + "\n")
+
+    def write(self, chunk: np.ndarray):
+        chunk = chunk.reshape(len(chunk), -1)
+        if self.array is not None:
+            self.array[self.position:self.position + len(chunk)] = chunk
+        else:
+            np.savetxt(self.file, chunk, fmt=self.fmt, delimiter=",")
+        self.position += len(chunk)
+
+    def close(self):
+        if self.array is not None:
+            self.array.flush()
+        else:
+            self.file.close()
+
+
+def generate(
+    output_dir: str,
+    rows: int,
+    seed: int = 0,
+    file_format: str = "csv",
+    chunk_size: int = 1_000_000,
+    rate: float = 100.0,
+    speed: float = 12.0,
+    anomaly_rate: float = 2.0,
+    noise: float = 40.0,
+    gps_proportion: int = 10,
+    route: np.ndarray = DEFAULT_ROUTE,
+    parking_lots: int = 20,
+    parking_capacity: int = 60,
+):
+    """
+    Генерує rows тактів. rate - частота акселерометра (Гц), speed - швидкість (м/с),
+    anomaly_rate - середня кількість нерівностей на 1000 показів.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # Частини кратні GPS_PROPORTION, щоб GPS-точки не розривались між частинами
+    chunk_size = max(gps_proportion, chunk_size - chunk_size % gps_proportion)
+    gps_rows = -(-rows // gps_proportion)
+    writers = {
+        "accelerometer": Writer(output_dir, "accelerometer", rows, file_format),
+        "gps": Writer(output_dir, "gps", gps_rows, file_format),
+        "parking": Writer(output_dir, "parking", rows, file_format),
+        "labels": Writer(output_dir, "labels", rows, file_format),
+    }
+
+    setup_rng = np.random.default_rng([seed, 0])
+    lots = route_points(route, setup_rng.uniform(0, segment_lengths(route).sum(), parking_lots))
+    occupancy = setup_rng.integers(0, parking_capacity + 1, parking_lots).astype(float)
+    gps_step = speed * gps_proportion / rate
+    try:
+        for chunk_index, start in enumerate(range(0, rows, chunk_size)):
+            # Окремий генератор на кожну частину: однаковий seed і chunk_size дають однаковий результат
+            rng = np.random.default_rng([seed, chunk_index + 1])
+            count = min(chunk_size, rows - start)
+            accelerometer, labels = generate_accelerometer(rng, count, anomaly_rate, noise)
+            gps_start = start // gps_proportion
+            gps_count = -(-count // gps_proportion)
+            gps = route_points(route, np.arange(gps_start, gps_start + gps_count) * gps_step)
+            gps += rng.normal(0, 2e-6, gps.shape)
+
+            writers["accelerometer"].write(accelerometer)
+            writers["gps"].write(gps)
+            writers["parking"].write(generate_parking(rng, count, lots, occupancy, parking_capacity))
+            writers["labels"].write(labels)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетичних записів датчиків")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="кількість показів акселерометра")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["csv", "npy"], default="csv")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--rate", type=float, default=100.0, help="частота акселерометра, Гц")
+    parser.add_argument("--speed", type=float, default=12.0, help="швидкість автомобіля, м/с")
+    parser.add_argument("--anomaly-rate", type=float, default=2.0, help="нерівностей на 1000 показів")
+    parser.add_argument("--noise", type=float, default=40.0, help="стандартне відхилення шуму z")
+    parser.add_argument("--gps-proportion", type=int, default=10, help="показів акселерометра на одну GPS-точку")
+    args = parser.parse_args()
+
+    generate(
+        output_dir=args.output_dir,
+        rows=args.rows,
+        seed=args.seed,
+        file_format=args.format,
+        chunk_size=args.chunk_size,
+        rate=args.rate,
+        speed=args.speed,
+        anomaly_rate=args.anomaly_rate,
+        noise=args.noise,
+        gps_proportion=args.gps_proportion,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,4 +7,5 @@ from domain.gps import Gps
 class AggregatedData:
   accelerometer: Accelerometer
   gps: Gps
-  time: datetime
\ No newline at end of file
+  time: datetime
+  agent_id: int = 0
\ No newline at end of file
@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+from datetime import datetime
+from domain.gps import Gps
+
+@dataclass
+class BatchFrame:
+  """N показів акселерометра в одному повідомленні з однією GPS-точкою на пакет"""
+  agent_id: int
+  base_time: datetime
+  offsets_us: list[int]  # зсув кожного показу відносно base_time у мікросекундах
+  accelerometer: list[list[int]]  # [x, y, z] для кожного показу
+  gps: Gps
+
+@dataclass
+class ParkingFrame:
+  """N показів паркування в одному повідомленні"""
+  base_time: datetime
+  offsets_us: list[int]
+  parking: list[list[float]]  # [empty_count, longitude, latitude] для кожного показу
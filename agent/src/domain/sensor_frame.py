@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+from datetime import datetime
+import numpy as np
+from domain.accelerometer import Accelerometer
+from domain.aggregated_data import AggregatedData
+from domain.batch_frame import BatchFrame, ParkingFrame
+from domain.gps import Gps
+from domain.parking import Parking
+
+@dataclass
+class SensorFrame:
+  """Послідовні такти відтворення; масиви є представленнями (views) даних без копіювання"""
+  start: int
+  accelerometer: np.ndarray  # (n, 3): x, y, z
+  gps: np.ndarray  # (m, 2): longitude, latitude — GPS-точки, що покривають такти кадру
+  parking: np.ndarray  # (n, 3): empty_count, longitude, latitude
+  gps_offset: int = 0  # позиція першого такту всередині першої GPS-точки
+  gps_proportion: int = 1  # кількість тактів акселерометра на одну GPS-точку
+
+  def __len__(self) -> int:
+    return len(self.accelerometer)
+
+  def gps_index(self, index: int) -> int:
+    return (self.gps_offset + index) // self.gps_proportion
+
+  def aggregated_data(self, index: int, time: datetime) -> AggregatedData:
+    x, y, z = self.accelerometer[index].tolist()
+    longitude, latitude = self.gps[self.gps_index(index)].tolist()
+    return AggregatedData(
+      accelerometer=Accelerometer(x, y, z),
+      gps=Gps(longitude, latitude),
+      time=time,
+    )
+
+  def parking_data(self, index: int) -> Parking:
+    empty_count, longitude, latitude = self.parking[index].tolist()
+    return Parking(int(empty_count), Gps(longitude, latitude))
+
+  def batch_frame(self, agent_id: int, timestamps: list[datetime]) -> BatchFrame:
+    """Пакує всі такти кадру в один BatchFrame; GPS-точка береться з останнього такту"""
+    base_time = timestamps[0]
+    longitude, latitude = self.gps[self.gps_index(len(self) - 1)].tolist()
+    return BatchFrame(
+      agent_id=agent_id,
+      base_time=base_time,
+      offsets_us=[round((time - base_time).total_seconds() * 1e6) for time in timestamps],
+      accelerometer=self.accelerometer.tolist(),
+      gps=Gps(longitude, latitude),
+    )
+
+  def parking_frame(self, timestamps: list[datetime]) -> ParkingFrame:
+    base_time = timestamps[0]
+    return ParkingFrame(
+      base_time=base_time,
+      offsets_us=[round((time - base_time).total_seconds() * 1e6) for time in timestamps],
+      parking=[[int(empty_count), longitude, latitude] for empty_count, longitude, latitude in self.parking.tolist()],
+    )
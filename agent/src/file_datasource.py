@@ -1,94 +1,139 @@
-from csv import reader
+import os
 from datetime import datetime
-from domain.aggregated_data import AggregatedData, Accelerometer, Gps
+import numpy as np
+from domain.aggregated_data import AggregatedData
 from domain.parking import Parking
+from domain.sensor_frame import SensorFrame
+
+# Кількість показів акселерометра на одну GPS-точку
+GPS_PROPORTION = 10
+
+def load_columns(filename: str, dtype, use_cache: bool = True) -> np.ndarray:
+    """
+    Завантажує CSV-файл датчика у двовимірний масив (рядок = один показ).
+    Розібраний масив зберігається поруч у форматі .npy і при наступних запусках
+    відкривається через memory-map, тож CSV парситься лише один раз.
+    Файли .npy (наприклад, від генератора даних) відкриваються напряму.
+    """
+    root, extension = os.path.splitext(filename)
+    if extension == '.npy':
+        return np.load(filename, mmap_mode='r')
+
+    cache_filename = root + '.npy'
+    if use_cache and os.path.exists(cache_filename) \
+            and os.path.getmtime(cache_filename) >= os.path.getmtime(filename):
+        return np.load(cache_filename, mmap_mode='r')
+
+    data = np.loadtxt(filename, delimiter=',', skiprows=1, dtype=dtype, ndmin=2)
+    if use_cache:
+        try:
+            np.save(cache_filename, data)
+        except OSError:
+            pass
+    return data
+
+def take_rows(data: np.ndarray, start: int, count: int) -> np.ndarray:
+    """Повертає count рядків починаючи з start; без копіювання, якщо не треба переходити через кінець"""
+    if len(data) == 0:
+        return data[:0]
+    start %= len(data)
+    if start + count <= len(data):
+        return data[start:start + count]
+    return np.take(data, np.arange(start, start + count), axis=0, mode='wrap')
 
 class FileDatasource:
-    def __init__(self, accelerometer_filename: str, gps_filename: str, parking_filename:str) -> None:
+    def __init__(
+        self,
+        accelerometer_filename: str,
+        gps_filename: str,
+        parking_filename: str,
+        loop: bool = False,
+        gps_proportion: int = GPS_PROPORTION,
+        use_cache: bool = True,
+    ) -> None:
         self.accelerometer_filename = accelerometer_filename
         self.gps_filename = gps_filename
         self.parking_filename = parking_filename
-        self.accelerometer_data = None  
+        self.loop = loop
+        self.gps_proportion = gps_proportion
+        self.use_cache = use_cache
+        self.accelerometer_data = None
         self.gps_data = None
         self.parking_data = None
         self.is_reading_finished = False
-        self.iteration = 0
-        self.gps_proportion_iterator = 0
-        
+        self.position = 0
+
+    def __len__(self) -> int:
+        """Кількість тактів відтворення (визначається даними акселерометра)"""
+        if self.accelerometer_data is None:
+            self.startReading()
+        return len(self.accelerometer_data)
+
     def isReadingFinished(self) -> bool:
         """Метод повертає True якщо читання даних завершено"""
         return self.is_reading_finished
 
     def read(self) -> tuple[AggregatedData, Parking]:
         """Метод повертає дані отримані з датчиків"""
-        if (self.iteration == 0):
+        frame = self.read_frame(1)
+        if len(frame) == 0:
+            return None, None
+        return frame.aggregated_data(0, datetime.now()), frame.parking_data(0)
+
+    def read_frame(self, size: int) -> SensorFrame:
+        """
+        Метод повертає до size наступних тактів у вигляді SensorFrame.
+        Кадр не переходить через кінець запису: у режимі loop наступний виклик почне спочатку.
+        """
+        if self.accelerometer_data is None:
             self.startReading()
-        self.iteration += 1
-        accelerometer = self._get_next_or_none(self.accelerometer_data, False)
-        gps = self._get_next_or_none(self.gps_data, True)
-        parking = self._get_next_or_none(self.parking_data, False)
+        if self.is_reading_finished:
+            return self.frame_at(self.position, 0)
 
-        if (all(schema is None for schema in [accelerometer, gps, parking])):
-          self.stopReading()
+        frame = self.frame_at(self.position, min(size, len(self) - self.position))
+        self.position += len(frame)
+        if self.position >= len(self):
+            if self.loop:
+                self.position = 0
+            else:
+                self.stopReading()
+        return frame
 
-        return AggregatedData(
-                accelerometer=self._get_next_or_none(self.accelerometer_data, False), 
-                gps=self._get_next_or_none(self.gps_data, True), 
-                time=datetime.now()
-            ), self._get_next_or_none(self.parking_data, False)
+    def frame_at(self, position: int, size: int) -> SensorFrame:
+        """Метод повертає кадр довжиною size, що починається з такту position, не змінюючи позицію читання"""
+        if self.accelerometer_data is None:
+            self.startReading()
+        position %= max(len(self), 1)
+        size = max(0, min(size, len(self) - position))
+        first_gps = position // self.gps_proportion
+        last_gps = (position + max(size, 1) - 1) // self.gps_proportion
+        return SensorFrame(
+            start=position,
+            accelerometer=self.accelerometer_data[position:position + size],
+            gps=take_rows(self.gps_data, first_gps, last_gps - first_gps + 1),
+            parking=take_rows(self.parking_data, position, size),
+            gps_offset=position % self.gps_proportion,
+            gps_proportion=self.gps_proportion,
+        )
+
+    def seek(self, position: int):
+        """Метод переносить позицію читання на вказаний такт"""
+        if self.accelerometer_data is None:
+            self.startReading()
+        if self.loop:
+            position %= max(len(self), 1)
+        self.position = max(0, min(position, len(self)))
+        self.is_reading_finished = self.position >= len(self)
 
     def startReading(self, *args, **kwargs):
         """Метод повинен викликатись перед початком читання даних"""
-        self.accelerometer_data = self._read_accelerometer_data()
-        self.gps_data = self._read_gps_data()
-        self.parking_data = self._read_parking_data()
-        self.is_reading_finished = False
+        if self.accelerometer_data is None:
+            self.accelerometer_data = load_columns(self.accelerometer_filename, np.int32, self.use_cache)
+            self.gps_data = load_columns(self.gps_filename, np.float64, self.use_cache)
+            self.parking_data = load_columns(self.parking_filename, np.float64, self.use_cache)
+        self.position = 0
+        self.is_reading_finished = len(self.accelerometer_data) == 0
 
     def stopReading(self, *args, **kwargs):
         """Метод повинен викликатись для закінчення читання даних"""
         self.is_reading_finished = True
-    
-    def _get_next_or_none(self, iterator, isGps):
-        try:
-            if(isGps):
-                if(self.gps_proportion_iterator == 0):
-                    self.nextIt = next(iterator) 
-                    self.gps_proportion_iterator += 1
-
-                    return self.nextIt
-                else:
-                    self.gps_proportion_iterator += 1
-                    if(self.gps_proportion_iterator == 10):
-                        self.gps_proportion_iterator = 0
-                    return self.nextIt
-            else:
-                return next(iterator)
-        except StopIteration:
-            return None
-
-    def _read_accelerometer_data(self):
-        with open(self.accelerometer_filename, 'r') as file:
-            csv_reader = reader(file)
-            next(csv_reader) 
-            data = [tuple(map(int, row)) for row in csv_reader]
-            
-            for point in data:
-              yield Accelerometer(*point)
-
-    def _read_gps_data(self):
-        with open(self.gps_filename, 'r') as file:
-            csv_reader = reader(file)
-            next(csv_reader)  
-            data = [tuple(map(float, row)) for row in csv_reader]
-
-            for point in data:
-              yield Gps(*point)
-
-    def _read_parking_data(self):
-        with open(self.parking_filename, 'r') as file:
-            csv_reader = reader(file)
-            next(csv_reader)  
-            data = [tuple(map(float, row)) for row in csv_reader]
-
-            for empty_count, longitude, latitude in data:
-              yield Parking(empty_count, Gps(longitude, latitude))
@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from schema.aggregated_data_schema import AggregatedDataSchema
+from schema.parking_schema import ParkingSchema
+from codec import JSON
+from file_datasource import FileDatasource
+
+@dataclass
+class VirtualAgent:
+  """Віртуальний автомобіль: власний id, зсув у записі та зміщений маршрут"""
+  agent_id: int
+  position: int
+  longitude_offset: float
+  latitude_offset: float
+
+def agent_topic(topic, agent_id, partitions=0):
+  """
+  Топік автомобіля: при partitions > 0 - <topic>/<agent_id % partitions>/<agent_id>,
+  щоб усі дані одного автомобіля потрапляли до одного процесу edge
+  """
+  if partitions <= 0:
+    return topic
+  return f"{topic}/{agent_id % partitions}/{agent_id}"
+
+class PublishStats:
+  """Лічильники відправлених повідомлень та затримки publish -> on_publish"""
+  def __init__(self, max_samples=100000):
+    self.lock = threading.Lock()
+    self.max_samples = max_samples
+    self.sent = 0
+    self.failed = 0
+    self.latencies = []
+    self.sent_at = {}
+    self.acked_at = {}
+
+  def track(self, client, topic, payload):
+    started = time.perf_counter()
+    info = client.publish(topic, payload)
+    with self.lock:
+      if info.rc != 0:
+        self.failed += 1
+        return
+      self.sent += 1
+      # on_publish може спрацювати в мережевому потоці раніше, ніж publish() поверне mid
+      acked = self.acked_at.pop((id(client), info.mid), None)
+      if acked is None:
+        self.sent_at[(id(client), info.mid)] = started
+      else:
+        self._record(acked - started)
+
+  def on_publish(self, client, userdata, mid):
+    acked = time.perf_counter()
+    with self.lock:
+      started = self.sent_at.pop((id(client), mid), None)
+      if started is None:
+        self.acked_at[(id(client), mid)] = acked
+      else:
+        self._record(acked - started)
+
+  def _record(self, latency):
+    if len(self.latencies) < self.max_samples:
+      self.latencies.append(latency)
+    else:
+      self.latencies[random.randrange(self.max_samples)] = latency
+
+  def snapshot(self):
+    """Повертає (відправлено, помилок, затримки) та скидає накопичені затримки"""
+    with self.lock:
+      latencies, self.latencies = self.latencies, []
+      return self.sent, self.failed, latencies
+
+def percentile(sorted_values, fraction):
+  if not sorted_values:
+    return 0.0
+  index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+  return sorted_values[index]
+
+def create_agents(size, datasource: FileDatasource, gps_jitter, first_id=1, seed=None):
+  """Створює віртуальні автомобілі з випадковим зсувом у записі та маршруті"""
+  rng = random.Random(seed)
+  return [
+    VirtualAgent(
+      agent_id=first_id + index,
+      position=rng.randrange(len(datasource)),
+      longitude_offset=rng.uniform(-gps_jitter, gps_jitter),
+      latitude_offset=rng.uniform(-gps_jitter, gps_jitter),
+    )
+    for index in range(size)
+  ]
+
+def drive(client, agents, topic, parking_topic, datasource, delay, stats, stop_event, codec=JSON, partitions=0):
+  """Публікує дані групи віртуальних автомобілів через одне MQTT-з'єднання"""
+  topics = {agent.agent_id: agent_topic(topic, agent.agent_id, partitions) for agent in agents}
+  parking_codec = JSON if codec.name == 'struct' else codec
+  schema = AggregatedDataSchema()
+  parking_schema = ParkingSchema()
+  next_tick = time.monotonic()
+  while not stop_event.is_set():
+    now = datetime.now()
+    for agent in agents:
+      frame = datasource.frame_at(agent.position, 1)
+      agent.position = (agent.position + 1) % len(datasource)
+      data = frame.aggregated_data(0, now)
+      data.agent_id = agent.agent_id
+      data.gps.longitude += agent.longitude_offset
+      data.gps.latitude += agent.latitude_offset
+      stats.track(client, topics[agent.agent_id], codec.encode(schema.dump(data)))
+      stats.track(client, parking_topic, parking_codec.encode(parking_schema.dump(frame.parking_data(0))))
+    next_tick += delay
+    stop_event.wait(max(0.0, next_tick - time.monotonic()))
+
+def report(stats, interval, stop_event):
+  """Періодично друкує досягнуту швидкість та перцентилі затримки публікації"""
+  last_sent = 0
+  last_time = time.monotonic()
+  while not stop_event.wait(interval):
+    sent, failed, latencies = stats.snapshot()
+    now = time.monotonic()
+    rate = (sent - last_sent) / (now - last_time)
+    last_sent, last_time = sent, now
+    latencies.sort()
+    print(
+      f"FLEET: {rate:.0f} msgs/s, sent {sent}, failed {failed}, latency ms "
+      f"p50={percentile(latencies, 0.5) * 1000:.2f} "
+      f"p90={percentile(latencies, 0.9) * 1000:.2f} "
+      f"p99={percentile(latencies, 0.99) * 1000:.2f}"
+    )
+
+def run_fleet(clients, topic, parking_topic, datasource, delay, size, gps_jitter, report_interval, duration=0, codec=JSON, partitions=0):
+  """Запускає size віртуальних автомобілів, розподілених між MQTT-з'єднаннями clients"""
+  agents = create_agents(size, datasource, gps_jitter)
+  stats = PublishStats()
+  stop_event = threading.Event()
+  threads = []
+  for index, client in enumerate(clients):
+    client.on_publish = stats.on_publish
+    group = agents[index::len(clients)]
+    threads.append(threading.Thread(
+      target=drive,
+      args=(client, group, topic, parking_topic, datasource, delay, stats, stop_event, codec, partitions),
+      daemon=True,
+    ))
+  threads.append(threading.Thread(target=report, args=(stats, report_interval, stop_event), daemon=True))
+  for thread in threads:
+    thread.start()
+
+  try:
+    stop_event.wait(duration or None)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    stop_event.set()
+    for thread in threads:
+      thread.join()
+  return stats
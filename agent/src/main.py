@@ -1,8 +1,13 @@
 from paho.mqtt import client as mqtt_client
+import math
 import time
 from schema.aggregated_data_schema import AggregatedDataSchema
 from schema.parking_schema import ParkingSchema
+from schema.batch_frame_schema import BatchFrameSchema, ParkingFrameSchema
+from codec import JSON, get_codec
 from file_datasource import FileDatasource
+from fleet import agent_topic, run_fleet
+from scheduler import PublishScheduler
 import config
 
 def connect_mqtt(broker, port):
@@ -23,40 +28,78 @@ def connect_mqtt(broker, port):
   
   return client
 
-def publish(client, topic, parking_topic, datasource, delay):
+def publish(client, topic, parking_topic, datasource, scheduler, agent_id=0, codec=JSON):
   datasource.startReading()
-  
+  # Fixed struct layout covers sensor records only
+  parking_codec = JSON if codec.name == 'struct' else codec
+  schema = AggregatedDataSchema()
+  parking_schema = ParkingSchema()
+  frame_schema = BatchFrameSchema()
+  parking_frame_schema = ParkingFrameSchema()
+  last_stats = time.monotonic()
+  scheduler.start()
+
   while not datasource.isReadingFinished():
-    time.sleep(delay)
-    data, parking_data = datasource.read()
-    print(f"Data: {data}")
-    print(f"Parking: {parking_data}")
-    msg = AggregatedDataSchema().dumps(data)
-    parking_msg = ParkingSchema().dumps(parking_data)
-    print("ACTION: AGENT SEND DATA")
-    result = client.publish(topic, msg)
-    # result: [0, 1]
-    status = result[0]
-    
-    # if status == 0:
-    #   print(f"Send `{msg}` to topic `{topic}`")
-    # else:
-    #   print(f"Failed to send message to topic {topic}")
-
-    result = client.publish(parking_topic, parking_msg)
-    status = result[0]
-    # if status == 0:
-    #   print(f"Send `{parking_msg}` to topic `{parking_topic}`")
-    # else:
-    #   print(f"Failed to send message to topic {parking_topic}")
+    count = scheduler.wait()
+    frame = datasource.read_frame(count)
+    timestamps = scheduler.timestamps(len(frame))
+
+    if scheduler.batch_size == 1:
+      # One message per sample
+      for index in range(len(frame)):
+        data = frame.aggregated_data(index, timestamps[index])
+        data.agent_id = agent_id
+        parking_data = frame.parking_data(index)
+        print(f"Data: {data}")
+        print(f"Parking: {parking_data}")
+        print("ACTION: AGENT SEND DATA")
+        client.publish(topic, codec.encode(schema.dump(data)))
+        client.publish(parking_topic, parking_codec.encode(parking_schema.dump(parking_data)))
+    else:
+      # One frame with all samples of the batch and a single GPS fix
+      print(f"ACTION: AGENT SEND DATA ({len(frame)} samples)")
+      client.publish(topic, codec.encode(frame_schema.dump(frame.batch_frame(agent_id, timestamps))))
+      client.publish(parking_topic, parking_codec.encode(parking_frame_schema.dump(frame.parking_frame(timestamps))))
+    scheduler.advance(len(frame))
+
+    if time.monotonic() - last_stats >= config.STATS_INTERVAL:
+      last_stats = time.monotonic()
+      print(f"Scheduler: {scheduler.stats()}")
+
+def create_scheduler():
+  rate = config.RATE * config.SPEEDUP
+  return PublishScheduler(
+    rate=config.RATE,
+    speedup=config.SPEEDUP,
+    batch_size=max(config.BATCH_SIZE, math.ceil(rate / config.MAX_PUBLISH_RATE)),
+    max_lag=config.MAX_LAG,
+  )
 
 def run():
+  if config.FLEET_SIZE > 1:
+    run_fleet_mode()
+    return
   # Prepare mqtt client
   client = connect_mqtt(config.MQTT_BROKER_HOST, config.MQTT_BROKER_PORT)
   # Prepare datasource
   datasource = FileDatasource("data/accelerometer.csv", "data/gps.csv", "data/parking.csv")
   # Infinity publish data
-  publish(client, config.MQTT_TOPIC, config.MQTT_PARKING_TOPIC, datasource, config.DELAY)
+  publish(client, agent_topic(config.MQTT_TOPIC, config.AGENT_ID, config.MQTT_TOPIC_PARTITIONS), config.MQTT_PARKING_TOPIC, datasource, create_scheduler(), config.AGENT_ID, get_codec(config.WIRE_CODEC))
+
+def run_fleet_mode():
+  # Prepare pool of mqtt clients shared by virtual agents
+  clients = [
+    connect_mqtt(config.MQTT_BROKER_HOST, config.MQTT_BROKER_PORT)
+    for _ in range(min(config.FLEET_CONNECTIONS, config.FLEET_SIZE))
+  ]
+  # One parsed copy of the datasource for the whole fleet
+  datasource = FileDatasource("data/accelerometer.csv", "data/gps.csv", "data/parking.csv", loop=True)
+  datasource.startReading()
+  run_fleet(
+    clients, config.MQTT_TOPIC, config.MQTT_PARKING_TOPIC, datasource, config.DELAY,
+    config.FLEET_SIZE, config.FLEET_GPS_JITTER, config.FLEET_REPORT_INTERVAL, config.FLEET_DURATION,
+    get_codec(config.WIRE_CODEC), config.MQTT_TOPIC_PARTITIONS,
+  )
 
 if __name__ == '__main__':
   run()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import time
+from datetime import datetime, timedelta
+
+class PublishScheduler:
+  """
+  Планувальник тактів відтворення на монотонному годиннику.
+  Такт n запланований на start + n / (rate * speedup), тож похибка сну та час
+  серіалізації не накопичуються: після затримки такти, що вже настали, видаються пачкою.
+  Мітки часу тактів відповідають записаній шкалі: start + n / rate.
+  """
+  def __init__(self, rate: float, speedup: float = 1.0, batch_size: int = 1, max_burst: int = 1000, max_lag: float = 0):
+    self.rate = rate
+    self.speedup = speedup
+    self.interval = 1.0 / (rate * speedup)
+    self.batch_size = max(1, batch_size)
+    self.max_burst = max(self.batch_size, max_burst)
+    # Відставання в секундах, після якого пропущені такти відкидаються (0 - ніколи)
+    self.max_lag = max_lag
+    self.ticks = 0
+    self.started = None
+    self.started_at = None
+    # Лічильники
+    self.wakeups = 0
+    self.late_wakeups = 0
+    self.skipped_ticks = 0
+    self.lag = 0.0
+    self.max_observed_lag = 0.0
+
+  def start(self):
+    self.ticks = 0
+    self.started = time.monotonic()
+    self.started_at = datetime.now()
+
+  def due_ticks(self, now: float) -> int:
+    """Кількість тактів, час яких уже настав"""
+    return int((now - self.started) / self.interval) + 1
+
+  def wait(self) -> int:
+    """Чекає, поки настане batch_size тактів, і повертає кількість тактів до відправки"""
+    if self.started is None:
+      self.start()
+    deadline = self.started + (self.ticks + self.batch_size - 1) * self.interval
+    now = time.monotonic()
+    if now < deadline:
+      time.sleep(deadline - now)
+      now = time.monotonic()
+
+    self.wakeups += 1
+    self.lag = max(0.0, now - deadline)
+    self.max_observed_lag = max(self.max_observed_lag, self.lag)
+    if self.lag > self.interval:
+      self.late_wakeups += 1
+    if self.max_lag and self.lag > self.max_lag:
+      skipped = self.due_ticks(now - self.max_lag) - self.ticks
+      if skipped > 0:
+        self.skipped_ticks += skipped
+        self.ticks += skipped
+    return max(1, min(self.due_ticks(now) - self.ticks, self.max_burst))
+
+  def timestamps(self, count: int) -> list[datetime]:
+    """Мітки часу для наступних count тактів на записаній шкалі часу"""
+    return [
+      self.started_at + timedelta(seconds=(self.ticks + index) / self.rate)
+      for index in range(count)
+    ]
+
+  def advance(self, count: int):
+    """Позначає count тактів як відправлені"""
+    self.ticks += count
+
+  def drift(self) -> float:
+    """Різниця в секундах між запланованим і фактичним прогресом (додатна - відставання)"""
+    if self.started is None:
+      return 0.0
+    return (time.monotonic() - self.started) - self.ticks * self.interval
+
+  def stats(self) -> dict:
+    elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+    return {
+      'ticks': self.ticks,
+      'target_rate': self.rate * self.speedup,
+      'achieved_rate': self.ticks / elapsed if elapsed else 0.0,
+      'drift': self.drift(),
+      'lag': self.lag,
+      'max_lag': self.max_observed_lag,
+      'wakeups': self.wakeups,
+      'late_wakeups': self.late_wakeups,
+      'skipped_ticks': self.skipped_ticks,
+    }
@@ -5,4 +5,5 @@ from schema.gps_schema import GpsSchema
 class AggregatedDataSchema(Schema):
   accelerometer = fields.Nested(AccelerometerSchema)
   gps = fields.Nested(GpsSchema)
-  time = fields.DateTime('iso')
\ No newline at end of file
+  time = fields.DateTime('iso')
+  agent_id = fields.Int()
\ No newline at end of file
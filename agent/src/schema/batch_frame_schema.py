@@ -0,0 +1,14 @@
+from marshmallow import Schema, fields
+from schema.gps_schema import GpsSchema
+
+class BatchFrameSchema(Schema):
+  agent_id = fields.Int()
+  base_time = fields.DateTime('iso')
+  offsets_us = fields.List(fields.Int())
+  accelerometer = fields.List(fields.List(fields.Int()))
+  gps = fields.Nested(GpsSchema)
+
+class ParkingFrameSchema(Schema):
+  base_time = fields.DateTime('iso')
+  offsets_us = fields.List(fields.Int())
+  parking = fields.List(fields.List(fields.Number()))
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark of the wire codecs: bytes and microseconds per record.
+
+Usage: python benchmarks/codec_benchmark.py [--records 100] [--repeat 2000]
+"""
+import argparse
+import importlib.util
+import os
+import random
+import timeit
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_codec_module():
+    # Every service keeps an identical copy; the hub one is used here
+    spec = importlib.util.spec_from_file_location("codec", os.path.join(ROOT, "hub", "app", "codec.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_records(count):
+    start = datetime(2024, 3, 1, 12, 0, 0)
+    return [
+        {
+            "road_state": random.choice(["normal", "normal", "normal", "bump", "pothole"]),
+            "agent_data": {
+                "accelerometer": {
+                    "x": float(random.randint(-500, 500)),
+                    "y": float(random.randint(-500, 500)),
+                    "z": float(random.randint(14000, 19000)),
+                },
+                "gps": {
+                    "latitude": 30.52 + random.random() / 100,
+                    "longitude": 50.45 + random.random() / 100,
+                },
+                "timestamp": (start + timedelta(milliseconds=index)).isoformat(),
+            },
+        }
+        for index in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=100, help="records per encoded batch")
+    parser.add_argument("--repeat", type=int, default=2000, help="timed iterations per codec")
+    args = parser.parse_args()
+
+    codec_module = load_codec_module()
+    records = make_records(args.records)
+    single = records[0]
+
+    print(f"{'codec':<10}{'shape':<10}{'bytes/rec':>12}{'encode us/rec':>16}{'decode us/rec':>16}")
+    for codec in codec_module.CODECS.values():
+        for shape, payload, count in (("single", single, 1), ("batch", records, len(records))):
+            encoded = codec.encode(payload)
+            encode_time = timeit.timeit(lambda: codec.encode(payload), number=args.repeat)
+            decode_time = timeit.timeit(lambda: codec.decode(encoded), number=args.repeat)
+            print(
+                f"{codec.name:<10}{shape:<10}{len(encoded) / count:>12.1f}"
+                f"{encode_time / args.repeat / count * 1e6:>16.2f}"
+                f"{decode_time / args.repeat / count * 1e6:>16.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
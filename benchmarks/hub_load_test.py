@@ -0,0 +1,83 @@
+"""
+Load test of the hub ingest endpoint: requests/s, records/s and latency
+percentiles with a number of concurrent clients.
+
+Start the hub (uvicorn main:app, Redis and the store running or not, the
+flusher retries) and point the test at it. To compare two versions of the
+hub, run the test with the same arguments against each of them, e.g. before
+and after the async ingest path.
+
+Usage: python benchmarks/hub_load_test.py [--url http://localhost:8000] [--concurrency 64]
+       [--duration 30] [--records 20] [--endpoint /processed_agent_data/bulk]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from codec_benchmark import make_records  # noqa: E402
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def client_loop(client, endpoint, body, deadline, latencies, errors):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.post(endpoint, content=body, headers={"Content-Type": "application/json"})
+            if response.status_code != 200:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+                continue
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(args):
+    body = json.dumps(make_records(args.records)).encode()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    latencies, errors = [], {}
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        # Warm up connections before the timed part
+        await client.post(args.endpoint, content=body, headers={"Content-Type": "application/json"})
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            client_loop(client, args.endpoint, body, deadline, latencies, errors) for _ in range(args.concurrency)
+        ))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    print(f"url            {args.url}{args.endpoint}")
+    print(f"concurrency    {args.concurrency}")
+    print(f"requests       {len(latencies)} ok, {sum(errors.values())} failed {errors or ''}")
+    print(f"requests/s     {len(latencies) / elapsed:.1f}")
+    print(f"records/s      {len(latencies) * args.records / elapsed:.1f}")
+    print(f"p50 ms         {percentile(latencies, 0.5) * 1000:.1f}")
+    print(f"p99 ms         {percentile(latencies, 0.99) * 1000:.1f}")
+    print(f"max ms         {(latencies[-1] if latencies else 0.0) * 1000:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="hub base url")
+    parser.add_argument("--endpoint", default="/processed_agent_data/bulk", help="ingest endpoint")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--records", type=int, default=20, help="records per request")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+CPU per record at each hop behind the edge, with the trusted fast path
+(TRUST_SCHEMA_VERSION) on and off.
+
+Hops measured, with the hub models (the store ones have the same shape and
+the trusted_record module is identical in both services):
+  hub ingest    - decode an edge batch and build records
+  hub redis     - encode to Redis, decode and build records again
+  hub -> store  - serialize records for the store request
+  store ingest  - decode the hub request and build records
+
+Usage: python benchmarks/validation_benchmark.py [--records 500] [--repeat 200] [--codec json]
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "hub"))
+
+from pydantic import TypeAdapter  # noqa: E402
+from app.codec import get_codec  # noqa: E402
+from app.entities.processed_agent_data import ProcessedAgentData  # noqa: E402
+from app.entities.trusted_record import SCHEMA_VERSION, decode_records  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from codec_benchmark import make_records  # noqa: E402
+
+
+def cpu_per_record(function, repeat: int, count: int) -> float:
+    started = time.process_time()
+    for _ in range(repeat):
+        function()
+    return (time.process_time() - started) / repeat / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=500, help="records per batch")
+    parser.add_argument("--repeat", type=int, default=200, help="timed iterations per hop")
+    parser.add_argument("--codec", default="json", help="json, msgpack or struct")
+    args = parser.parse_args()
+
+    codec = get_codec(args.codec)
+    validator = TypeAdapter(List[ProcessedAgentData])
+    records = make_records(args.records)
+    for record in records:
+        record["summary"] = None
+        record["schema_version"] = SCHEMA_VERSION
+    edge_batch = codec.encode(records)
+
+    print(f"{'hop':<14}{'fast path':>10}{'us/record':>12}")
+    for trusted_version in (0, SCHEMA_VERSION):
+        built = decode_records(codec.decode(edge_batch), validator, trusted_version)
+        store_body = codec.encode([item.dict() for item in built])
+        hops = {
+            "hub ingest": lambda: decode_records(codec.decode(edge_batch), validator, trusted_version),
+            "hub redis": lambda: decode_records(
+                [codec.decode(codec.encode(item.dict())) for item in built], validator, trusted_version
+            ),
+            "hub -> store": lambda: codec.encode([item.dict() for item in built]),
+            "store ingest": lambda: decode_records(codec.decode(store_body), validator, trusted_version),
+        }
+        total = 0.0
+        for name, function in hops.items():
+            cost = cpu_per_record(function, args.repeat, len(records))
+            total += cost
+            print(f"{name:<14}{'on' if trusted_version else 'off':>10}{cost:>12.2f}")
+        print(f"{'total':<14}{'on' if trusted_version else 'off':>10}{total:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,185 @@
+import logging
+import re
 import paho.mqtt.client as mqtt
-import json
-from app.entities.agent_data import AgentData, GpsData
+from typing import List, Optional
+from app.codec import StructCodec, detect_codec
+from app.entities.agent_data import AgentData, AgentDataBatch, GpsData
 from app.interfaces.agent_gateway import AgentGateway
 from app.interfaces.hub_gateway import HubGateway
-from app.usecases.data_processing import process_agent_data
+from app.metrics import Metrics
+from app.usecases.data_processing import RoadStateClassifier
+from app.usecases.processing_pipeline import ProcessingPipeline
+from app.usecases.run_reducer import NormalRunReducer
+
+def parse_agent_payload(payload) -> List[AgentData]:
+    """
+    Convert a decoded agent message into AgentData items. Supported formats:
+    a batched frame, a list of per-sample messages and a single per-sample message.
+    """
+    if isinstance(payload, list):
+        return [agent_data for item in payload for agent_data in parse_agent_payload(item)]
+    if 'offsets_us' in payload:
+        return AgentDataBatch(**payload).to_agent_data()
+    return [AgentData(
+        accelerometer=payload['accelerometer'],
+        gps=payload['gps'],
+        timestamp=payload['time'],
+        agent_id=payload.get('agent_id') or 0,
+    )]
+
+def decode_agent_message(payload: bytes) -> List[AgentData]:
+    """
+    Decode an MQTT payload of any supported codec into AgentData items.
+    """
+    return parse_agent_payload(detect_codec(payload).decode(payload))
+
+def topic_agent_id(topic: str, base_topic: str) -> Optional[int]:
+    """
+    Agent id of a partitioned topic <base_topic>/<partition>/<agent_id>, None for other topics.
+    """
+    levels = topic[len(base_topic) + 1:].split("/") if topic.startswith(base_topic + "/") else []
+    return int(levels[1]) if len(levels) == 2 and levels[1].isdigit() else None
+
+JSON_AGENT_ID = re.compile(rb'"agent_id"\s*:\s*(\d+)')
+# fixstr "agent_id" followed by a positive fixint or a uint 8/16/32/64
+MSGPACK_AGENT_ID = re.compile(rb'\xa8agent_id(?:([\x00-\x7f])|\xcc(.)|\xcd(..)|\xce(....)|\xcf(.{8}))', re.DOTALL)
+
+def peek_agent_id(data: bytes) -> int:
+    """
+    Agent id of a raw agent message without decoding it; a message carries
+    samples of one agent. Messages without one (or not parsable) count as agent 0,
+    the worker reports the latter when it decodes them.
+    """
+    if data[:2] == StructCodec.MAGIC:
+        # agent_id (uint32) leads a frame header and follows the one-byte road_state of a record
+        offset = StructCodec.HEADER.size
+        if len(data) >= offset and data[3] != StructCodec.FRAME:
+            if data[4] & StructCodec.HAS_SCHEMA_VERSION:
+                offset += StructCodec.SCHEMA_VERSION.size
+            offset += 1
+        agent_id = data[offset:offset + 4]
+        return int.from_bytes(agent_id, "little") if len(agent_id) == 4 else 0
+    match = JSON_AGENT_ID.search(data)
+    if match is None:
+        match = MSGPACK_AGENT_ID.search(data)
+        if match is None:
+            return 0
+        return int.from_bytes(next(group for group in match.groups() if group is not None), "big")
+    return int(match.group(1))
+
+SUBSCRIPTION_MODES = ("single", "shared", "partitioned")
+
+def parse_partitions(value: str, count: int) -> List[int]:
+    """
+    Parse a partition list such as "0,2,4-7"; an empty value means all count partitions.
+    """
+    if not value:
+        return list(range(count))
+    partitions = set()
+    for part in value.split(","):
+        first, _, last = part.strip().partition("-")
+        partitions.update(range(int(first), int(last or first) + 1))
+    if any(partition >= count for partition in partitions):
+        raise ValueError(f"Partitions {value} are out of range for {count} partitions")
+    return sorted(partitions)
+
+def subscription_topics(
+    topic: str,
+    mode: str = "single",
+    partitions: int = 0,
+    owned_partitions: List[int] = None,
+    share_group: str = "edge",
+) -> List[str]:
+    """
+    Topic filters for a subscription mode. With partitions > 0 agents publish to
+    <topic>/<agent_id % partitions>/<agent_id>.
+    single - the whole topic;
+    shared - the whole topic as an MQTT 5 / mosquitto shared subscription, messages
+    are spread over the group without per-agent affinity;
+    partitioned - only owned_partitions, so each agent is handled by one process.
+    """
+    if mode not in SUBSCRIPTION_MODES:
+        raise ValueError(f"Unknown subscription mode: {mode}")
+    if mode == "partitioned":
+        if partitions <= 0:
+            raise ValueError("Partitioned subscription requires topic partitions")
+        if owned_partitions is None:
+            owned_partitions = range(partitions)
+        return [f"{topic}/{partition}/+" for partition in owned_partitions]
+    # "#" also matches the parent topic, so unpartitioned agents are received as well
+    topics = [f"{topic}/#" if partitions > 0 else topic]
+    if mode == "shared":
+        topics = [f"$share/{share_group}/{item}" for item in topics]
+    return topics
 
 class AgentMQTTAdapter(AgentGateway):
-    def __init__(self, broker_host, broker_port, topic, hub_gateway: HubGateway):
+    def __init__(
+        self,
+        broker_host,
+        broker_port,
+        topic,
+        hub_gateway: HubGateway,
+        classifier: RoadStateClassifier = None,
+        reducer: NormalRunReducer = None,
+        workers: int = 4,
+        queue_size: int = 10000,
+        queue_policy: str = "block",
+        queue_block_timeout: float = 1.0,
+        metrics: Metrics = None,
+        subscription: str = "single",
+        partitions: int = 0,
+        owned_partitions: List[int] = None,
+        share_group: str = "edge",
+        qos: int = 0,
+    ):
         self.broker_host = broker_host
         self.broker_port = broker_port
         self.topic = topic
+        self.topics = subscription_topics(topic, subscription, partitions, owned_partitions, share_group)
+        self.qos = qos
         self.hub_gateway = hub_gateway
+        self.connected = False
         self.client = mqtt.Client()
+        self.pipeline = ProcessingPipeline(
+            parse=decode_agent_message,
+            hub_gateway=hub_gateway,
+            classifier=classifier,
+            reducer=reducer,
+            workers=workers,
+            queue_size=queue_size,
+            policy=queue_policy,
+            block_timeout=queue_block_timeout,
+            metrics=metrics,
+        )
+
+    def on_connect(self, client, userdata, flags, rc):
+        """
+        (Re)subscribe on every connection, subscriptions do not survive a reconnect.
+        """
+        if rc == 0:
+            logging.info(f"Connected to agent MQTT broker, subscribing to {self.topics}")
+            client.subscribe([(topic, self.qos) for topic in self.topics])
+            self.connected = True
+        else:
+            logging.info(f"Failed to connect to agent MQTT broker with code: {rc}")
+
+    def on_disconnect(self, client, userdata, rc):
+        self.connected = False
+        if rc != 0:
+            logging.info(f"Disconnected from agent MQTT broker with code: {rc}, reconnecting")
 
     def on_message(self, client, userdata, msg):
         """
         Handle incoming messages from the agent.
+        Runs on the MQTT network thread, so it only hands the raw payload to the
+        pipeline, keyed by its agent so the agent's messages stay in order; the
+        worker decodes it.
         """
-        try:
-            payload = json.loads(msg.payload.decode('utf-8'))
-            print("ACTION: EDGE RECEIVE DATA FROM AGENT")
-            print(payload)
-            accelerometer_data = payload['accelerometer']
-            gps_data = payload['gps']
-            timestamp = payload['time']
-            agent_data = AgentData(
-                accelerometer=accelerometer_data,
-                gps=gps_data,
-                timestamp=timestamp
-            )
-            processed_data = process_agent_data(agent_data)
-            self.hub_gateway.save_data(processed_data)
-
-        except Exception as e:
-            print(f"Error processing message: {e}")
+        agent_id = topic_agent_id(msg.topic, self.topic)
+        if agent_id is None:
+            # A shared topic: the agent is only known from the payload
+            agent_id = peek_agent_id(msg.payload)
+        self.pipeline.submit(msg.payload, agent_id)
 
     def connect(self):
         """
@@ -45,13 +191,25 @@ class AgentMQTTAdapter(AgentGateway):
         """
         Start listening for messages from the agent.
         """
+        self.pipeline.start()
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
         self.client.on_message = self.on_message
-        self.client.subscribe(self.topic)
         self.client.loop_start()
 
-    def stop(self):
+    def stop(self, timeout: float = None) -> bool:
         """
-        Stop the agent gateway and clean up resources.
+        Disconnect, then let the pipeline process what is already queued.
+        Returns True if the queue was drained within timeout.
         """
+        # disconnect first, so the network loop still sends DISCONNECT before it stops
+        self.client.disconnect()
         self.client.loop_stop()
-        self.client.disconnect()
\ No newline at end of file
+        self.connected = False
+        return self.pipeline.stop(timeout)
+
+    def is_alive(self) -> bool:
+        """
+        Whether the processing workers are running.
+        """
+        return self.pipeline.is_alive()
\ No newline at end of file
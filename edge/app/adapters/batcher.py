@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+
+class LingerBatcher:
+    """
+    Collects items and hands them to flush(batch) once max_size items are
+    buffered or the oldest buffered item has waited linger seconds.
+    At most max_in_flight flushes run concurrently; add() blocks (up to
+    add_timeout seconds) while max_pending items are already waiting.
+    """
+    def __init__(
+        self,
+        flush: Callable[[List], bool],
+        max_size: int = 500,
+        linger: float = 0.05,
+        max_in_flight: int = 4,
+        max_pending: int = None,
+        add_timeout: float = 5.0,
+        name: str = "batcher",
+    ):
+        self.flush = flush
+        self.max_size = max_size
+        self.linger = linger
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending or max_size * max_in_flight * 4
+        self.add_timeout = add_timeout
+        self.buffer = []
+        self.first_added_at = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.in_flight = threading.Semaphore(max_in_flight)
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=name)
+        self.dispatcher = threading.Thread(target=self._dispatch, name=f"{name}-dispatcher", daemon=True)
+        self.dispatcher.start()
+
+    def add(self, item) -> bool:
+        """
+        Buffer an item. Returns False if the batcher is closed or stayed full for add_timeout.
+        """
+        with self.condition:
+            if not self.condition.wait_for(
+                lambda: self.closed or len(self.buffer) < self.max_pending, timeout=self.add_timeout
+            ) or self.closed:
+                return False
+            if not self.buffer:
+                self.first_added_at = time.monotonic()
+            self.buffer.append(item)
+            if len(self.buffer) >= self.max_size:
+                self.condition.notify_all()
+            return True
+
+    def _take_batch(self):
+        """
+        Wait until a batch is due and take it. Returns None when closed and empty.
+        """
+        with self.condition:
+            while True:
+                if self.buffer and (self.closed or len(self.buffer) >= self.max_size):
+                    break
+                if not self.buffer:
+                    if self.closed:
+                        return None
+                    self.condition.wait()
+                    continue
+                remaining = self.first_added_at + self.linger - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch, self.buffer = self.buffer[:self.max_size], self.buffer[self.max_size:]
+            self.first_added_at = time.monotonic() if self.buffer else None
+            self.condition.notify_all()
+            return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            self.in_flight.acquire()
+            self.executor.submit(self._run_flush, batch)
+
+    def _run_flush(self, batch):
+        try:
+            self.flush(batch)
+        except Exception as e:
+            logging.error(f"Error flushing batch of {len(batch)} items: {e}")
+        finally:
+            self.in_flight.release()
+
+    def close(self, timeout: float = None) -> bool:
+        """
+        Flush everything buffered and wait for in-flight flushes.
+        Returns True if that finished within timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.dispatcher.join(timeout)
+        if self.dispatcher.is_alive():
+            return False
+        # Every flush holds one in-flight slot; taking all of them means all flushes are done
+        for _ in range(self.max_in_flight):
+            if not self.in_flight.acquire(timeout=None if deadline is None else max(0.0, deadline - time.monotonic())):
+                return False
+        self.executor.shutdown(wait=False)
+        return True
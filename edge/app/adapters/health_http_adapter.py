@@ -0,0 +1,87 @@
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from app.metrics import Metrics
+
+class HealthHttpAdapter:
+    """
+    Small local HTTP endpoint of an edge process:
+    GET /healthz - liveness, 200 while the processing workers are running;
+    GET /readyz - readiness, 200 while connected to the broker and not shutting down;
+    GET /stats - metrics snapshot with throughput since the previous /stats call.
+    """
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        metrics: Metrics,
+        is_alive: Callable[[], bool],
+        is_ready: Callable[[], bool],
+    ):
+        self.metrics = metrics
+        self.is_alive = is_alive
+        self.is_ready = is_ready
+        self.started_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.last_counters = {}
+        self.last_stats_at = self.started_at
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="edge-health", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        logging.info(f"Health endpoint listening on port {self.server.server_address[1]}")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self) -> dict:
+        snapshot = self.metrics.snapshot()
+        now = time.monotonic()
+        with self.lock:
+            elapsed = max(now - self.last_stats_at, 1e-9)
+            snapshot["rates_per_s"] = {
+                name: (value - self.last_counters.get(name, 0)) / elapsed
+                for name, value in snapshot["counters"].items()
+            }
+            self.last_counters = snapshot["counters"]
+            self.last_stats_at = now
+        snapshot["uptime_s"] = now - self.started_at
+        snapshot["alive"] = self.is_alive()
+        snapshot["ready"] = self.is_ready()
+        return snapshot
+
+    def _handler(self):
+        adapter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/healthz":
+                    alive = adapter.is_alive()
+                    self._send(200 if alive else 503, {"status": "ok" if alive else "dead"})
+                elif self.path == "/readyz":
+                    ready = adapter.is_ready()
+                    self._send(200 if ready else 503, {"status": "ready" if ready else "not ready"})
+                elif self.path == "/stats":
+                    self._send(200, adapter.stats())
+                else:
+                    self._send(404, {"detail": "Not Found"})
+
+            def _send(self, status: int, body: dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # Probes hit these endpoints every few seconds
+                pass
+
+        return Handler
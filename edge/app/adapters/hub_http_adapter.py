@@ -1,12 +1,20 @@
+import time
+from typing import Optional
 import requests
+from requests.adapters import HTTPAdapter
 from marshmallow import Schema, fields, post_load
+from app.adapters.batcher import LingerBatcher
+from app.codec import Codec, JSON
 from app.interfaces.hub_gateway import HubGateway
-from app.entities.processed_agent_data import ProcessedAgentData
+from app.entities.processed_agent_data import SCHEMA_VERSION, ProcessedAgentData, RunSummarySchema
 from app.entities.agent_data import AgentDataSchema
+from app.metrics import Metrics
 
 class ProcessedAgentDataSchema(Schema):
     road_state = fields.Str()
     agent_data = fields.Nested(AgentDataSchema)
+    summary = fields.Nested(RunSummarySchema, allow_none=True)
+    schema_version = fields.Constant(SCHEMA_VERSION, dump_only=True)
 
     @post_load
     def make_processed_agent_data(self, data, **kwargs):
@@ -14,24 +22,106 @@ class ProcessedAgentDataSchema(Schema):
 
 
 class HubHttpAdapter(HubGateway):
-    def __init__(self, api_base_url: str):
+    """
+    Sends processed data to the hub bulk endpoint. Records are batched until
+    batch_size records or batch_linger seconds, and up to max_in_flight batches
+    are posted concurrently over a pooled keep-alive session. A 429 from the
+    overloaded hub (which kept the anomalies of the batch and shed the rest)
+    pauses sending for its Retry-After seconds; the batch is not resent.
+    """
+    def __init__(
+        self,
+        api_base_url: str,
+        codec: Codec = JSON,
+        batch_size: int = 500,
+        batch_linger: float = 0.05,
+        max_in_flight: int = 4,
+        metrics: Metrics = None,
+    ):
         self.endpoint = api_base_url
         self.schema = ProcessedAgentDataSchema()
+        self.codec = codec
+        self.metrics = metrics or Metrics()
+        self.resume_at = 0.0
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight))
+        self.batcher = LingerBatcher(
+            flush=self.send_batch,
+            max_size=batch_size,
+            linger=batch_linger,
+            max_in_flight=max_in_flight,
+            name="hub-http",
+        )
 
     def save_data(self, processed_data: ProcessedAgentData) -> bool:
         """
-        Method to send the processed agent data to the specified HTTP endpoint.
+        Method to queue the processed agent data for sending to the hub.
         Parameters:
         processed_data: The processed agent data to be sent.
         Returns:
-        bool: True if the data is successfully sent, False otherwise.
+        bool: True if the data is accepted for sending, False otherwise.
         """
+        return self.batcher.add(self.schema.dump(processed_data))
+
+    def send_batch(self, batch) -> bool:
+        """
+        Post one batch of serialized records to the hub bulk endpoint.
+        """
+        # Holding the in-flight slot while the hub asked to wait slows the whole pipeline down
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        started = time.perf_counter()
         try:
-            serialized_data = self.schema.dump(processed_data)
-            print("ACTION: EDGE SEND DATA TO HUB")
-            response = requests.post(f"{self.endpoint}/processed_agent_data", json=serialized_data)
-            response.raise_for_status()
+            print(f"ACTION: EDGE SEND DATA TO HUB ({len(batch)} records)")
+            response = self.session.post(
+                f"{self.endpoint}/processed_agent_data/bulk",
+                data=self.codec.encode(batch),
+                headers={"Content-Type": self.codec.content_type},
+            )
+            if response.status_code == 429:
+                try:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                except ValueError:
+                    # An HTTP date; the hub sends seconds
+                    retry_after = 1.0
+                self.resume_at = max(self.resume_at, time.monotonic() + retry_after)
+                self.metrics.inc("hub_throttled")
+            else:
+                response.raise_for_status()
+            # Only the records the hub admitted count as sent; the shed ones are not resent
+            shed = self._shed(response)
+            if shed is None:
+                # Without the hub's count a throttled batch is taken as shed entirely
+                shed = len(batch) if response.status_code == 429 else 0
+            shed = min(shed, len(batch))
+            self.metrics.inc("hub_records_sent", len(batch) - shed)
+            self.metrics.inc("hub_records_shed", shed)
+            self.metrics.inc("hub_requests")
             return True
         except requests.RequestException as e:
             print(f"Error sending processed data: {e}")
-            return False
\ No newline at end of file
+            self.metrics.inc("hub_records_failed", len(batch))
+            return False
+        finally:
+            self.metrics.latency("hub_request").observe(time.perf_counter() - started)
+
+    @staticmethod
+    def _shed(response) -> Optional[int]:
+        """
+        Records of the batch the hub shed, None if its response does not tell.
+        """
+        try:
+            body = response.json()
+        except ValueError:
+            return None
+        # FastAPI wraps error bodies in "detail"
+        body = body.get("detail", body) if isinstance(body, dict) else None
+        shed = body.get("shed") if isinstance(body, dict) else None
+        return shed if isinstance(shed, int) else None
+
+    def close(self, timeout: float = None) -> bool:
+        drained = self.batcher.close(timeout)
+        self.session.close()
+        return drained
@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+import paho.mqtt.client as mqtt
+from app.adapters.batcher import LingerBatcher
+from app.adapters.hub_http_adapter import ProcessedAgentDataSchema
+from app.codec import Codec, JSON
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.hub_gateway import HubGateway
+from app.metrics import Metrics
+
+class HubMqttAdapter(HubGateway):
+    """
+    Publishes processed data to the hub topic over one persistent MQTT client.
+    Records are batched until batch_size records or batch_linger seconds and
+    published as one codec-encoded list. At most max_in_flight batches may be
+    waiting for their publish acknowledgement (PUBACK/PUBCOMP for QoS 1/2);
+    when the window is full, flushing waits for acknowledgements, which in
+    turn applies backpressure to save_data.
+    """
+    def __init__(
+        self,
+        broker,
+        port,
+        topic,
+        codec: Codec = JSON,
+        qos: int = 1,
+        batch_size: int = 500,
+        batch_linger: float = 0.05,
+        max_in_flight: int = 4,
+        publish_timeout: float = 10.0,
+        metrics: Metrics = None,
+    ):
+        if qos not in (0, 1, 2):
+            raise ValueError(f"Invalid MQTT QoS: {qos}")
+        self.broker = broker
+        self.port = port
+        self.topic = topic
+        self.codec = codec
+        self.qos = qos
+        self.max_in_flight = max_in_flight
+        self.publish_timeout = publish_timeout
+        self.schema = ProcessedAgentDataSchema()
+        self.metrics = metrics or Metrics()
+        self.window = threading.Semaphore(max_in_flight)
+        self.lock = threading.Lock()
+        # mid -> (records, publish time); early_acks holds acks that beat publish() returning
+        self.pending = {}
+        self.early_acks = {}
+        self.metrics.gauge("hub_in_flight", lambda: len(self.pending))
+
+        self.client = mqtt.Client()
+        self.client.max_inflight_messages_set(max_in_flight)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_publish = self.on_publish
+        # connect_async lets the network loop keep retrying until the broker is reachable
+        self.client.connect_async(self.broker, self.port)
+        self.client.loop_start()
+
+        # A single flush thread is enough: publish() only queues, the window bounds what is unacknowledged
+        self.batcher = LingerBatcher(
+            flush=self.publish_batch,
+            max_size=batch_size,
+            linger=batch_linger,
+            max_in_flight=1,
+            name="hub-mqtt",
+        )
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            logging.info("Connected to hub MQTT broker")
+        else:
+            logging.info(f"Failed to connect to hub MQTT broker with code: {rc}")
+
+    def on_disconnect(self, client, userdata, rc):
+        if rc != 0:
+            logging.info(f"Disconnected from hub MQTT broker with code: {rc}, reconnecting")
+
+    def save_data(self, processed_data: ProcessedAgentData) -> bool:
+        """
+        Method to queue the processed agent data for publishing to the hub.
+        Parameters:
+        processed_data: The processed agent data to be sent.
+        Returns:
+        bool: True if the data is accepted for sending, False otherwise.
+        """
+        return self.batcher.add(self.schema.dump(processed_data))
+
+    def publish_batch(self, batch) -> bool:
+        """
+        Publish one batch of serialized records once the in-flight window has room.
+        """
+        if not self.window.acquire(timeout=self.publish_timeout):
+            logging.error(f"Hub MQTT in-flight window stayed full for {self.publish_timeout}s, dropping {len(batch)} records")
+            self.metrics.inc("hub_records_failed", len(batch))
+            return False
+        print(f"ACTION: EDGE SEND DATA TO HUB ({len(batch)} records)")
+        started = time.perf_counter()
+        info = self.client.publish(self.topic, self.codec.encode(batch), qos=self.qos)
+        # With QoS > 0 paho keeps a message published while disconnected and sends it after reconnecting
+        queued = info.rc == mqtt.MQTT_ERR_SUCCESS or (info.rc == mqtt.MQTT_ERR_NO_CONN and self.qos > 0)
+        if not queued:
+            self.window.release()
+            logging.error(f"Failed to publish to hub MQTT topic {self.topic}: {mqtt.error_string(info.rc)}")
+            self.metrics.inc("hub_records_failed", len(batch))
+            return False
+        with self.lock:
+            acked_at = self.early_acks.pop(info.mid, None)
+            if acked_at is None:
+                self.pending[info.mid] = (len(batch), started)
+                return True
+        self._acknowledged(len(batch), acked_at - started)
+        return True
+
+    def on_publish(self, client, userdata, mid):
+        acked_at = time.perf_counter()
+        with self.lock:
+            pending = self.pending.pop(mid, None)
+            if pending is None:
+                self.early_acks[mid] = acked_at
+                return
+        records, started = pending
+        self._acknowledged(records, acked_at - started)
+
+    def _acknowledged(self, records: int, latency: float):
+        self.window.release()
+        self.metrics.inc("hub_records_sent", records)
+        self.metrics.inc("hub_requests")
+        self.metrics.latency("hub_request").observe(latency)
+
+    def close(self, timeout: float = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        drained = self.batcher.close(timeout)
+        # Every unacknowledged batch holds one window slot
+        acquired = 0
+        for _ in range(self.max_in_flight):
+            if not self.window.acquire(timeout=None if deadline is None else max(0.0, deadline - time.monotonic())):
+                drained = False
+                break
+            acquired += 1
+        for _ in range(acquired):
+            self.window.release()
+        self.client.disconnect()
+        self.client.loop_stop()
+        return drained
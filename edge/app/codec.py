@@ -0,0 +1,306 @@
+"""
+Wire codecs for sensor records. Agent, edge, hub and store keep identical
+copies of this module, so every hop can encode and decode any of them.
+
+HTTP hops select the codec with the Content-Type header. MQTT 3.1.1 has no
+message properties, so MQTT consumers detect the codec from the payload.
+"""
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+class Codec:
+    """
+    Base class of a wire codec.
+    """
+    name = None
+    content_type = None
+
+    def encode(self, obj) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes):
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """
+    JSON through orjson when it is installed, the standard library otherwise.
+    """
+    name = "json"
+    content_type = "application/json"
+
+    def encode(self, obj) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default)
+        return json.dumps(obj, default=_default).encode("utf-8")
+
+    def decode(self, data: bytes):
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """
+    MessagePack; datetimes are sent as ISO 8601 strings, like in JSON.
+    """
+    name = "msgpack"
+    content_type = "application/msgpack"
+
+    def encode(self, obj) -> bytes:
+        return msgpack.packb(obj, default=_default)
+
+    def decode(self, data: bytes):
+        return msgpack.unpackb(data)
+
+
+ROAD_STATES = ["normal", "bump", "pothole"]
+EPOCH = datetime(1970, 1, 1)
+
+
+class StructCodec(Codec):
+    """
+    Fixed little-endian layout for the three sensor record shapes:
+    an agent sample, a processed record and an agent batch frame.
+    Processed records may carry a schema_version, shared by all records of
+    a payload; other fields outside the fixed layout (run summaries, cell
+    aggregates) cannot be encoded and raise ValueError.
+    """
+    name = "struct"
+    content_type = "application/x-road-vision-struct"
+
+    MAGIC = b"RV"
+    VERSION = 1
+    AGENT, PROCESSED, FRAME = 1, 2, 3
+    IS_LIST, IS_AWARE, HAS_SCHEMA_VERSION = 1, 2, 4
+    # magic, version, kind, flags, count
+    HEADER = struct.Struct("<2sBBBI")
+    # schema_version, follows the header with HAS_SCHEMA_VERSION
+    SCHEMA_VERSION = struct.Struct("<H")
+    UNCARRIED_FIELDS = ("summary", "aggregate")
+    # road_state, agent_id, x, y, z, latitude, longitude, timestamp (us)
+    RECORD = struct.Struct("<BIdddddq")
+    # agent_id, base_time (us), latitude, longitude
+    FRAME_HEADER = struct.Struct("<Iqdd")
+    # offset (us), x, y, z
+    FRAME_SAMPLE = struct.Struct("<qddd")
+
+    def encode(self, obj) -> bytes:
+        is_list = isinstance(obj, list)
+        items = obj if is_list else [obj]
+        if not items:
+            return self.HEADER.pack(self.MAGIC, self.VERSION, self.AGENT, self.IS_LIST, 0)
+        first = items[0]
+        if "offsets_us" in first:
+            if is_list:
+                raise TypeError("StructCodec encodes one batch frame per message")
+            return self._encode_frame(first)
+
+        kind = self.PROCESSED if "road_state" in first else self.AGENT
+        flags = self.IS_LIST if is_list else 0
+        offset = self.HEADER.size
+        schema_version = first.get("schema_version") if kind == self.PROCESSED else None
+        if schema_version is not None:
+            flags |= self.HAS_SCHEMA_VERSION
+            offset += self.SCHEMA_VERSION.size
+        buffer = bytearray(offset + self.RECORD.size * len(items))
+        if schema_version is not None:
+            self.SCHEMA_VERSION.pack_into(buffer, self.HEADER.size, schema_version)
+        for item in items:
+            if kind == self.PROCESSED:
+                for field in self.UNCARRIED_FIELDS:
+                    if item.get(field) is not None:
+                        raise ValueError(f"StructCodec cannot carry {field}, use json or msgpack")
+                if item.get("schema_version") != schema_version:
+                    raise ValueError("StructCodec carries one schema_version per message")
+                road_state = ROAD_STATES.index(item["road_state"]) + 1
+                agent_data = item["agent_data"]
+                timestamp = agent_data["timestamp"]
+            else:
+                road_state = 0
+                agent_data = item
+                timestamp = item["time"]
+            microseconds, aware = _to_microseconds(timestamp)
+            if aware:
+                flags |= self.IS_AWARE
+            accelerometer = agent_data["accelerometer"]
+            gps = agent_data["gps"]
+            self.RECORD.pack_into(
+                buffer, offset, road_state, agent_data.get("agent_id") or 0,
+                accelerometer["x"], accelerometer["y"], accelerometer["z"],
+                gps["latitude"], gps["longitude"], microseconds,
+            )
+            offset += self.RECORD.size
+        self.HEADER.pack_into(buffer, 0, self.MAGIC, self.VERSION, kind, flags, len(items))
+        return bytes(buffer)
+
+    def _encode_frame(self, frame) -> bytes:
+        base_time, aware = _to_microseconds(frame["base_time"])
+        count = len(frame["offsets_us"])
+        buffer = bytearray(self.HEADER.size + self.FRAME_HEADER.size + self.FRAME_SAMPLE.size * count)
+        self.HEADER.pack_into(buffer, 0, self.MAGIC, self.VERSION, self.FRAME, self.IS_AWARE if aware else 0, count)
+        self.FRAME_HEADER.pack_into(
+            buffer, self.HEADER.size, frame.get("agent_id") or 0, base_time,
+            frame["gps"]["latitude"], frame["gps"]["longitude"],
+        )
+        offset = self.HEADER.size + self.FRAME_HEADER.size
+        for sample_offset, (x, y, z) in zip(frame["offsets_us"], frame["accelerometer"]):
+            self.FRAME_SAMPLE.pack_into(buffer, offset, sample_offset, x, y, z)
+            offset += self.FRAME_SAMPLE.size
+        return bytes(buffer)
+
+    def decode(self, data: bytes):
+        """
+        Decode a payload; truncated or corrupt payloads raise ValueError, like the other codecs.
+        """
+        self._check_size(data, self.HEADER.size)
+        magic, version, kind, flags, count = self.HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Not a struct codec payload")
+        if kind not in (self.AGENT, self.PROCESSED, self.FRAME):
+            raise ValueError(f"Unknown struct codec record kind: {kind}")
+        aware = bool(flags & self.IS_AWARE)
+        if kind == self.FRAME:
+            return self._decode_frame(data, count, aware)
+
+        start = self.HEADER.size
+        schema_version = None
+        if flags & self.HAS_SCHEMA_VERSION:
+            self._check_size(data, start + self.SCHEMA_VERSION.size)
+            schema_version, = self.SCHEMA_VERSION.unpack_from(data, start)
+            start += self.SCHEMA_VERSION.size
+        self._check_size(data, start + self.RECORD.size * count)
+        items = []
+        for road_state, agent_id, x, y, z, latitude, longitude, microseconds in self.RECORD.iter_unpack(
+            memoryview(data)[start:start + self.RECORD.size * count]
+        ):
+            accelerometer = {"x": x, "y": y, "z": z}
+            gps = {"latitude": latitude, "longitude": longitude}
+            timestamp = _from_microseconds(microseconds, aware)
+            if kind == self.PROCESSED:
+                if not 1 <= road_state <= len(ROAD_STATES):
+                    raise ValueError(f"Unknown road state code: {road_state}")
+                item = {
+                    "road_state": ROAD_STATES[road_state - 1],
+                    "agent_data": {
+                        "accelerometer": accelerometer,
+                        "gps": gps,
+                        "timestamp": timestamp,
+                        "agent_id": agent_id,
+                    },
+                }
+                if schema_version is not None:
+                    item["schema_version"] = schema_version
+                items.append(item)
+            else:
+                items.append({"accelerometer": accelerometer, "gps": gps, "time": timestamp, "agent_id": agent_id})
+        if flags & self.IS_LIST:
+            return items
+        if len(items) != 1:
+            raise ValueError(f"Single record payload with {len(items)} records")
+        return items[0]
+
+    def _decode_frame(self, data: bytes, count: int, aware: bool):
+        self._check_size(data, self.HEADER.size + self.FRAME_HEADER.size + self.FRAME_SAMPLE.size * count)
+        agent_id, base_time, latitude, longitude = self.FRAME_HEADER.unpack_from(data, self.HEADER.size)
+        start = self.HEADER.size + self.FRAME_HEADER.size
+        samples = list(self.FRAME_SAMPLE.iter_unpack(memoryview(data)[start:start + self.FRAME_SAMPLE.size * count]))
+        return {
+            "agent_id": agent_id,
+            "base_time": _from_microseconds(base_time, aware),
+            "offsets_us": [sample[0] for sample in samples],
+            "accelerometer": [list(sample[1:]) for sample in samples],
+            "gps": {"latitude": latitude, "longitude": longitude},
+        }
+
+    @staticmethod
+    def _check_size(data: bytes, size: int):
+        if len(data) < size:
+            raise ValueError(f"Truncated struct codec payload: {len(data)} of {size} bytes")
+
+def _to_microseconds(value):
+    """
+    Convert a datetime or an ISO 8601 string to (microseconds since epoch, is_aware).
+    Naive datetimes are kept naive, without any local timezone conversion.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    aware = value.tzinfo is not None
+    if aware:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1), aware
+
+
+def _from_microseconds(microseconds: int, aware: bool) -> str:
+    try:
+        value = EPOCH + timedelta(microseconds=microseconds)
+    except OverflowError as e:
+        raise ValueError(f"Timestamp out of range: {microseconds} us") from e
+    if aware:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+JSON = JsonCodec()
+CODECS = {JSON.name: JSON, StructCodec.name: StructCodec()}
+if msgpack is not None:
+    CODECS[MsgpackCodec.name] = MsgpackCodec()
+CONTENT_TYPES = {codec.content_type: codec for codec in CODECS.values()}
+if msgpack is not None:
+    CONTENT_TYPES["application/x-msgpack"] = CODECS[MsgpackCodec.name]
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Return the codec registered under name ("json", "msgpack" or "struct").
+    """
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown or unavailable codec: {name}")
+
+
+def codec_for_content_type(content_type, default: Codec = JSON) -> Codec:
+    """
+    Select a codec from a Content-Type (or a single Accept) header value.
+    Raises ValueError for media types that no codec handles.
+    """
+    if not content_type:
+        return default
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in ("*/*", ""):
+        return default
+    try:
+        return CONTENT_TYPES[media_type]
+    except KeyError:
+        raise ValueError(f"Unsupported media type: {media_type}")
+
+
+def detect_codec(data: bytes) -> Codec:
+    """
+    Guess the codec of a payload that arrived without a content type (MQTT).
+    """
+    if data[:2] == StructCodec.MAGIC:
+        return CODECS[StructCodec.name]
+    first = data.lstrip()[:1]
+    if first in (b"{", b"[") or msgpack is None:
+        return JSON
+    return CODECS[MsgpackCodec.name]
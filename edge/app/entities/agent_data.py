@@ -1,5 +1,6 @@
-from datetime import datetime
-from pydantic import BaseModel, field_validator
+from datetime import datetime, timedelta
+from typing import List, Tuple
+from pydantic import BaseModel, field_validator, model_validator
 from marshmallow import Schema, fields
 
 
@@ -16,6 +17,7 @@ class AgentData(BaseModel):
     accelerometer: AccelerometerData
     gps: GpsData
     timestamp: datetime
+    agent_id: int = 0
     @classmethod
     @field_validator('timestamp', mode='before')
     def parse_timestamp(cls, value):
@@ -27,7 +29,40 @@ class AgentData(BaseModel):
         except (TypeError, ValueError):
             raise ValueError(
             "Invalid timestamp format. Expected ISO 8601 format(YYYY-MM-DDTHH:MM:SSZ).")
-        
+
+
+class AgentDataBatch(BaseModel):
+    """
+    Batched frame sent by high-rate agents: N accelerometer samples with
+    per-sample offsets from base_time and a single GPS fix for the whole batch.
+    """
+    agent_id: int = 0
+    base_time: datetime
+    offsets_us: List[int]
+    accelerometer: List[Tuple[float, float, float]]
+    gps: GpsData
+
+    @model_validator(mode='after')
+    def check_lengths(self):
+        if len(self.offsets_us) != len(self.accelerometer):
+            raise ValueError("offsets_us and accelerometer must have the same length.")
+        return self
+
+    def to_agent_data(self) -> List[AgentData]:
+        """
+        Unpack the frame into per-sample AgentData.
+        The frame itself is validated, so the samples are built without validating again.
+        """
+        return [
+            AgentData.model_construct(
+                accelerometer=AccelerometerData.model_construct(x=x, y=y, z=z),
+                gps=self.gps,
+                timestamp=self.base_time + timedelta(microseconds=offset),
+                agent_id=self.agent_id,
+            )
+            for offset, (x, y, z) in zip(self.offsets_us, self.accelerometer)
+        ]
+
 
 class AccelerometerDataSchema(Schema):
     x = fields.Float()
@@ -1,6 +1,36 @@
+from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel
-from app.entities.agent_data import AgentData
+from marshmallow import Schema, fields
+from app.entities.agent_data import AgentData, GpsData, GpsDataSchema
+
+# Version of the record layout sent to the hub; every record sent is validated
+# here, so services behind the edge may trust records carrying this marker
+SCHEMA_VERSION = 1
+
+class RunSummary(BaseModel):
+    """
+    Summary of a run of consecutive normal samples of one agent.
+    """
+    start: datetime
+    end: datetime
+    count: int
+    z_min: float
+    z_max: float
+    z_mean: float
+    path: List[GpsData]
 
 class ProcessedAgentData(BaseModel):
     road_state: str
-    agent_data: AgentData
\ No newline at end of file
+    agent_data: AgentData
+    summary: Optional[RunSummary] = None
+
+
+class RunSummarySchema(Schema):
+    start = fields.DateTime()
+    end = fields.DateTime()
+    count = fields.Int()
+    z_min = fields.Float()
+    z_max = fields.Float()
+    z_mean = fields.Float()
+    path = fields.List(fields.Nested(GpsDataSchema))
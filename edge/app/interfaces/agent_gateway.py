@@ -28,8 +28,17 @@ class AgentGateway(ABC):
         """
         pass
     @abstractmethod
-    def stop(self):
+    def stop(self, timeout: float = None) -> bool:
         """
         Method to stop the agent gateway and clean up resources.
+        Parameters:
+        timeout (float): Maximum time in seconds to finish received work, None to wait indefinitely.
+        Returns:
+        bool: True if all received work was finished within timeout, False otherwise.
+        """
+        pass
+    def is_alive(self) -> bool:
+        """
+        Method to check that the gateway is still able to process messages.
         """
-        pass
\ No newline at end of file
+        return True
\ No newline at end of file
@@ -15,4 +15,14 @@ class HubGateway(ABC):
         Returns:
         bool: True if the data is successfully saved, False otherwise.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def close(self, timeout: float = None) -> bool:
+        """
+        Method to send everything still buffered and release resources.
+        Parameters:
+        timeout (float): Maximum time in seconds to wait, None to wait indefinitely.
+        Returns:
+        bool: True if all buffered data was sent within timeout, False otherwise.
+        """
+        return True
@@ -0,0 +1,99 @@
+import threading
+from collections import deque
+
+
+class LatencyStat:
+    """
+    Latency of a processing stage: count, mean, max and percentiles over the
+    most recent observations.
+    """
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._recent.append(seconds)
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            "count": count,
+            "mean_ms": total / count * 1000 if count else 0.0,
+            "p50_ms": _percentile(recent, 0.5) * 1000,
+            "p99_ms": _percentile(recent, 0.99) * 1000,
+            "max_ms": maximum * 1000,
+        }
+
+
+class Metrics:
+    """
+    Registry of counters, gauges and stage latencies of one edge process.
+    Gauges are callables evaluated when a snapshot is taken.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._latencies = {}
+
+    def inc(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name: str, getter):
+        self._gauges[name] = getter
+
+    def latency(self, name: str) -> LatencyStat:
+        with self._lock:
+            if name not in self._latencies:
+                self._latencies[name] = LatencyStat()
+            return self._latencies[name]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            latencies = dict(self._latencies)
+        return {
+            "counters": counters,
+            "gauges": {name: getter() for name, getter in self._gauges.items()},
+            "latency": {name: stat.snapshot() for name, stat in latencies.items()},
+        }
+
+
+def merge_snapshots(snapshots) -> dict:
+    """
+    Combine snapshots of several edge processes. Counters and gauges are summed;
+    for latencies p50 is the count-weighted mean and p99/max the worst process value.
+    """
+    merged = {"counters": {}, "gauges": {}, "latency": {}}
+    for snapshot in snapshots:
+        for section in ("counters", "gauges"):
+            for name, value in snapshot[section].items():
+                merged[section][name] = merged[section].get(name, 0) + value
+        for name, stat in snapshot["latency"].items():
+            total = merged["latency"].setdefault(
+                name, {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+            )
+            count = total["count"] + stat["count"]
+            if count:
+                for key in ("mean_ms", "p50_ms"):
+                    total[key] = (total[key] * total["count"] + stat[key] * stat["count"]) / count
+            total["count"] = count
+            total["p99_ms"] = max(total["p99_ms"], stat["p99_ms"])
+            total["max_ms"] = max(total["max_ms"], stat["max_ms"])
+    return merged
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
@@ -0,0 +1,90 @@
+import logging
+import signal
+import threading
+import time
+from app.adapters.health_http_adapter import HealthHttpAdapter
+from app.interfaces.agent_gateway import AgentGateway
+from app.interfaces.hub_gateway import HubGateway
+from app.metrics import Metrics
+
+class EdgeRuntime:
+    """
+    Lifecycle of one edge process. The main thread sleeps on an event until
+    SIGTERM or SIGINT; shutdown then stops receiving from agents, drains the
+    processing queue and the hub gateway buffers within drain_timeout seconds
+    and reports what could not be delivered.
+    """
+    def __init__(
+        self,
+        agent_gateway: AgentGateway,
+        hub_gateway: HubGateway,
+        metrics: Metrics,
+        drain_timeout: float = 10.0,
+        health_host: str = "0.0.0.0",
+        health_port: int = None,
+        metrics_queue=None,
+        metrics_interval: float = 10.0,
+        worker_index: int = 0,
+    ):
+        self.agent_gateway = agent_gateway
+        self.hub_gateway = hub_gateway
+        self.metrics = metrics
+        self.drain_timeout = drain_timeout
+        self.metrics_queue = metrics_queue
+        self.metrics_interval = metrics_interval
+        self.worker_index = worker_index
+        self.stop_event = threading.Event()
+        self.stopping = False
+        self.health = None
+        if health_port is not None:
+            self.health = HealthHttpAdapter(
+                host=health_host,
+                port=health_port,
+                metrics=metrics,
+                is_alive=agent_gateway.is_alive,
+                is_ready=self.is_ready,
+            )
+
+    def is_ready(self) -> bool:
+        return not self.stopping and getattr(self.agent_gateway, "connected", True)
+
+    def request_stop(self, signum=None, frame=None):
+        if signum is not None:
+            logging.info(f"Received {signal.Signals(signum).name}, shutting down")
+        self.stop_event.set()
+
+    def run(self):
+        """
+        Start the gateways and block until a stop is requested, then drain.
+        Returns True if everything received was delivered within drain_timeout.
+        """
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        if self.health is not None:
+            self.health.start()
+        # Connect to the MQTT broker and start listening for messages
+        self.agent_gateway.connect()
+        self.agent_gateway.start()
+        while not self.stop_event.wait(self.metrics_interval):
+            if self.metrics_queue is not None:
+                self.metrics_queue.put((self.worker_index, self.metrics.snapshot()))
+        return self.shutdown()
+
+    def shutdown(self) -> bool:
+        self.stopping = True
+        deadline = time.monotonic() + self.drain_timeout
+        processed = self.agent_gateway.stop(self.drain_timeout)
+        # Send whatever is still batched for the hub with the rest of the deadline
+        delivered = self.hub_gateway.close(max(0.0, deadline - time.monotonic()))
+        if self.health is not None:
+            self.health.stop()
+        if self.metrics_queue is not None:
+            self.metrics_queue.put((self.worker_index, self.metrics.snapshot()))
+        if processed and delivered:
+            logging.info("System stopped, all received data was delivered.")
+        else:
+            logging.warning(
+                f"System stopped after the {self.drain_timeout}s drain deadline, "
+                f"queue drained: {processed}, hub buffers flushed: {delivered}"
+            )
+        return processed and delivered
@@ -1,25 +1,182 @@
+import threading
+from typing import List
+import numpy as np
 from app.entities.agent_data import AgentData
 from app.entities.processed_agent_data import ProcessedAgentData
 
-def process_agent_data(
-agent_data: AgentData,
-) -> ProcessedAgentData:
+Z_BASELINE = 16541
+
+
+class _AgentState:
+    """
+    Streaming state of one agent: EWMA baseline of z, the last window-1 raw
+    z values for the sliding window and the anomaly event still being tracked.
+    Positions are relative to the start of the batch being processed.
     """
-    Process agent data and classify the state of the road surface.
-    Parameters:
-    agent_data (AgentData): Agent data that contains accelerometer, GPS, and timestamp.
-    Returns:
-    processed_data (ProcessedAgentData): Processed data containing the classified state of
-    the road surface and agent data.
+    def __init__(self, baseline: float, std: float, window: int):
+        self.lock = threading.Lock()
+        self.mean = baseline
+        self.var = std ** 2
+        self.tail = np.full(window - 1, baseline)
+        self.event = None
+
+class _Event:
+    def __init__(self, start: int):
+        self.start = start
+        self.last = start
+        self.peak_deviation = 0.0
+        self.peak_sample = None
+
+    def to_processed_data(self) -> ProcessedAgentData:
+        road_state = "bump" if self.peak_deviation < 0 else "pothole"
+        return ProcessedAgentData(road_state=road_state, agent_data=self.peak_sample)
+
+class RoadStateClassifier:
+    """
+    Per-agent streaming classifier of the road surface.
+
+    z is smoothed with a sliding mean over window samples and compared with
+    an EWMA baseline; samples deviating by more than threshold standard
+    deviations are anomalous. Anomalous samples no more than event_gap
+    samples apart form one event, reported once as a single bump/pothole
+    record at its peak after event_gap normal samples followed it (or after
+    max_event_samples). Normal samples are passed through as "normal" and
+    are the only ones that update the baseline.
+
+    Batches are evaluated with NumPy: the baseline is frozen for the batch
+    and updated afterwards in closed form.
     """
-    z_value = agent_data.accelerometer.z
+    def __init__(
+        self,
+        alpha: float = 0.01,
+        threshold: float = 3.0,
+        min_std: float = 500.0,
+        window: int = 3,
+        event_gap: int = 10,
+        max_event_samples: int = 500,
+        baseline: float = Z_BASELINE,
+    ):
+        if not 0 < alpha < 1:
+            raise ValueError("alpha must be between 0 and 1")
+        if window < 1 or event_gap < 1 or max_event_samples < 1:
+            raise ValueError("window, event_gap and max_event_samples must be positive")
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_std = min_std
+        self.window = window
+        self.event_gap = event_gap
+        self.max_event_samples = max_event_samples
+        self.baseline = baseline
+        self.lock = threading.Lock()
+        self.agents = {}
+        self.events = 0
+
+    def _state(self, agent_id: int) -> _AgentState:
+        with self.lock:
+            state = self.agents.get(agent_id)
+            if state is None:
+                state = self.agents[agent_id] = _AgentState(self.baseline, self.min_std, self.window)
+            return state
+
+    def classify(self, agents_data: List[AgentData]) -> List[ProcessedAgentData]:
+        """
+        Classify a batch of samples. Samples of several agents may be mixed,
+        each agent's samples are expected in time order.
+        Returns normal records and the anomaly events closed by this batch.
+        """
+        by_agent = {}
+        for agent_data in agents_data:
+            by_agent.setdefault(agent_data.agent_id, []).append(agent_data)
+        processed_data = []
+        for agent_id, samples in by_agent.items():
+            state = self._state(agent_id)
+            with state.lock:
+                processed_data.extend(self._classify_agent(state, samples))
+        return processed_data
+
+    def flush(self) -> List[ProcessedAgentData]:
+        """
+        Report the events that are still open, e.g. before shutdown.
+        """
+        with self.lock:
+            states = list(self.agents.values())
+        processed_data = []
+        for state in states:
+            with state.lock:
+                if state.event is not None:
+                    processed_data.append(state.event.to_processed_data())
+                    state.event = None
+        self.events += len(processed_data)
+        return processed_data
+
+    def _classify_agent(self, state: _AgentState, samples: List[AgentData]) -> List[ProcessedAgentData]:
+        count = len(samples)
+        z = np.fromiter((sample.accelerometer.z for sample in samples), dtype=np.float64, count=count)
+        # Sliding mean over the last window samples, continued from the previous batch
+        extended = np.concatenate([state.tail, z])
+        cumulative = np.concatenate([[0.0], np.cumsum(extended)])
+        smoothed = (cumulative[self.window:] - cumulative[:-self.window]) / self.window
+        if self.window > 1:
+            state.tail = extended[-(self.window - 1):]
+
+        std = max(np.sqrt(state.var), self.min_std)
+        deviation = smoothed - state.mean
+        anomalous = np.abs(deviation) > self.threshold * std
+
+        # (position, record) pairs; events are placed where they were closed
+        output = [(int(i), ProcessedAgentData(road_state="normal", agent_data=samples[i]))
+                  for i in np.flatnonzero(~anomalous)]
+        output.extend(self._track_events(state, samples, deviation, np.flatnonzero(anomalous)))
+        output.sort(key=lambda item: item[0])
+
+        self._update_baseline(state, z[~anomalous])
+        return [record for _, record in output]
+
+    def _track_events(self, state: _AgentState, samples, deviation: np.ndarray, indices: np.ndarray):
+        count = len(samples)
+        closed = []
+        event = state.event
+
+        def close(position):
+            closed.append((min(max(position, 0), count - 1), event.to_processed_data()))
 
-    if z_value < 16541 - 1500:
-        road_state = "bump"
-    elif z_value > 16541 + 1500:
-        road_state = "pothole"
-    else:
-        road_state = "normal"
+        if indices.size:
+            groups = np.split(indices, np.flatnonzero(np.diff(indices) > self.event_gap) + 1)
+            for group in groups:
+                if event is not None and group[0] - event.last > self.event_gap:
+                    close(event.last + self.event_gap)
+                    event = None
+                while group.size:
+                    if event is None:
+                        event = _Event(int(group[0]))
+                    part = group[group < event.start + self.max_event_samples]
+                    if part.size:
+                        peak = int(part[np.argmax(np.abs(deviation[part]))])
+                        if event.peak_sample is None or abs(deviation[peak]) > abs(event.peak_deviation):
+                            event.peak_deviation = float(deviation[peak])
+                            event.peak_sample = samples[peak]
+                        event.last = int(part[-1])
+                    group = group[part.size:]
+                    if group.size:
+                        close(int(group[0]))
+                        event = None
+        if event is not None and count - 1 - event.last >= self.event_gap:
+            close(event.last + self.event_gap)
+            event = None
+        if event is not None:
+            event.start -= count
+            event.last -= count
+        state.event = event
+        self.events += len(closed)
+        return closed
 
-    processed_data = ProcessedAgentData(road_state=road_state, agent_data=agent_data)
-    return processed_data
\ No newline at end of file
+    def _update_baseline(self, state: _AgentState, normal: np.ndarray):
+        if not normal.size:
+            return
+        # Closed form of applying the EWMA update to each normal sample in turn
+        decay = 1 - self.alpha
+        weights = self.alpha * decay ** np.arange(normal.size - 1, -1, -1)
+        remaining = decay ** normal.size
+        mean = state.mean
+        state.mean = remaining * mean + np.dot(weights, normal)
+        state.var = remaining * state.var + np.dot(weights, (normal - mean) ** 2)
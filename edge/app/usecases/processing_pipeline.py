@@ -0,0 +1,186 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+from app.entities.agent_data import AgentData
+from app.interfaces.hub_gateway import HubGateway
+from app.metrics import Metrics
+from app.usecases.data_processing import RoadStateClassifier
+from app.usecases.run_reducer import NormalRunReducer
+
+QUEUE_POLICIES = ("block", "drop_newest", "drop_oldest")
+_STOP = object()
+
+
+class ProcessingPipeline:
+    """
+    Staged edge pipeline: the MQTT receive callback only enqueues raw payloads
+    into bounded queues, and a pool of worker threads parses, classifies and
+    delivers them to the hub. Each worker has a queue of its own and the
+    payloads of an agent always go to the queue of worker agent_id % workers,
+    so every agent is handled by one worker, in arrival order. Road state is
+    detected per agent by a streaming RoadStateClassifier shared by the
+    workers; with a reducer, runs of normal records are sent as summaries.
+    A slow hub therefore fills the queues instead of stalling the MQTT
+    network thread.
+
+    Queue policies when a queue is full (queue_size is split between the workers):
+    block - wait up to block_timeout seconds, then drop the new payload;
+    drop_newest - drop the new payload immediately;
+    drop_oldest - evict the oldest queued payload to make room.
+    """
+    def __init__(
+        self,
+        parse: Callable[[bytes], List[AgentData]],
+        hub_gateway: HubGateway,
+        classifier: RoadStateClassifier = None,
+        reducer: NormalRunReducer = None,
+        workers: int = 4,
+        queue_size: int = 10000,
+        policy: str = "block",
+        block_timeout: float = 1.0,
+        metrics: Metrics = None,
+    ):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.parse = parse
+        self.hub_gateway = hub_gateway
+        self.classifier = classifier or RoadStateClassifier()
+        self.reducer = reducer
+        self.workers = workers
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.queues = [queue.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        # Payloads of unknown agents are spread over the workers
+        self.unkeyed = itertools.count()
+        self.threads = []
+        self.metrics = metrics or Metrics()
+        self.metrics.gauge("queue_depth", lambda: sum(shard.qsize() for shard in self.queues))
+        self.metrics.gauge("queue_capacity", lambda: queue_size)
+        self.queue_wait = self.metrics.latency("queue_wait")
+        self.parse_latency = self.metrics.latency("parse")
+        self.classify_latency = self.metrics.latency("classify")
+        self.deliver_latency = self.metrics.latency("deliver")
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(index,), name=f"edge-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def is_alive(self) -> bool:
+        return bool(self.threads) and all(thread.is_alive() for thread in self.threads)
+
+    def shard(self, agent_id: int) -> int:
+        return agent_id % self.workers
+
+    def submit(self, payload, agent_id: Optional[int] = None) -> bool:
+        """
+        Enqueue an agent payload (raw or already decoded) of agent_id; payloads
+        without an agent_id are not ordered. Returns False if it was dropped.
+        """
+        item = (time.perf_counter(), payload)
+        shard = self.queues[self.shard(next(self.unkeyed) if agent_id is None else agent_id)]
+        self.metrics.inc("received")
+        try:
+            if self.policy == "block":
+                shard.put(item, timeout=self.block_timeout)
+            elif self.policy == "drop_newest":
+                shard.put_nowait(item)
+            else:
+                self._put_evicting_oldest(shard, item)
+            return True
+        except queue.Full:
+            self.metrics.inc("dropped")
+            return False
+
+    def _put_evicting_oldest(self, shard: queue.Queue, item):
+        while True:
+            try:
+                shard.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    shard.get_nowait()
+                    shard.task_done()
+                    self.metrics.inc("dropped")
+                except queue.Empty:
+                    pass
+
+    def stop(self, timeout: float = None) -> bool:
+        """
+        Let the workers drain the queue and stop them.
+        Returns True if everything queued was processed within timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            for shard in self.queues[:len(self.threads)]:
+                # Sentinels go after the queued payloads, so the queues are drained first
+                shard.put(_STOP, timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except queue.Full:
+            return False
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        drained = not any(thread.is_alive() for thread in self.threads)
+        self.threads = []
+        if drained:
+            # Anomalies still waiting for their closing samples are reported as they are
+            self._deliver(self.classifier.flush())
+            if self.reducer is not None:
+                self._deliver(self.reducer.flush())
+        return drained
+
+    def _work(self, index: int):
+        shard = self.queues[index]
+        # Runs of agents that went quiet are summarized on time, busy or not,
+        # by the worker of the agent so they stay in order with its records
+        expiry_interval = None if self.reducer is None else self.reducer.max_duration / 4
+        next_expiry = time.monotonic()
+        while True:
+            try:
+                timeout = None if expiry_interval is None else max(0.0, next_expiry - time.monotonic())
+                item = shard.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                try:
+                    if item is _STOP:
+                        return
+                    enqueued_at, payload = item
+                    self.queue_wait.observe(time.perf_counter() - enqueued_at)
+                    self._process(payload)
+                finally:
+                    shard.task_done()
+            if expiry_interval is not None and time.monotonic() >= next_expiry:
+                next_expiry = time.monotonic() + expiry_interval
+                self._deliver(self.reducer.flush_expired(lambda agent_id: self.shard(agent_id) == index))
+
+    def _process(self, payload: bytes):
+        try:
+            started = time.perf_counter()
+            agents_data = self.parse(payload)
+            parsed = time.perf_counter()
+            self.parse_latency.observe(parsed - started)
+
+            processed_data = self.classifier.classify(agents_data)
+            if self.reducer is not None:
+                processed_data = self.reducer.reduce(processed_data)
+            classified = time.perf_counter()
+            self.classify_latency.observe(classified - parsed)
+            self.metrics.inc("samples", len(agents_data))
+
+            self._deliver(processed_data)
+            self.deliver_latency.observe(time.perf_counter() - classified)
+        except Exception as e:
+            self.metrics.inc("errors")
+            logging.error(f"Error processing message: {e}")
+
+    def _deliver(self, processed_data):
+        for item in processed_data:
+            if item.road_state != "normal":
+                self.metrics.inc("events")
+            if not self.hub_gateway.save_data(item):
+                self.metrics.inc("delivery_failed")
+        self.metrics.inc("processed", len(processed_data))
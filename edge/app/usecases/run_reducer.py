@@ -0,0 +1,140 @@
+import threading
+import time
+from typing import Callable, List
+from app.entities.agent_data import AccelerometerData, AgentData
+from app.entities.processed_agent_data import ProcessedAgentData, RunSummary
+
+class _Run:
+    """
+    Normal samples of one agent collected since the last summary.
+    """
+    def __init__(self, first: AgentData):
+        self.opened_at = time.monotonic()
+        self.first = first
+        self.last = first
+        self.count = 0
+        self.x_sum = self.y_sum = self.z_sum = 0.0
+        self.z_min = self.z_max = first.accelerometer.z
+        self.path = []
+
+    def add(self, agent_data: AgentData):
+        accelerometer = agent_data.accelerometer
+        self.last = agent_data
+        self.count += 1
+        self.x_sum += accelerometer.x
+        self.y_sum += accelerometer.y
+        self.z_sum += accelerometer.z
+        self.z_min = min(self.z_min, accelerometer.z)
+        self.z_max = max(self.z_max, accelerometer.z)
+        # Batched samples share one GPS fix, only changes of position are kept
+        if not self.path or self.path[-1] != agent_data.gps:
+            self.path.append(agent_data.gps)
+
+    def to_processed_data(self, max_path_points: int) -> ProcessedAgentData:
+        path = self.path
+        if len(path) > max_path_points:
+            # Evenly thin out the polyline, always keeping both ends
+            step = (len(path) - 1) / (max_path_points - 1)
+            path = [path[round(index * step)] for index in range(max_path_points)]
+        summary = RunSummary(
+            start=self.first.timestamp,
+            end=self.last.timestamp,
+            count=self.count,
+            z_min=self.z_min,
+            z_max=self.z_max,
+            z_mean=self.z_sum / self.count,
+            path=path,
+        )
+        # The representative sample keeps the record usable by consumers that ignore summary
+        agent_data = AgentData(
+            accelerometer=AccelerometerData(
+                x=self.x_sum / self.count,
+                y=self.y_sum / self.count,
+                z=summary.z_mean,
+            ),
+            gps=self.last.gps,
+            timestamp=self.last.timestamp,
+            agent_id=self.last.agent_id,
+        )
+        return ProcessedAgentData(road_state="normal", agent_data=agent_data, summary=summary)
+
+class NormalRunReducer:
+    """
+    Collapses runs of normal records of each agent into one summary record
+    (start/end time, sample count, min/max/mean z and the path polyline).
+
+    A run is summarized when it reaches max_samples samples, when it has been
+    open for max_duration seconds, when a sample leaves the dead band of
+    +-dead_band around the first z of the run (0 disables the check), and
+    right before an anomaly of the same agent, which is passed through as is.
+    """
+    def __init__(
+        self,
+        max_samples: int = 100,
+        max_duration: float = 1.0,
+        dead_band: float = 0.0,
+        max_path_points: int = 20,
+    ):
+        if max_samples < 1 or max_path_points < 2:
+            raise ValueError("max_samples must be positive and max_path_points at least 2")
+        self.max_samples = max_samples
+        self.max_duration = max_duration
+        self.dead_band = dead_band
+        self.max_path_points = max_path_points
+        self.lock = threading.Lock()
+        self.runs = {}
+
+    def reduce(self, processed_data: List[ProcessedAgentData]) -> List[ProcessedAgentData]:
+        """
+        Feed classified records and return the records to send now.
+        """
+        reduced = []
+        with self.lock:
+            for item in processed_data:
+                agent_id = item.agent_data.agent_id
+                if item.road_state != "normal" or item.summary is not None:
+                    self._close(agent_id, reduced)
+                    reduced.append(item)
+                    continue
+                run = self.runs.get(agent_id)
+                if run is not None and self.dead_band and abs(item.agent_data.accelerometer.z - run.first.accelerometer.z) > self.dead_band:
+                    self._close(agent_id, reduced)
+                    run = None
+                if run is None:
+                    run = self.runs[agent_id] = _Run(item.agent_data)
+                run.add(item.agent_data)
+                if run.count >= self.max_samples or time.monotonic() - run.opened_at >= self.max_duration:
+                    self._close(agent_id, reduced)
+        return reduced
+
+    def flush_expired(self, owns: Callable[[int], bool] = None) -> List[ProcessedAgentData]:
+        """
+        Summarize runs that have been open for max_duration seconds, so idle
+        agents are not held back until their next sample; with owns, only
+        runs of the agents it accepts.
+        """
+        reduced = []
+        now = time.monotonic()
+        with self.lock:
+            expired = [
+                agent_id for agent_id, run in self.runs.items()
+                if now - run.opened_at >= self.max_duration and (owns is None or owns(agent_id))
+            ]
+            for agent_id in expired:
+                self._close(agent_id, reduced)
+        return reduced
+
+    def flush(self) -> List[ProcessedAgentData]:
+        """
+        Summarize every open run, e.g. before shutdown.
+        """
+        reduced = []
+        with self.lock:
+            for agent_id in list(self.runs):
+                self._close(agent_id, reduced)
+        return reduced
+
+    def _close(self, agent_id: int, reduced: List[ProcessedAgentData]):
+        run = self.runs.pop(agent_id, None)
+        if run is not None:
+            reduced.append(run.to_processed_data(self.max_path_points))
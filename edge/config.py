@@ -6,15 +6,73 @@ def try_parse_int(value: str):
     except Exception:
         return None
 
+def try_parse_float(value: str):
+    try:
+        return float(value)
+    except Exception:
+        return None
+
 # Configuration for agent MQTT
 MQTT_BROKER_HOST = os.environ.get("MQTT_BROKER_HOST") or "localhost"
 MQTT_BROKER_PORT = try_parse_int(os.environ.get("MQTT_BROKER_PORT")) or 1883
 MQTT_TOPIC = os.environ.get("MQTT_TOPIC") or "agent_data_topic"
+MQTT_QOS = try_parse_int(os.environ.get("MQTT_QOS")) or 0
+# Subscription mode: single, shared (MQTT shared subscription of EDGE_SHARE_GROUP)
+# or partitioned (only EDGE_PARTITIONS, e.g. "0-3,8", of EDGE_TOPIC_PARTITIONS topic
+# partitions; empty - all of them). EDGE_TOPIC_PARTITIONS must match the agents' MQTT_TOPIC_PARTITIONS
+EDGE_SUBSCRIPTION = os.environ.get("EDGE_SUBSCRIPTION") or "single"
+EDGE_SHARE_GROUP = os.environ.get("EDGE_SHARE_GROUP") or "edge"
+EDGE_TOPIC_PARTITIONS = try_parse_int(os.environ.get("EDGE_TOPIC_PARTITIONS")) or 0
+EDGE_PARTITIONS = os.environ.get("EDGE_PARTITIONS") or ""
 # Configuration for hub MQTT
 HUB_MQTT_BROKER_HOST = os.environ.get("HUB_MQTT_BROKER_HOST") or "localhost"
 HUB_MQTT_BROKER_PORT = try_parse_int(os.environ.get("HUB_MQTT_BROKER_PORT")) or 1883
 HUB_MQTT_TOPIC = os.environ.get("HUB_MQTT_TOPIC") or "processed_agent_data_topic"
+HUB_MQTT_QOS = try_parse_int(os.environ.get("HUB_MQTT_QOS"))
+HUB_MQTT_QOS = 1 if HUB_MQTT_QOS is None else HUB_MQTT_QOS
+# Edge -> hub transport: http or mqtt
+HUB_GATEWAY = os.environ.get("HUB_GATEWAY") or "http"
 # Configuration for hub HTTP
 HUB_HOST = os.environ.get("HUB_HOST") or "localhost"
 HUB_PORT = try_parse_int(os.environ.get("HUB_PORT")) or 9000
-HUB_URL = f"http://{HUB_HOST}:{HUB_PORT}"
\ No newline at end of file
+HUB_URL = f"http://{HUB_HOST}:{HUB_PORT}"
+# Batching of edge -> hub messages (both transports): flush after HUB_BATCH_SIZE records or
+# HUB_BATCH_LINGER_MS milliseconds, with up to HUB_MAX_IN_FLIGHT unacknowledged batches
+HUB_BATCH_SIZE = try_parse_int(os.environ.get("HUB_BATCH_SIZE")) or 500
+HUB_BATCH_LINGER_MS = try_parse_int(os.environ.get("HUB_BATCH_LINGER_MS")) or 50
+HUB_MAX_IN_FLIGHT = try_parse_int(os.environ.get("HUB_MAX_IN_FLIGHT")) or 4
+# Wire codec for edge -> hub messages: json, msgpack or struct (no run summaries,
+# only with EDGE_SUMMARY_MAX_SAMPLES=1)
+HUB_CODEC = os.environ.get("HUB_CODEC") or "json"
+# Edge processing pipeline: worker threads (each agent is handled by one of them, in order),
+# bounded queue size split between the workers and policy when a queue is full
+# (block, drop_newest or drop_oldest);
+# with "block" the MQTT thread waits up to EDGE_QUEUE_BLOCK_TIMEOUT seconds
+EDGE_WORKERS = try_parse_int(os.environ.get("EDGE_WORKERS")) or 4
+EDGE_QUEUE_SIZE = try_parse_int(os.environ.get("EDGE_QUEUE_SIZE")) or 10000
+EDGE_QUEUE_POLICY = os.environ.get("EDGE_QUEUE_POLICY") or "block"
+EDGE_QUEUE_BLOCK_TIMEOUT = try_parse_float(os.environ.get("EDGE_QUEUE_BLOCK_TIMEOUT")) or 1.0
+# Streaming road state classifier: EWMA baseline weight, anomaly threshold in
+# standard deviations (never below EDGE_CLASSIFIER_MIN_STD), sliding window of
+# smoothed samples, and samples separating two anomaly events
+EDGE_CLASSIFIER_ALPHA = try_parse_float(os.environ.get("EDGE_CLASSIFIER_ALPHA")) or 0.01
+EDGE_CLASSIFIER_THRESHOLD = try_parse_float(os.environ.get("EDGE_CLASSIFIER_THRESHOLD")) or 3.0
+EDGE_CLASSIFIER_MIN_STD = try_parse_float(os.environ.get("EDGE_CLASSIFIER_MIN_STD")) or 500.0
+EDGE_CLASSIFIER_WINDOW = try_parse_int(os.environ.get("EDGE_CLASSIFIER_WINDOW")) or 3
+EDGE_CLASSIFIER_EVENT_GAP = try_parse_int(os.environ.get("EDGE_CLASSIFIER_EVENT_GAP")) or 10
+# Summaries of normal runs: a run of normal samples is sent as one record after
+# EDGE_SUMMARY_MAX_SAMPLES samples or EDGE_SUMMARY_MAX_SECONDS seconds, or when z
+# leaves +-EDGE_SUMMARY_DEAD_BAND around the run start (0 disables the dead band);
+# EDGE_SUMMARY_MAX_SAMPLES=1 sends every normal sample on its own
+EDGE_SUMMARY_MAX_SAMPLES = try_parse_int(os.environ.get("EDGE_SUMMARY_MAX_SAMPLES")) or 100
+EDGE_SUMMARY_MAX_SECONDS = try_parse_float(os.environ.get("EDGE_SUMMARY_MAX_SECONDS")) or 1.0
+EDGE_SUMMARY_DEAD_BAND = try_parse_float(os.environ.get("EDGE_SUMMARY_DEAD_BAND")) or 0.0
+EDGE_SUMMARY_MAX_PATH_POINTS = try_parse_int(os.environ.get("EDGE_SUMMARY_MAX_PATH_POINTS")) or 20
+# Launcher: edge processes (0 - one per CPU core) and metrics report interval in seconds
+EDGE_PROCESSES = try_parse_int(os.environ.get("EDGE_PROCESSES")) or 0
+EDGE_METRICS_INTERVAL = try_parse_float(os.environ.get("EDGE_METRICS_INTERVAL")) or 10.0
+# Runtime: seconds to deliver queued data on shutdown, and the local health
+# endpoint (/healthz, /readyz, /stats); launcher processes use EDGE_HEALTH_PORT + index
+EDGE_DRAIN_TIMEOUT = try_parse_float(os.environ.get("EDGE_DRAIN_TIMEOUT")) or 10.0
+EDGE_HEALTH_HOST = os.environ.get("EDGE_HEALTH_HOST") or "0.0.0.0"
+EDGE_HEALTH_PORT = try_parse_int(os.environ.get("EDGE_HEALTH_PORT")) or 8080
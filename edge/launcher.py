@@ -0,0 +1,83 @@
+"""
+Runs several edge processes on one host, one per CPU core by default, and
+periodically logs their combined metrics.
+
+With EDGE_SUBSCRIPTION=partitioned the topic partitions (EDGE_PARTITIONS, all
+by default) are split between the processes, partition p going to process
+p % processes, so every agent is handled by exactly one process and keeps its
+classifier state. With EDGE_SUBSCRIPTION=shared all processes join one shared
+subscription instead.
+
+Usage: python launcher.py [--processes N]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import main
+from app.adapters.agent_mqtt_adapter import parse_partitions
+from app.metrics import merge_snapshots
+from config import EDGE_SUBSCRIPTION, EDGE_TOPIC_PARTITIONS, EDGE_PARTITIONS, EDGE_PROCESSES, EDGE_METRICS_INTERVAL, EDGE_DRAIN_TIMEOUT
+
+def assign_partitions(processes: int):
+    """
+    Partitions of every process; None for modes without partitions.
+    """
+    if EDGE_SUBSCRIPTION != "partitioned":
+        return [None] * processes
+    partitions = parse_partitions(EDGE_PARTITIONS, EDGE_TOPIC_PARTITIONS)
+    if len(partitions) < processes:
+        raise ValueError(f"{len(partitions)} partitions cannot be shared by {processes} processes")
+    return [[partition for partition in partitions if partition % processes == index] for index in range(processes)]
+
+def worker(index, owned_partitions, metrics_queue):
+    main.configure_logging()
+    main.run(owned_partitions=owned_partitions, metrics_queue=metrics_queue, worker_index=index)
+
+def launch(processes: int):
+    metrics_queue = multiprocessing.Queue()
+    children = [
+        multiprocessing.Process(target=worker, args=(index, owned, metrics_queue), name=f"edge-{index}")
+        for index, owned in enumerate(assign_partitions(processes))
+    ]
+    for child in children:
+        child.start()
+    logging.info(f"Started {processes} edge processes")
+
+    # Docker stops containers with SIGTERM; handle it like Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    snapshots = {}
+    last_report = time.monotonic()
+    try:
+        while any(child.is_alive() for child in children):
+            try:
+                index, snapshot = metrics_queue.get(timeout=1.0)
+                snapshots[index] = snapshot
+            except queue.Empty:
+                pass
+            if snapshots and time.monotonic() - last_report >= EDGE_METRICS_INTERVAL:
+                last_report = time.monotonic()
+                merged = merge_snapshots(snapshots.values())
+                logging.info(f"Edge metrics ({len(snapshots)}/{processes} processes): {merged}")
+        logging.info("All edge processes exited")
+    except KeyboardInterrupt:
+        # Every process drains its own queue within EDGE_DRAIN_TIMEOUT
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signal.SIGTERM)
+        deadline = time.monotonic() + EDGE_DRAIN_TIMEOUT + 5
+        for child in children:
+            child.join(max(0.0, deadline - time.monotonic()))
+            if child.is_alive():
+                child.terminate()
+        logging.info("System stopped.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one edge process per CPU core")
+    parser.add_argument("--processes", type=int, default=EDGE_PROCESSES or os.cpu_count())
+    args = parser.parse_args()
+    main.configure_logging()
+    launch(args.processes)
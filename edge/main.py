@@ -1,10 +1,15 @@
 import logging
-from app.adapters.agent_mqtt_adapter import AgentMQTTAdapter
+from app.adapters.agent_mqtt_adapter import AgentMQTTAdapter, parse_partitions
 from app.adapters.hub_http_adapter import HubHttpAdapter
-# from app.adapters.hub_mqtt_adapter import HubMqttAdapter
-from config import MQTT_BROKER_HOST, MQTT_BROKER_PORT, MQTT_TOPIC, HUB_URL, HUB_MQTT_BROKER_HOST, HUB_MQTT_BROKER_PORT, HUB_MQTT_TOPIC
+from app.adapters.hub_mqtt_adapter import HubMqttAdapter
+from app.codec import get_codec
+from app.metrics import Metrics
+from app.runtime import EdgeRuntime
+from app.usecases.data_processing import RoadStateClassifier
+from app.usecases.run_reducer import NormalRunReducer
+from config import MQTT_BROKER_HOST, MQTT_BROKER_PORT, MQTT_TOPIC, MQTT_QOS, HUB_URL, HUB_MQTT_BROKER_HOST, HUB_MQTT_BROKER_PORT, HUB_MQTT_TOPIC, HUB_MQTT_QOS, HUB_GATEWAY, HUB_CODEC, HUB_BATCH_SIZE, HUB_BATCH_LINGER_MS, HUB_MAX_IN_FLIGHT, EDGE_WORKERS, EDGE_QUEUE_SIZE, EDGE_QUEUE_POLICY, EDGE_QUEUE_BLOCK_TIMEOUT, EDGE_CLASSIFIER_ALPHA, EDGE_CLASSIFIER_THRESHOLD, EDGE_CLASSIFIER_MIN_STD, EDGE_CLASSIFIER_WINDOW, EDGE_CLASSIFIER_EVENT_GAP, EDGE_SUMMARY_MAX_SAMPLES, EDGE_SUMMARY_MAX_SECONDS, EDGE_SUMMARY_DEAD_BAND, EDGE_SUMMARY_MAX_PATH_POINTS, EDGE_SUBSCRIPTION, EDGE_SHARE_GROUP, EDGE_TOPIC_PARTITIONS, EDGE_PARTITIONS, EDGE_METRICS_INTERVAL, EDGE_DRAIN_TIMEOUT, EDGE_HEALTH_HOST, EDGE_HEALTH_PORT
 
-if __name__ == "__main__":
+def configure_logging():
     # Configure logging settings
     logging.basicConfig(
         level=logging.INFO, # Set the log level to INFO (you can use logging.DEBUG for more detailed logs)
@@ -15,30 +20,92 @@ if __name__ == "__main__":
         ],
     )
 
-# Create an instance of the StoreApiAdapter using the configuration
-hub_adapter = HubHttpAdapter(
-api_base_url=HUB_URL,
-)
-# hub_adapter = HubMqttAdapter(
-# broker=HUB_MQTT_BROKER_HOST,
-# port=HUB_MQTT_BROKER_PORT,
-# topic=HUB_MQTT_TOPIC,
-# )
-# Create an instance of the AgentMQTTAdapter using the configuration
-agent_adapter = AgentMQTTAdapter(
-broker_host=MQTT_BROKER_HOST,
-broker_port=MQTT_BROKER_PORT,
-topic=MQTT_TOPIC,
-hub_gateway=hub_adapter,
-)
-try:
-    # Connect to the MQTT broker and start listening for messages
-    agent_adapter.connect()
-    agent_adapter.start()
-    # Keep the system running indefinitely (you can add other logic as needed)
-    while True:
-        pass
-except KeyboardInterrupt:
-    # Stop the MQTT adapter and exit gracefully if interrupted by the user
-    agent_adapter.stop()
-    logging.info("System stopped.")
\ No newline at end of file
+def create_hub_adapter(metrics: Metrics):
+    # Create an instance of the hub gateway using the configuration
+    if HUB_GATEWAY == "mqtt":
+        return HubMqttAdapter(
+        broker=HUB_MQTT_BROKER_HOST,
+        port=HUB_MQTT_BROKER_PORT,
+        topic=HUB_MQTT_TOPIC,
+        codec=get_codec(HUB_CODEC),
+        qos=HUB_MQTT_QOS,
+        batch_size=HUB_BATCH_SIZE,
+        batch_linger=HUB_BATCH_LINGER_MS / 1000,
+        max_in_flight=HUB_MAX_IN_FLIGHT,
+        metrics=metrics,
+        )
+    if HUB_GATEWAY == "http":
+        return HubHttpAdapter(
+        api_base_url=HUB_URL,
+        codec=get_codec(HUB_CODEC),
+        batch_size=HUB_BATCH_SIZE,
+        batch_linger=HUB_BATCH_LINGER_MS / 1000,
+        max_in_flight=HUB_MAX_IN_FLIGHT,
+        metrics=metrics,
+        )
+    raise ValueError(f"Unknown hub gateway: {HUB_GATEWAY}")
+
+def run(owned_partitions=None, metrics_queue=None, worker_index=0):
+    """
+    Run one edge process until SIGTERM or SIGINT.
+    owned_partitions - topic partitions of this process (default EDGE_PARTITIONS);
+    metrics_queue - queue receiving (worker_index, metrics snapshot) every EDGE_METRICS_INTERVAL seconds.
+    """
+    metrics = Metrics()
+    hub_adapter = create_hub_adapter(metrics)
+    # Create an instance of the RoadStateClassifier using the configuration
+    classifier = RoadStateClassifier(
+    alpha=EDGE_CLASSIFIER_ALPHA,
+    threshold=EDGE_CLASSIFIER_THRESHOLD,
+    min_std=EDGE_CLASSIFIER_MIN_STD,
+    window=EDGE_CLASSIFIER_WINDOW,
+    event_gap=EDGE_CLASSIFIER_EVENT_GAP,
+    )
+    # Create an instance of the NormalRunReducer using the configuration
+    reducer = None
+    if EDGE_SUMMARY_MAX_SAMPLES > 1:
+        if HUB_CODEC == "struct":
+            raise ValueError("The struct codec cannot carry run summaries, use json or msgpack or set EDGE_SUMMARY_MAX_SAMPLES=1")
+        reducer = NormalRunReducer(
+        max_samples=EDGE_SUMMARY_MAX_SAMPLES,
+        max_duration=EDGE_SUMMARY_MAX_SECONDS,
+        dead_band=EDGE_SUMMARY_DEAD_BAND,
+        max_path_points=EDGE_SUMMARY_MAX_PATH_POINTS,
+        )
+    if owned_partitions is None and EDGE_SUBSCRIPTION == "partitioned":
+        owned_partitions = parse_partitions(EDGE_PARTITIONS, EDGE_TOPIC_PARTITIONS)
+    # Create an instance of the AgentMQTTAdapter using the configuration
+    agent_adapter = AgentMQTTAdapter(
+    broker_host=MQTT_BROKER_HOST,
+    broker_port=MQTT_BROKER_PORT,
+    topic=MQTT_TOPIC,
+    hub_gateway=hub_adapter,
+    classifier=classifier,
+    reducer=reducer,
+    workers=EDGE_WORKERS,
+    queue_size=EDGE_QUEUE_SIZE,
+    queue_policy=EDGE_QUEUE_POLICY,
+    queue_block_timeout=EDGE_QUEUE_BLOCK_TIMEOUT,
+    metrics=metrics,
+    subscription=EDGE_SUBSCRIPTION,
+    partitions=EDGE_TOPIC_PARTITIONS,
+    owned_partitions=owned_partitions,
+    share_group=EDGE_SHARE_GROUP,
+    qos=MQTT_QOS,
+    )
+    runtime = EdgeRuntime(
+    agent_gateway=agent_adapter,
+    hub_gateway=hub_adapter,
+    metrics=metrics,
+    drain_timeout=EDGE_DRAIN_TIMEOUT,
+    health_host=EDGE_HEALTH_HOST,
+    health_port=EDGE_HEALTH_PORT + worker_index,
+    metrics_queue=metrics_queue,
+    metrics_interval=EDGE_METRICS_INTERVAL,
+    worker_index=worker_index,
+    )
+    return runtime.run()
+
+if __name__ == "__main__":
+    configure_logging()
+    run()
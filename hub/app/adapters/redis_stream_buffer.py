@@ -0,0 +1,168 @@
+import logging
+import socket
+import time
+from typing import List, Tuple
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from app.codec import Codec, JSON
+from app.entities.trusted_record import decode_records
+
+class RedisStreamBuffer:
+    """
+    Durable hub buffer on a Redis Stream with a consumer group, used through
+    the asyncio Redis client.
+
+    Producers append records with pipelined XADD (one round trip per batch).
+    Consumers read them in stream order with XREADGROUP; entries stay in the
+    group's pending list until ack() (XACK + XDEL), so records whose delivery
+    failed are never lost, and reclaim() (XAUTOCLAIM) takes over entries left
+    pending by a consumer that crashed; consumers left idle without pending
+    entries are then deleted from the group. Entries the store will not accept
+    are moved to the dead-letter stream (capped at dead_letter_maxlen).
+    """
+    def __init__(
+        self,
+        redis_client: Redis,
+        validator,
+        codec: Codec = JSON,
+        stream: str = "processed_agent_data_stream",
+        group: str = "store_flusher",
+        consumer: str = None,
+        dead_letter_stream: str = None,
+        dead_letter_maxlen: int = 100000,
+    ):
+        self.redis = redis_client
+        self.validator = validator
+        self.codec = codec
+        self.stream = stream
+        self.group = group
+        # Stable across restarts of a replica, so restarts do not add consumers to the group
+        self.consumer = consumer or socket.gethostname()
+        self.dead_letter_stream = dead_letter_stream or f"{stream}_dead"
+        self.dead_letter_maxlen = dead_letter_maxlen
+
+    async def ensure_group(self):
+        """
+        Create the stream and the consumer group if they do not exist yet.
+        """
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def add(self, records: List) -> List[bytes]:
+        """
+        Append records, returns their stream ids.
+        """
+        if not records:
+            return []
+        pipeline = self.redis.pipeline(transaction=False)
+        for record in records:
+            pipeline.xadd(self.stream, {"d": self.codec.encode(record.dict())})
+        return await pipeline.execute()
+
+    async def read(self, count: int, block_ms: int = 1000) -> List[Tuple[bytes, object]]:
+        """
+        Take up to count new entries for this consumer, waiting up to block_ms for the first one.
+        """
+        response = await self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"}, count=count, block=block_ms)
+        if not response:
+            return []
+        return await self._decode(response[0][1])
+
+    async def reclaim(self, min_idle_ms: int, count: int = 1000) -> List[Tuple[bytes, object]]:
+        """
+        Take over entries pending longer than min_idle_ms, oldest first, then
+        delete the consumers idle as long that have nothing pending any more.
+        """
+        entries = []
+        start = "0-0"
+        while True:
+            response = await self.redis.xautoclaim(
+                self.stream, self.group, self.consumer, min_idle_time=min_idle_ms, start_id=start, count=count
+            )
+            start, claimed = response[0], response[1]
+            entries.extend(entry for entry in claimed if entry[1])
+            # Redis 6.2 returns entries deleted meanwhile without fields; they have nothing to deliver
+            await self.ack([entry_id for entry_id, fields in claimed if not fields])
+            if start in (b"0-0", "0-0") or not claimed:
+                break
+        await self._delete_idle_consumers(min_idle_ms)
+        return await self._decode(entries)
+
+    async def _delete_idle_consumers(self, min_idle_ms: int):
+        consumers = await self.redis.xinfo_consumers(self.stream, self.group)
+        pipeline = self.redis.pipeline(transaction=False)
+        for consumer in consumers:
+            name = consumer["name"].decode() if isinstance(consumer["name"], bytes) else consumer["name"]
+            if name != self.consumer and consumer["pending"] == 0 and consumer["idle"] >= min_idle_ms:
+                pipeline.xgroup_delconsumer(self.stream, self.group, name)
+        if len(pipeline):
+            await pipeline.execute()
+
+    async def ack(self, ids: List[bytes]):
+        """
+        Acknowledge delivered entries and delete them from the stream.
+        """
+        if not ids:
+            return
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.xack(self.stream, self.group, *ids)
+        pipeline.xdel(self.stream, *ids)
+        await pipeline.execute()
+
+    async def dead_letter(self, entries: List[Tuple[bytes, object]], reason: str):
+        """
+        Move entries to the dead-letter stream with their original id and the reason, and acknowledge them.
+        """
+        if not entries:
+            return
+        pipeline = self.redis.pipeline(transaction=False)
+        for entry_id, record in entries:
+            pipeline.xadd(
+                self.dead_letter_stream,
+                {"d": self.codec.encode(record.dict()), "id": entry_id, "error": reason[:1000]},
+                maxlen=self.dead_letter_maxlen,
+                approximate=True,
+            )
+        ids = [entry_id for entry_id, _ in entries]
+        pipeline.xack(self.stream, self.group, *ids)
+        pipeline.xdel(self.stream, *ids)
+        await pipeline.execute()
+
+    async def pending(self) -> int:
+        return (await self.redis.xpending(self.stream, self.group))["pending"]
+
+    async def length(self) -> int:
+        return await self.redis.xlen(self.stream)
+
+    async def backlog(self) -> Tuple[int, float]:
+        """
+        Entries not yet delivered and the age in seconds of the oldest of them.
+        """
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.xlen(self.stream)
+        pipeline.xrange(self.stream, count=1)
+        length, oldest = await pipeline.execute()
+        if not oldest:
+            return length, 0.0
+        # Delivered entries are deleted, so the first one is the oldest still waiting;
+        # its id starts with the Redis time of XADD in milliseconds
+        entry_id = oldest[0][0]
+        milliseconds = int((entry_id.decode() if isinstance(entry_id, bytes) else entry_id).partition("-")[0])
+        return length, max(0.0, time.time() - milliseconds / 1000)
+
+    async def _decode(self, entries) -> List[Tuple[bytes, object]]:
+        decoded = []
+        poisoned = []
+        for entry_id, fields in entries:
+            try:
+                # Records were validated before they were added, so they take the fast path
+                record = decode_records([self.codec.decode(fields[b"d"])], self.validator)[0]
+                decoded.append((entry_id, record))
+            except Exception as e:
+                logging.error(f"Dropping undecodable stream entry {entry_id}: {e}")
+                poisoned.append(entry_id)
+        await self.ack(poisoned)
+        return decoded
@@ -1,25 +1,51 @@
-import json
 import logging
 from typing import List
-# import pydantic_core
-import requests
+import httpx
+from app.codec import Codec, JSON
 from app.entities.processed_agent_data import ProcessedAgentData
-from app.interfaces.store_api_gateway import StoreGateway
-from config import BATCH_SIZE
+from app.interfaces.store_api_gateway import StoreGateway, StoreRequestError
+
+# Responses of a store that is unavailable or overloaded rather than failing on the batch
+UNAVAILABLE_STATUSES = (408, 429, 502, 503, 504)
 
 class StoreApiAdapter(StoreGateway):
-    def __init__(self, api_base_url):
+    """
+    Sends batches to the store over a pool of up to max_connections
+    keep-alive connections, without blocking the event loop.
+    """
+    def __init__(self, api_base_url, codec: Codec = JSON, max_connections: int = 10, timeout: float = 10):
         self.api_base_url = api_base_url
-    def save_data(self, processed_agent_data_batch: List[ProcessedAgentData]):
-        if(len(processed_agent_data_batch) < BATCH_SIZE):
-            return
-        api_url = f"{self.api_base_url}/processed_agent_data"
+        self.codec = codec
+        self.client = httpx.AsyncClient(
+            base_url=api_base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+        )
+    async def save_data(self, processed_agent_data_batch: List[ProcessedAgentData]):
+        if not processed_agent_data_batch:
+            return True
+        try:
+            data_to_send = self.codec.encode([item.dict() for item in processed_agent_data_batch])
+        except (TypeError, ValueError) as e:
+            raise StoreRequestError(f"Cannot encode the batch: {e}", permanent=True) from e
         try:
-            data_to_send = [item.dict() for item in processed_agent_data_batch]
             print("ACTION: HUB SEND DATA TO STORE")
-            response = requests.post(api_url, json=data_to_send)
-            response.raise_for_status()
-            return True
-        except requests.RequestException as e:
-            print(f"Error sending processed data: {e}")
-            return False
\ No newline at end of file
+            response = await self.client.post(
+                "/processed_agent_data/", content=data_to_send, headers={"Content-Type": self.codec.content_type}
+            )
+        except httpx.HTTPError as e:
+            # Connection errors and timeouts
+            logging.error(f"Error sending processed data: {e}")
+            return False
+        if response.status_code in UNAVAILABLE_STATUSES:
+            logging.error(f"Store unavailable: {response.status_code}")
+            return False
+        if response.is_error:
+            # 4xx: the store rejected the records; other 5xx may be caused by them as well
+            raise StoreRequestError(
+                f"Store answered {response.status_code}: {response.text[:500]}",
+                permanent=response.status_code < 500,
+            )
+        return True
+    async def close(self):
+        await self.client.aclose()
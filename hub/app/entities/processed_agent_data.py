@@ -1,11 +1,53 @@
+from datetime import datetime
+from typing import Dict, List, Optional
 from pydantic import BaseModel
-from app.entities.agent_data import AgentData
+from app.entities.agent_data import AgentData, GpsData
+from app.entities.trusted_record import SCHEMA_VERSION
+
+class RunSummary(BaseModel):
+    start: datetime
+    end: datetime
+    count: int
+    z_min: float
+    z_max: float
+    z_mean: float
+    path: List[GpsData]
+    def dict(self, *args, **kwargs):
+        data_dict = super().dict(*args, **kwargs)
+        data_dict['start'] = self.start.isoformat()
+        data_dict['end'] = self.end.isoformat()
+        return data_dict
+
+class CellAggregate(BaseModel):
+    cell: str
+    start: datetime
+    end: datetime
+    count: int
+    counts: Dict[str, int]
+    z_min: float
+    z_max: float
+    z_mean: float
+    z_std: float
+    def dict(self, *args, **kwargs):
+        data_dict = super().dict(*args, **kwargs)
+        data_dict['start'] = self.start.isoformat()
+        data_dict['end'] = self.end.isoformat()
+        return data_dict
 
 class ProcessedAgentData(BaseModel):
     road_state: str
     agent_data: AgentData
+    summary: Optional[RunSummary] = None
+    # Set on records of windows pre-aggregated by the hub
+    aggregate: Optional[CellAggregate] = None
     def dict(self, *args, **kwargs):
         # Remove agent_data from the dictionary to avoid recursion error
         data_dict = super().dict(*args, **kwargs)
         data_dict['agent_data'] = self.agent_data.dict()
-        return data_dict
\ No newline at end of file
+        if self.summary is not None:
+            data_dict['summary'] = self.summary.dict()
+        if self.aggregate is not None:
+            data_dict['aggregate'] = self.aggregate.dict()
+        # Validated here, so the next hop may take the fast path
+        data_dict['schema_version'] = SCHEMA_VERSION
+        return data_dict
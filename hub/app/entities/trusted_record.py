@@ -0,0 +1,103 @@
+"""
+Lightweight records for trusted internal hops.
+
+The edge validates every record once and marks it with schema_version.
+Services behind it may skip pydantic for records carrying a trusted version
+and wrap the decoded dicts in slotted dataclasses that expose the same
+attributes and dict() as the ProcessedAgentData models. Hub and store keep
+identical copies of this module.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+SCHEMA_VERSION = 1
+
+
+@dataclass(slots=True)
+class AccelerometerRecord:
+    x: float
+    y: float
+    z: float
+
+    def dict(self) -> dict:
+        return {"x": self.x, "y": self.y, "z": self.z}
+
+
+@dataclass(slots=True)
+class GpsRecord:
+    latitude: float
+    longitude: float
+
+    def dict(self) -> dict:
+        return {"latitude": self.latitude, "longitude": self.longitude}
+
+
+@dataclass(slots=True)
+class AgentRecord:
+    accelerometer: AccelerometerRecord
+    gps: GpsRecord
+    timestamp: datetime
+
+    def dict(self) -> dict:
+        return {
+            "accelerometer": self.accelerometer.dict(),
+            "gps": self.gps.dict(),
+            "timestamp": self.timestamp.isoformat(),
+        }
+
+
+@dataclass(slots=True)
+class ProcessedRecord:
+    road_state: str
+    agent_data: AgentRecord
+    # Kept as sent by the edge: ISO timestamps, path as a list of dicts
+    summary: Optional[dict] = None
+    # Set on windows pre-aggregated by the hub
+    aggregate: Optional[dict] = None
+
+    def dict(self) -> dict:
+        return {
+            "road_state": self.road_state,
+            "agent_data": self.agent_data.dict(),
+            "summary": self.summary,
+            "aggregate": self.aggregate,
+            "schema_version": SCHEMA_VERSION,
+        }
+
+
+def from_trusted(item: dict) -> ProcessedRecord:
+    """
+    Wrap one decoded record without validating its fields.
+    """
+    agent_data = item["agent_data"]
+    accelerometer = agent_data["accelerometer"]
+    gps = agent_data["gps"]
+    timestamp = agent_data["timestamp"]
+    return ProcessedRecord(
+        road_state=item["road_state"],
+        agent_data=AgentRecord(
+            accelerometer=AccelerometerRecord(accelerometer["x"], accelerometer["y"], accelerometer["z"]),
+            gps=GpsRecord(gps["latitude"], gps["longitude"]),
+            timestamp=timestamp if isinstance(timestamp, datetime) else datetime.fromisoformat(timestamp),
+        ),
+        summary=item.get("summary"),
+        aggregate=item.get("aggregate"),
+    )
+
+
+def decode_records(items: list, validator, trusted_version: int = SCHEMA_VERSION) -> List:
+    """
+    Build records from decoded dicts. When trusted_version is set and every
+    item carries it, the items are wrapped without validation; otherwise the
+    whole batch goes through validator, a precompiled TypeAdapter(List[...]).
+    """
+    if trusted_version and all(
+        isinstance(item, dict) and item.get("schema_version") == trusted_version for item in items
+    ):
+        try:
+            return [from_trusted(item) for item in items]
+        except (KeyError, TypeError, ValueError):
+            # Malformed despite the marker: let the validator report what is wrong
+            pass
+    return validator.validate_python(items)
@@ -2,13 +2,22 @@ from abc import ABC, abstractmethod
 from typing import List
 from app.entities.processed_agent_data import ProcessedAgentData
 
+class StoreRequestError(Exception):
+    """
+    The store answered a batch with an error. Permanent errors (the store
+    rejected the records) cannot be fixed by sending the same records again.
+    """
+    def __init__(self, message: str, permanent: bool):
+        super().__init__(message)
+        self.permanent = permanent
+
 class StoreGateway(ABC):
     """
     Abstract class representing the Store Gateway interface.
     All store gateway adapters must implement these methods.
     """
     @abstractmethod
-    def save_data(self, processed_agent_data_batch:
+    async def save_data(self, processed_agent_data_batch:
     List[ProcessedAgentData]) -> bool:
         """
         Method to save the processed agent data in the database.
@@ -16,6 +25,15 @@ class StoreGateway(ABC):
         processed_agent_data_batch (ProcessedAgentData): The processed
         agent data to be saved.
         Returns:
-        bool: True if the data is successfully saved, False otherwise.
+        bool: True if the data is successfully saved, False if the store
+        could not be reached or is overloaded.
+        Raises:
+        StoreRequestError: if the store answered with another error.
+        """
+        pass
+
+    async def close(self):
+        """
+        Release the connections of the gateway.
         """
         pass
\ No newline at end of file
@@ -0,0 +1,113 @@
+import bisect
+import threading
+from collections import deque
+
+
+class LatencyStat:
+    """
+    Latency of a processing stage: count, mean, max and percentiles over the
+    most recent observations.
+    """
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._recent.append(seconds)
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            "count": count,
+            "mean_ms": total / count * 1000 if count else 0.0,
+            "p50_ms": _percentile(recent, 0.5) * 1000,
+            "p99_ms": _percentile(recent, 0.99) * 1000,
+            "max_ms": maximum * 1000,
+        }
+
+
+class Histogram:
+    """
+    Counts of observed values per bucket; bucket i counts values up to bounds[i],
+    the last one everything above.
+    """
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+            return {
+                "count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "buckets": dict(zip(labels, self.counts)),
+            }
+
+
+class Metrics:
+    """
+    Registry of counters, gauges, histograms and latencies of the hub.
+    Gauges are callables evaluated when a snapshot is taken.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._latencies = {}
+        self._histograms = {}
+
+    def inc(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name: str, getter):
+        self._gauges[name] = getter
+
+    def latency(self, name: str) -> LatencyStat:
+        with self._lock:
+            if name not in self._latencies:
+                self._latencies[name] = LatencyStat()
+            return self._latencies[name]
+
+    def histogram(self, name: str, bounds) -> Histogram:
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(bounds)
+            return self._histograms[name]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            latencies = dict(self._latencies)
+            histograms = dict(self._histograms)
+        return {
+            "counters": counters,
+            "gauges": {name: getter() for name, getter in self._gauges.items()},
+            "latency": {name: stat.snapshot() for name, stat in latencies.items()},
+            "histograms": {name: histogram.snapshot() for name, histogram in histograms.items()},
+        }
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
@@ -0,0 +1,115 @@
+import math
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+from app.metrics import Metrics
+
+NORMAL, ELEVATED, CRITICAL = 0, 1, 2
+PRESSURE_LEVELS = ("normal", "elevated", "critical")
+
+class AdmissionController:
+    """
+    Decides which incoming records enter the hub buffer from the buffer
+    depth (records not yet in the store) and the flush lag (age of the
+    oldest of them), refreshed by update().
+
+    Elevated pressure (soft_depth or soft_lag reached) sheds normal readings
+    at a position already admitted within duplicate_seconds and keeps one in
+    sample_rate of the other normal readings. Critical pressure (hard_depth
+    or hard_lag) sheds all normal readings. Anomalies are always admitted;
+    summaries and aggregates count as normal readings. Every shed record is
+    counted per reason.
+    """
+    def __init__(
+        self,
+        soft_depth: int = 10000,
+        hard_depth: int = 50000,
+        soft_lag: float = 5.0,
+        hard_lag: float = 30.0,
+        sample_rate: int = 4,
+        duplicate_seconds: float = 10.0,
+        duplicate_positions: int = 10000,
+        metrics: Metrics = None,
+    ):
+        self.soft_depth = soft_depth
+        self.hard_depth = hard_depth
+        self.soft_lag = soft_lag
+        self.hard_lag = hard_lag
+        self.sample_rate = max(1, sample_rate)
+        self.duplicate_seconds = duplicate_seconds
+        self.duplicate_positions = duplicate_positions
+        self.level = NORMAL
+        self.depth = 0
+        self.lag = 0.0
+        self._normals_seen = 0
+        # Rounded position -> monotonic time it was last admitted, oldest first
+        self._positions = OrderedDict()
+        self.metrics = metrics or Metrics()
+        self.metrics.gauge("admission_level", lambda: PRESSURE_LEVELS[self.level])
+        self.metrics.gauge("buffer_depth", lambda: self.depth)
+        self.metrics.gauge("flush_lag_ms", lambda: self.lag * 1000)
+
+    def update(self, depth: int, lag: float):
+        self.depth = depth
+        self.lag = lag
+        if depth >= self.hard_depth or lag >= self.hard_lag:
+            level = CRITICAL
+        elif depth >= self.soft_depth or lag >= self.soft_lag:
+            level = ELEVATED
+        else:
+            level = NORMAL
+        if level != self.level:
+            self.metrics.inc(f"admission_{PRESSURE_LEVELS[level]}")
+        self.level = level
+
+    def admit(self, items: List) -> Tuple[List, int]:
+        """
+        Records to buffer and the number of records shed.
+        """
+        if self.level == NORMAL:
+            for item in items:
+                if item.road_state == "normal":
+                    self._remember(item)
+            return items, 0
+        admitted = []
+        now = time.monotonic()
+        for item in items:
+            if item.road_state != "normal":
+                admitted.append(item)
+            elif self.level == CRITICAL:
+                self.metrics.inc("shed_critical")
+            elif self._is_duplicate(item, now):
+                self.metrics.inc("shed_duplicate_gps")
+            else:
+                self._normals_seen += 1
+                if self._normals_seen % self.sample_rate:
+                    self.metrics.inc("shed_sampled")
+                else:
+                    self._remember(item, now)
+                    admitted.append(item)
+        shed = len(items) - len(admitted)
+        if shed:
+            self.metrics.inc("shed_records", shed)
+        return admitted, shed
+
+    def retry_after(self) -> int:
+        """
+        Seconds a client should wait before sending again.
+        """
+        return max(1, min(60, math.ceil(self.lag)))
+
+    def _position(self, item):
+        gps = item.agent_data.gps
+        # About a metre apart
+        return round(gps.latitude, 5), round(gps.longitude, 5)
+
+    def _remember(self, item, now: float = None):
+        position = self._position(item)
+        self._positions[position] = time.monotonic() if now is None else now
+        self._positions.move_to_end(position)
+        if len(self._positions) > self.duplicate_positions:
+            self._positions.popitem(last=False)
+
+    def _is_duplicate(self, item, now: float) -> bool:
+        admitted_at = self._positions.get(self._position(item))
+        return admitted_at is not None and now - admitted_at < self.duplicate_seconds
@@ -0,0 +1,96 @@
+import random
+import time
+from collections import deque
+from app.metrics import Metrics
+
+class AimdController:
+    """
+    Tunes the store batch size and the number of concurrent store requests
+    from the outcome of every request (additive increase, multiplicative
+    decrease).
+
+    A full batch answered within target_latency grows the batch size by
+    increase_step, and every concurrency such batches in a row add one
+    request slot. A slow answer shrinks the batch size and drops one slot,
+    a failure halves both and returns a jittered exponential backoff delay.
+    Everything stays within the configured bounds.
+    """
+    def __init__(
+        self,
+        batch_size: int = 20,
+        min_batch_size: int = 1,
+        max_batch_size: int = 1000,
+        concurrency: int = 1,
+        max_concurrency: int = 4,
+        target_latency: float = 0.5,
+        increase_step: int = 5,
+        decrease_factor: float = 0.5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        throughput_window: float = 10.0,
+        metrics: Metrics = None,
+    ):
+        self.min_batch_size = max(1, min_batch_size)
+        self.max_batch_size = max(self.min_batch_size, max_batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = self._clamp(batch_size, self.min_batch_size, self.max_batch_size)
+        self.concurrency = self._clamp(concurrency, 1, self.max_concurrency)
+        self.target_latency = target_latency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.throughput_window = throughput_window
+        self.failures = 0
+        self.good_batches = 0
+        self.latency = 0.0
+        self._sent = deque()
+        self.metrics = metrics or Metrics()
+        self.metrics.gauge("store_batch_size", lambda: self.batch_size)
+        self.metrics.gauge("store_concurrency", lambda: self.concurrency)
+        self.metrics.gauge("store_latency_ms", lambda: self.latency * 1000)
+        self.metrics.gauge("store_throughput", self.throughput)
+
+    def on_success(self, size: int, seconds: float):
+        self.failures = 0
+        self.latency = seconds if not self.latency else 0.8 * self.latency + 0.2 * seconds
+        now = time.monotonic()
+        self._sent.append((now, size))
+        if seconds > self.target_latency:
+            self.good_batches = 0
+            self.batch_size = self._clamp(int(self.batch_size * self.decrease_factor), self.min_batch_size, self.max_batch_size)
+            self.concurrency = max(1, self.concurrency - 1)
+            return
+        # Partial batches are sent by the linger timer; they tell nothing about a bigger size
+        if size < self.batch_size:
+            return
+        self.batch_size = min(self.max_batch_size, self.batch_size + self.increase_step)
+        self.good_batches += 1
+        if self.good_batches >= self.concurrency:
+            self.good_batches = 0
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+
+    def on_failure(self) -> float:
+        """
+        Shrink after a failed request, returns seconds to wait before the next one.
+        """
+        self.failures += 1
+        self.good_batches = 0
+        self.batch_size = self._clamp(int(self.batch_size * self.decrease_factor), self.min_batch_size, self.max_batch_size)
+        self.concurrency = max(1, int(self.concurrency * self.decrease_factor))
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+        # Equal jitter: hubs failing together do not retry together
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def throughput(self) -> float:
+        """
+        Records per second accepted by the store over the last throughput_window seconds.
+        """
+        horizon = time.monotonic() - self.throughput_window
+        while self._sent and self._sent[0][0] < horizon:
+            self._sent.popleft()
+        return sum(size for _, size in self._sent) / self.throughput_window
+
+    @staticmethod
+    def _clamp(value: int, low: int, high: int) -> int:
+        return max(low, min(high, value))
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+from app.adapters.redis_stream_buffer import RedisStreamBuffer
+from app.interfaces.store_api_gateway import StoreGateway, StoreRequestError
+from app.metrics import Metrics
+from app.usecases.aimd_controller import AimdController
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+def stream_id_key(entry_id) -> tuple:
+    milliseconds, _, sequence = (entry_id.decode() if isinstance(entry_id, bytes) else entry_id).partition("-")
+    return int(milliseconds), int(sequence)
+
+class BatchFlusher:
+    """
+    Consumer of the hub buffer running as a task on the hub event loop, so
+    store requests never hold up ingest: collects records in stream order
+    and sends a batch to the store once controller.batch_size records are
+    collected or the oldest of them has been buffered for max_latency_ms,
+    with up to controller.concurrency requests in flight, acknowledging
+    records only after the store accepted their batch. Records of a batch
+    the store could not take go back to the front of the queue and sending
+    pauses for the controller's backoff. A batch the store rejects (4xx), or
+    fails on max_attempts times (5xx), is split until the records at fault
+    are isolated; those go to the dead-letter stream, so they cannot hold up
+    the records behind them. Entries left pending by a crashed consumer are
+    reclaimed at start and every reclaim_idle_ms.
+    """
+    def __init__(
+        self,
+        buffer: RedisStreamBuffer,
+        store_gateway: StoreGateway,
+        controller: AimdController = None,
+        block_ms: int = 1000,
+        reclaim_idle_ms: int = 30000,
+        retry_interval: float = 1.0,
+        max_latency_ms: int = 1000,
+        max_attempts: int = 5,
+        metrics: Metrics = None,
+    ):
+        self.buffer = buffer
+        self.store_gateway = store_gateway
+        self.block_ms = block_ms
+        self.reclaim_idle_ms = reclaim_idle_ms
+        self.retry_interval = retry_interval
+        self.max_latency_ms = max_latency_ms
+        self.max_attempts = max_attempts
+        self.metrics = metrics or Metrics()
+        self.controller = controller or AimdController(metrics=self.metrics)
+        self.batch_sizes = self.metrics.histogram("batch_size", BATCH_SIZE_BUCKETS)
+        self.dwell = self.metrics.latency("buffer_dwell")
+        self.store_latency = self.metrics.latency("store_request")
+        self.batch = []
+        # Batches being sent: task -> entries
+        self.in_flight = {}
+        self.resume_at = 0.0
+        # Failed store requests per entry id
+        self.attempts = {}
+        self.stop_event = asyncio.Event()
+        self.task = None
+
+    async def start(self):
+        await self.buffer.ensure_group()
+        self.stop_event.clear()
+        self.task = asyncio.create_task(self._run(), name="hub-flusher")
+
+    async def stop(self, timeout: float = None):
+        self.stop_event.set()
+        if self.task is None:
+            return
+        try:
+            # The current read returns within block_ms, then the batches in flight are awaited;
+            # a store request still running past timeout is cancelled
+            await asyncio.wait_for(self.task, timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Hub flusher did not stop in time, unacknowledged records stay pending")
+
+    async def _wait(self, seconds: float):
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        last_reclaim = None
+        while not self.stop_event.is_set():
+            try:
+                if last_reclaim is None or time.monotonic() - last_reclaim >= self.reclaim_idle_ms / 1000:
+                    last_reclaim = time.monotonic()
+                    reclaimed = await self.buffer.reclaim(self.reclaim_idle_ms)
+                    # Our own entries waiting in self.batch or in flight are reclaimed as well
+                    known = {entry_id for entry_id, _ in self.batch}
+                    known.update(entry_id for entries in self.in_flight.values() for entry_id, _ in entries)
+                    reclaimed = [entry for entry in reclaimed if entry[0] not in known]
+                    if reclaimed:
+                        logging.info(f"Reclaimed {len(reclaimed)} pending records")
+                        self.batch = sorted(self.batch + reclaimed, key=lambda entry: stream_id_key(entry[0]))
+                await self.poll()
+            except Exception as e:
+                logging.error(f"Hub flusher error: {e}")
+                await self._wait(self.retry_interval)
+        if self.in_flight:
+            await asyncio.wait(list(self.in_flight))
+
+    async def poll(self):
+        """
+        Read what is available and start sending every batch that is full or
+        due, as far as the controller's concurrency and backoff allow.
+        """
+        size = self.controller.batch_size
+        if len(self.batch) < size:
+            entries = await self.buffer.read(size - len(self.batch), self._block_ms())
+            # A failed batch may have replaced self.batch during the read
+            self.batch.extend(entries)
+        while self.batch and (len(self.batch) >= size or self._oldest_age_ms() >= self.max_latency_ms):
+            backoff = self.resume_at - time.monotonic()
+            if backoff > 0:
+                await self._wait(backoff)
+                return
+            if len(self.in_flight) >= self.controller.concurrency:
+                await asyncio.wait(list(self.in_flight), return_when=asyncio.FIRST_COMPLETED)
+                size = self.controller.batch_size
+                continue
+            entries, self.batch = self.batch[:size], self.batch[size:]
+            task = asyncio.create_task(self.flush(entries))
+            self.in_flight[task] = entries
+            task.add_done_callback(self.in_flight.pop)
+
+    async def flush(self, entries) -> bool:
+        started = time.perf_counter()
+        try:
+            retry = await self._save(entries)
+        except Exception as e:
+            logging.error(f"Hub flusher error: {e}")
+            retry = entries
+        elapsed = time.perf_counter() - started
+        self.store_latency.observe(elapsed)
+        if retry:
+            self.metrics.inc("batches_failed")
+            self.resume_at = max(self.resume_at, time.monotonic() + self.controller.on_failure())
+            # Send the records again before anything newer
+            self.batch = sorted(retry + self.batch, key=lambda entry: stream_id_key(entry[0]))
+            return False
+        self.controller.on_success(len(entries), elapsed)
+        self.batch_sizes.observe(len(entries))
+        self.metrics.inc("batches_sent")
+        return True
+
+    async def _save(self, entries, isolate: bool = False) -> list:
+        """
+        Send entries to the store, returns those to send again later.
+        """
+        try:
+            saved = await self.store_gateway.save_data(processed_agent_data_batch=[record for _, record in entries])
+        except StoreRequestError as e:
+            if not (e.permanent or isolate):
+                for entry_id, _ in entries:
+                    self.attempts[entry_id] = self.attempts.get(entry_id, 0) + 1
+                if max(self.attempts[entry_id] for entry_id, _ in entries) < self.max_attempts:
+                    logging.error(f"Store failed on a batch of {len(entries)} records: {e}")
+                    return entries
+            if len(entries) == 1:
+                await self._dead_letter(entries, str(e))
+                return []
+            # Halves that go through are saved, the others are split again
+            middle = len(entries) // 2
+            return await self._save(entries[:middle], True) + await self._save(entries[middle:], True)
+        if not saved:
+            return entries
+        ids = [entry_id for entry_id, _ in entries]
+        await self.buffer.ack(ids)
+        now_ms = time.time() * 1000
+        for entry_id in ids:
+            self.attempts.pop(entry_id, None)
+            # Stream ids start with the Redis time of XADD in milliseconds
+            self.dwell.observe(max(0.0, now_ms - stream_id_key(entry_id)[0]) / 1000)
+        self.metrics.inc("records_sent", len(entries))
+        return []
+
+    async def _dead_letter(self, entries, reason: str):
+        await self.buffer.dead_letter(entries, reason)
+        for entry_id, _ in entries:
+            self.attempts.pop(entry_id, None)
+        self.metrics.inc("records_dead_lettered", len(entries))
+        logging.error(f"Moved {len(entries)} records to {self.buffer.dead_letter_stream}: {reason}")
+
+    def _oldest_age_ms(self) -> float:
+        return time.time() * 1000 - stream_id_key(self.batch[0][0])[0]
+
+    def _block_ms(self) -> int:
+        if not self.batch:
+            return self.block_ms
+        # Wake up in time to flush the oldest record; XREADGROUP treats 0 as "block forever"
+        return max(1, min(self.block_ms, int(self.max_latency_ms - self._oldest_age_ms())))
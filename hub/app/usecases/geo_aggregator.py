@@ -0,0 +1,180 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData
+from app.entities.processed_agent_data import CellAggregate, ProcessedAgentData
+from app.metrics import Metrics
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+# road_state of aggregate records, so filters on a road state never count them
+AGGREGATE_ROAD_STATE = "aggregate"
+EPOCH = datetime(1970, 1, 1)
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """
+    The timestamp in naive UTC, as the store keeps it; naive timestamps are taken as UTC.
+    """
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+def encode_geohash(latitude: float, longitude: float, precision: int) -> str:
+    """
+    Geohash of a point; precision 6 is a cell of about 1.2 x 0.6 km, 7 about 150 x 150 m.
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            bounds[0] = middle
+        else:
+            bits = bits * 2
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+class _Cell:
+    __slots__ = (
+        "start", "updated", "count", "counts", "z_total", "z_squares", "z_min", "z_max",
+        "x_total", "y_total", "latitude_total", "longitude_total",
+    )
+
+    def __init__(self, start):
+        self.start = start
+        self.updated = time.monotonic()
+        self.count = 0
+        self.counts = {}
+        self.z_total = 0.0
+        self.z_squares = 0.0
+        self.z_min = float("inf")
+        self.z_max = float("-inf")
+        self.x_total = 0.0
+        self.y_total = 0.0
+        self.latitude_total = 0.0
+        self.longitude_total = 0.0
+
+    def add(self, item):
+        agent_data = item.agent_data
+        accelerometer = agent_data.accelerometer
+        if item.summary is not None:
+            # A run of normal samples summarised by the edge; its spread is unknown,
+            # so its samples count as z_mean each
+            summary = item.summary if isinstance(item.summary, dict) else item.summary.dict()
+            count = summary["count"]
+            z_mean = summary["z_mean"]
+            z_min, z_max = summary["z_min"], summary["z_max"]
+        else:
+            count = 1
+            z_mean = z_min = z_max = accelerometer.z
+        self.updated = time.monotonic()
+        self.count += count
+        self.counts[item.road_state] = self.counts.get(item.road_state, 0) + count
+        self.z_total += z_mean * count
+        self.z_squares += z_mean * z_mean * count
+        self.z_min = min(self.z_min, z_min)
+        self.z_max = max(self.z_max, z_max)
+        self.x_total += accelerometer.x * count
+        self.y_total += accelerometer.y * count
+        self.latitude_total += agent_data.gps.latitude * count
+        self.longitude_total += agent_data.gps.longitude * count
+
+class GeoAggregator:
+    """
+    Pre-aggregates readings per geohash cell and time window at hub ingest.
+
+    Every reading is counted in the cell of its position and the window of
+    its timestamp: counts per road_state and z min/max/mean/std. Normal
+    readings end there; anomalies are also passed through unchanged. A
+    window closes once readings lateness seconds past its end arrived, or
+    after window + lateness seconds without readings for it, and is sent as
+    one record at the centroid of its readings, with road_state "aggregate"
+    and the statistics in aggregate; the anomalies it counts are stored as
+    records of their own. Cells not yet closed live in memory
+    only and are lost if the hub crashes.
+    """
+    def __init__(self, precision: int = 7, window: float = 60.0, lateness: float = 10.0, metrics: Metrics = None):
+        self.precision = precision
+        self.window = window
+        self.lateness = lateness
+        self.metrics = metrics or Metrics()
+        self.cells: Dict[Tuple[str, object], _Cell] = {}
+        self.watermark = None
+        self.metrics.gauge("geo_open_cells", lambda: len(self.cells))
+
+    def add(self, items: List) -> List:
+        """
+        Count the readings, returns those passed through (anomalies).
+        """
+        passed = []
+        for item in items:
+            agent_data = item.agent_data
+            # Agents may send naive and aware timestamps, windows and the watermark are in naive UTC
+            timestamp = naive_utc(agent_data.timestamp)
+            start = timestamp - timedelta(seconds=(timestamp - EPOCH).total_seconds() % self.window)
+            key = (encode_geohash(agent_data.gps.latitude, agent_data.gps.longitude, self.precision), start)
+            cell = self.cells.get(key)
+            if cell is None:
+                cell = self.cells[key] = _Cell(start)
+            cell.add(item)
+            if self.watermark is None or timestamp > self.watermark:
+                self.watermark = timestamp
+            if item.road_state != "normal":
+                passed.append(item)
+        self.metrics.inc("geo_aggregated", len(items) - len(passed))
+        return passed
+
+    def flush_expired(self) -> List[ProcessedAgentData]:
+        """
+        Records of the windows closed by now.
+        """
+        idle_since = time.monotonic() - self.window - self.lateness
+        closing = timedelta(seconds=self.window + self.lateness)
+        closed = []
+        for key, cell in self.cells.items():
+            if cell.updated <= idle_since:
+                closed.append(key)
+            elif cell.start + closing <= self.watermark:
+                closed.append(key)
+        return self._emit(closed)
+
+    def flush(self) -> List[ProcessedAgentData]:
+        """
+        Records of all open windows, e.g. on shutdown.
+        """
+        return self._emit(list(self.cells))
+
+    def _emit(self, keys) -> List[ProcessedAgentData]:
+        output = []
+        for key in keys:
+            cell = self.cells.pop(key)
+            count = cell.count
+            z_mean = cell.z_total / count
+            output.append(ProcessedAgentData(
+                road_state=AGGREGATE_ROAD_STATE,
+                agent_data=AgentData(
+                    accelerometer=AccelerometerData(x=cell.x_total / count, y=cell.y_total / count, z=z_mean),
+                    gps=GpsData(latitude=cell.latitude_total / count, longitude=cell.longitude_total / count),
+                    timestamp=cell.start,
+                ),
+                aggregate=CellAggregate(
+                    cell=key[0],
+                    start=cell.start,
+                    end=cell.start + timedelta(seconds=self.window),
+                    count=count,
+                    counts=cell.counts,
+                    z_min=cell.z_min,
+                    z_max=cell.z_max,
+                    z_mean=z_mean,
+                    z_std=max(0.0, cell.z_squares / count - z_mean * z_mean) ** 0.5,
+                ),
+            ))
+        self.metrics.inc("geo_aggregates", len(output))
+        return output
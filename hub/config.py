@@ -10,12 +10,62 @@ def try_parse_int(value: str):
 STORE_API_HOST = os.environ.get("STORE_API_HOST") or "localhost"
 STORE_API_PORT = try_parse_int(os.environ.get("STORE_API_PORT")) or 8000
 STORE_API_BASE_URL = f"http://{STORE_API_HOST}:{STORE_API_PORT}"
+# Wire codec for hub -> store requests: json, msgpack or struct (no run summaries
+# or cell aggregates)
+STORE_CODEC = os.environ.get("STORE_CODEC") or "json"
+# Pooled keep-alive connections to the store and their request timeout in seconds
+STORE_MAX_CONNECTIONS = try_parse_int(os.environ.get("STORE_MAX_CONNECTIONS")) or 10
+STORE_TIMEOUT = try_parse_int(os.environ.get("STORE_TIMEOUT")) or 10
 # Configure for Redis
 REDIS_HOST = os.environ.get("REDIS_HOST") or "localhost"
 REDIS_PORT = try_parse_int(os.environ.get("REDIS_PORT")) or 6379
+# Encoding of records buffered in Redis: json, msgpack or struct (as STORE_CODEC)
+REDIS_CODEC = os.environ.get("REDIS_CODEC") or "json"
+# Redis Stream buffer: stream, consumer group of the store flushers and this
+# flusher's consumer name (default <hostname>, so a restarted replica keeps its name);
+# entries pending longer than RECLAIM_IDLE_MS (e.g. of a crashed hub) are taken over
+# and consumers idle as long with nothing pending are deleted, failed store requests
+# are retried every FLUSH_RETRY_INTERVAL seconds
+REDIS_STREAM = os.environ.get("REDIS_STREAM") or "processed_agent_data_stream"
+REDIS_GROUP = os.environ.get("REDIS_GROUP") or "store_flusher"
+REDIS_CONSUMER = os.environ.get("REDIS_CONSUMER") or None
+RECLAIM_IDLE_MS = try_parse_int(os.environ.get("RECLAIM_IDLE_MS")) or 30000
+FLUSH_RETRY_INTERVAL = try_parse_int(os.environ.get("FLUSH_RETRY_INTERVAL")) or 1
+# Records the store rejects (4xx), or fails on STORE_MAX_ATTEMPTS times (5xx), are moved to
+# REDIS_DEAD_LETTER_STREAM (default <REDIS_STREAM>_dead) instead of being retried forever
+STORE_MAX_ATTEMPTS = try_parse_int(os.environ.get("STORE_MAX_ATTEMPTS")) or 5
+REDIS_DEAD_LETTER_STREAM = os.environ.get("REDIS_DEAD_LETTER_STREAM") or None
+# Records marked with this schema version by the edge skip validation (0 - validate everything);
+# enable only where the hub is reachable by trusted services alone
+TRUST_SCHEMA_VERSION = try_parse_int(os.environ.get("TRUST_SCHEMA_VERSION")) or 0
 # Configure for hub logic
+# Initial store batch size; it adapts between MIN_BATCH_SIZE and MAX_BATCH_SIZE, and the
+# concurrent store requests up to MAX_IN_FLIGHT, keeping requests under TARGET_LATENCY_MS.
+# Failed requests back off from FLUSH_RETRY_INTERVAL seconds up to BACKOFF_MAX_MS
 BATCH_SIZE = try_parse_int(os.environ.get("BATCH_SIZE")) or 20
+MIN_BATCH_SIZE = try_parse_int(os.environ.get("MIN_BATCH_SIZE")) or 1
+MAX_BATCH_SIZE = try_parse_int(os.environ.get("MAX_BATCH_SIZE")) or 1000
+MAX_IN_FLIGHT = try_parse_int(os.environ.get("MAX_IN_FLIGHT")) or 4
+TARGET_LATENCY_MS = try_parse_int(os.environ.get("TARGET_LATENCY_MS")) or 500
+BACKOFF_MAX_MS = try_parse_int(os.environ.get("BACKOFF_MAX_MS")) or 30000
+# Max time in milliseconds a record waits in the buffer before a partial batch is sent
+MAX_LATENCY_MS = try_parse_int(os.environ.get("MAX_LATENCY_MS")) or 1000
+# Pre-aggregation of readings per geohash cell of GEO_PRECISION characters (0 - off) and
+# GEO_WINDOW seconds, closed once readings GEO_LATENESS seconds past the window arrived
+GEO_PRECISION = try_parse_int(os.environ.get("GEO_PRECISION")) or 0
+GEO_WINDOW = try_parse_int(os.environ.get("GEO_WINDOW")) or 60
+GEO_LATENESS = try_parse_int(os.environ.get("GEO_LATENESS")) or 10
+# Load shedding: above the soft buffer depth (records not yet in the store) or flush lag
+# duplicate-position normal readings are shed and one in ADMISSION_SAMPLE_RATE of the
+# others kept, above the hard ones all normal readings are shed and HTTP edges get 429
+ADMISSION_SOFT_DEPTH = try_parse_int(os.environ.get("ADMISSION_SOFT_DEPTH")) or 10000
+ADMISSION_HARD_DEPTH = try_parse_int(os.environ.get("ADMISSION_HARD_DEPTH")) or 50000
+ADMISSION_SOFT_LAG_MS = try_parse_int(os.environ.get("ADMISSION_SOFT_LAG_MS")) or 5000
+ADMISSION_HARD_LAG_MS = try_parse_int(os.environ.get("ADMISSION_HARD_LAG_MS")) or 30000
+ADMISSION_SAMPLE_RATE = try_parse_int(os.environ.get("ADMISSION_SAMPLE_RATE")) or 4
 # MQTT
 MQTT_BROKER_HOST = os.environ.get("MQTT_BROKER_HOST") or "localhost"
 MQTT_BROKER_PORT = try_parse_int(os.environ.get("MQTT_BROKER_PORT")) or 1883
-MQTT_TOPIC = os.environ.get("MQTT_TOPIC") or "processed_agent_data_topic"
\ No newline at end of file
+MQTT_TOPIC = os.environ.get("MQTT_TOPIC") or "processed_agent_data_topic"
+MQTT_QOS = try_parse_int(os.environ.get("MQTT_QOS"))
+MQTT_QOS = 1 if MQTT_QOS is None else MQTT_QOS
\ No newline at end of file
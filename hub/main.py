@@ -1,11 +1,21 @@
+import asyncio
 import logging
 from typing import List
-from fastapi import FastAPI
-from redis import Redis
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import TypeAdapter, ValidationError
+from redis.asyncio import Redis
 import paho.mqtt.client as mqtt
+from app.adapters.redis_stream_buffer import RedisStreamBuffer
 from app.adapters.store_api_adapter import StoreApiAdapter
+from app.codec import JSON, codec_for_content_type, detect_codec, get_codec
 from app.entities.processed_agent_data import ProcessedAgentData
-from config import STORE_API_BASE_URL, REDIS_HOST, REDIS_PORT, BATCH_SIZE, MQTT_TOPIC, MQTT_BROKER_HOST, MQTT_BROKER_PORT
+from app.entities.trusted_record import decode_records
+from app.metrics import Metrics
+from app.usecases.admission_controller import CRITICAL, AdmissionController
+from app.usecases.aimd_controller import AimdController
+from app.usecases.batch_flusher import BatchFlusher
+from app.usecases.geo_aggregator import GeoAggregator
+from config import STORE_API_BASE_URL, REDIS_HOST, REDIS_PORT, BATCH_SIZE, MQTT_TOPIC, MQTT_BROKER_HOST, MQTT_BROKER_PORT, MQTT_QOS, STORE_CODEC, REDIS_CODEC, REDIS_STREAM, REDIS_GROUP, REDIS_CONSUMER, RECLAIM_IDLE_MS, FLUSH_RETRY_INTERVAL, STORE_MAX_ATTEMPTS, REDIS_DEAD_LETTER_STREAM, MAX_LATENCY_MS, MIN_BATCH_SIZE, MAX_BATCH_SIZE, MAX_IN_FLIGHT, TARGET_LATENCY_MS, BACKOFF_MAX_MS, STORE_MAX_CONNECTIONS, STORE_TIMEOUT, GEO_PRECISION, GEO_WINDOW, GEO_LATENESS, ADMISSION_SOFT_DEPTH, ADMISSION_HARD_DEPTH, ADMISSION_SOFT_LAG_MS, ADMISSION_HARD_LAG_MS, ADMISSION_SAMPLE_RATE, TRUST_SCHEMA_VERSION
 
 # Configure logging settings
 logging.basicConfig(
@@ -18,32 +28,190 @@ logging.FileHandler("app.log"), # Save log messages to a file
 )
 # Create an instance of the Redis using the configuration
 redis_client = Redis(host=REDIS_HOST, port=REDIS_PORT)
+redis_codec = get_codec(REDIS_CODEC)
 # Create an instance of the StoreApiAdapter using the configuration
-store_adapter = StoreApiAdapter(api_base_url=STORE_API_BASE_URL)
+store_adapter = StoreApiAdapter(
+api_base_url=STORE_API_BASE_URL,
+codec=get_codec(STORE_CODEC),
+max_connections=STORE_MAX_CONNECTIONS,
+timeout=STORE_TIMEOUT,
+)
 # Create an instance of the AgentMQTTAdapter using the configuration
 # FastAPI
 app = FastAPI()
+processed_agent_data_list = TypeAdapter(List[ProcessedAgentData])
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+metrics = Metrics()
+# Create the Redis Stream buffer and its flusher using the configuration
+stream_buffer = RedisStreamBuffer(
+redis_client,
+validator=processed_agent_data_list,
+codec=redis_codec,
+stream=REDIS_STREAM,
+group=REDIS_GROUP,
+consumer=REDIS_CONSUMER,
+dead_letter_stream=REDIS_DEAD_LETTER_STREAM,
+)
+# Batch size and concurrent store requests adapt to the store latency and errors
+controller = AimdController(
+batch_size=BATCH_SIZE,
+min_batch_size=MIN_BATCH_SIZE,
+max_batch_size=MAX_BATCH_SIZE,
+max_concurrency=MAX_IN_FLIGHT,
+target_latency=TARGET_LATENCY_MS / 1000,
+backoff_base=FLUSH_RETRY_INTERVAL,
+backoff_max=BACKOFF_MAX_MS / 1000,
+metrics=metrics,
+)
+flusher = BatchFlusher(
+stream_buffer,
+store_adapter,
+controller=controller,
+reclaim_idle_ms=RECLAIM_IDLE_MS,
+retry_interval=FLUSH_RETRY_INTERVAL,
+max_latency_ms=MAX_LATENCY_MS,
+max_attempts=STORE_MAX_ATTEMPTS,
+metrics=metrics,
+)
+metrics.gauge("flusher_batch", lambda: len(flusher.batch))
+metrics.gauge("store_in_flight", lambda: len(flusher.in_flight))
+# Optional pre-aggregation of normal readings before they are buffered
+if GEO_PRECISION and "struct" in (REDIS_CODEC, STORE_CODEC):
+    raise ValueError("The struct codec cannot carry cell aggregates, use json or msgpack with GEO_PRECISION")
+geo_aggregator = GeoAggregator(
+precision=GEO_PRECISION,
+window=GEO_WINDOW,
+lateness=GEO_LATENESS,
+metrics=metrics,
+) if GEO_PRECISION else None
+# Sheds low-value records first when the store or Redis falls behind
+admission = AdmissionController(
+soft_depth=ADMISSION_SOFT_DEPTH,
+hard_depth=ADMISSION_HARD_DEPTH,
+soft_lag=ADMISSION_SOFT_LAG_MS / 1000,
+hard_lag=ADMISSION_HARD_LAG_MS / 1000,
+sample_rate=ADMISSION_SAMPLE_RATE,
+metrics=metrics,
+)
+
+# Event loop of the app; the MQTT network thread hands its records over to it
+event_loop = None
+aggregation_task = None
+pressure_task = None
+
+async def watch_pressure():
+    while True:
+        try:
+            admission.update(*await stream_buffer.backlog())
+        except Exception as e:
+            logging.error(f"Error reading the buffer backlog: {e}")
+        await asyncio.sleep(0.5)
+
+async def flush_aggregates():
+    while True:
+        await asyncio.sleep(1)
+        try:
+            await stream_buffer.add(geo_aggregator.flush_expired())
+        except Exception as e:
+            logging.error(f"Error buffering aggregates: {e}")
+
+@app.on_event("startup")
+async def start_hub():
+    global event_loop, aggregation_task, pressure_task
+    event_loop = asyncio.get_running_loop()
+    await flusher.start()
+    pressure_task = asyncio.create_task(watch_pressure())
+    if geo_aggregator is not None:
+        aggregation_task = asyncio.create_task(flush_aggregates())
+    client.connect_async(MQTT_BROKER_HOST, MQTT_BROKER_PORT)
+    client.loop_start()
+
+@app.on_event("shutdown")
+async def stop_hub():
+    client.loop_stop()
+    client.disconnect()
+    pressure_task.cancel()
+    if aggregation_task is not None:
+        aggregation_task.cancel()
+        await stream_buffer.add(geo_aggregator.flush())
+    await flusher.stop(timeout=5)
+    await store_adapter.close()
+    await redis_client.aclose()
+
+async def buffer_processed_agent_data(processed_agent_data_batch: List[ProcessedAgentData]) -> int:
+    """
+    Buffer the admitted records, returns the number of records shed.
+    """
+    metrics.inc("records_received", len(processed_agent_data_batch))
+    if geo_aggregator is not None:
+        processed_agent_data_batch = geo_aggregator.add(processed_agent_data_batch)
+    processed_agent_data_batch, shed = admission.admit(processed_agent_data_batch)
+    # One pipelined round trip; the flusher task sends the records to the store
+    await stream_buffer.add(processed_agent_data_batch)
+    return shed
+
+def admission_response(count: int, shed: int) -> dict:
+    response = {"status": "ok", "count": count, "shed": shed}
+    if admission.level == CRITICAL:
+        # Anomalies of the request were kept: the edge must slow down, not resend
+        raise HTTPException(
+            status_code=429,
+            detail={**response, "status": "overloaded"},
+            headers={"Retry-After": str(admission.retry_after())},
+        )
+    return response
+
+@app.get("/metrics")
+async def get_metrics():
+    snapshot = metrics.snapshot()
+    snapshot["gauges"]["stream_length"] = await stream_buffer.length()
+    return snapshot
+
+def is_ndjson(content_type: str) -> bool:
+    return bool(content_type) and content_type.split(";", 1)[0].strip().lower() in NDJSON_CONTENT_TYPES
 
 @app.post("/processed_agent_data/")
-async def save_processed_agent_data(processed_agent_data:
-ProcessedAgentData):
+async def save_processed_agent_data(request: Request):
     print("ACTION: HUB RECEIVE DATA FROM EDGE")
-    redis_client.lpush(
-    "processed_agent_data",
-    processed_agent_data.model_dump_json()
-    )
-    processed_agent_data_batch: List[ProcessedAgentData] = []
-    if redis_client.llen("processed_agent_data") >= BATCH_SIZE:
-        for _ in range(BATCH_SIZE):
-            processed_agent_data = ProcessedAgentData.model_validate_json(
-            redis_client.lpop("processed_agent_data")
-            )
-            processed_agent_data_batch.append(processed_agent_data)
-    store_adapter.save_data(
-        processed_agent_data_batch=processed_agent_data_batch
-    )
-
-    return {"status": "ok"}
+    try:
+        codec = codec_for_content_type(request.headers.get("content-type"))
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    try:
+        processed_agent_data_batch = decode_records(
+        [codec.decode(await request.body())], processed_agent_data_list, TRUST_SCHEMA_VERSION
+        )
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    shed = await buffer_processed_agent_data(processed_agent_data_batch)
+
+    return admission_response(len(processed_agent_data_batch), shed)
+
+@app.post("/processed_agent_data/bulk")
+async def save_processed_agent_data_bulk(request: Request):
+    content_type = request.headers.get("content-type")
+    try:
+        codec = None if is_ndjson(content_type) else codec_for_content_type(content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    body = await request.body()
+    try:
+        if codec is None:
+            # NDJSON: one JSON record per line
+            items = [JSON.decode(line) for line in body.splitlines() if line.strip()]
+        else:
+            payload = codec.decode(body)
+            items = payload if isinstance(payload, list) else [payload]
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        processed_agent_data_batch = decode_records(items, processed_agent_data_list, TRUST_SCHEMA_VERSION)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    print(f"ACTION: HUB RECEIVE {len(processed_agent_data_batch)} RECORDS FROM EDGE")
+    shed = await buffer_processed_agent_data(processed_agent_data_batch)
+
+    return admission_response(len(processed_agent_data_batch), shed)
 
 # MQTT
 client = mqtt.Client()
@@ -51,38 +219,23 @@ client = mqtt.Client()
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
         logging.info("Connected to MQTT broker")
-        client.subscribe(MQTT_TOPIC)
+        client.subscribe(MQTT_TOPIC, qos=MQTT_QOS)
     else:
         logging.info(f"Failed to connect to MQTT broker with code: {rc}")
 
 def on_message(client, userdata, msg):
     batch_data = None
     try:
-        payload: str = msg.payload.decode("utf-8")
-        # Create ProcessedAgentData instance with the received data
-        processed_agent_data = ProcessedAgentData.model_validate_json(payload,
-        strict=True)
-        redis_client.lpush(
-        "processed_agent_data",
-        processed_agent_data.model_dump_json()
-        )
-        processed_agent_data_batch: List[ProcessedAgentData] = []
-        if redis_client.llen("processed_agent_data") >= BATCH_SIZE:
-            for _ in range(BATCH_SIZE):
-                processed_agent_data = ProcessedAgentData.model_validate_json(
-                    redis_client.lpop("processed_agent_data")
-                )
-                processed_agent_data_batch.append(processed_agent_data)
-        store_adapter.save_data(
-            processed_agent_data_batch=processed_agent_data_batch
-        )
+        payload = detect_codec(msg.payload).decode(msg.payload)
+        items = payload if isinstance(payload, list) else [payload]
+        # Create ProcessedAgentData instances with the received data
+        processed_agent_data_batch = decode_records(items, processed_agent_data_list, TRUST_SCHEMA_VERSION)
+        # Waiting for the write keeps MQTT acks behind the buffer and the messages in order
+        asyncio.run_coroutine_threadsafe(buffer_processed_agent_data(processed_agent_data_batch), event_loop).result()
         return {"status": "ok"}
     except Exception as e:
         logging.info(f"Error processing MQTT message: {e}")
 
-# Connect
+# Connect and start with the app (see start_hub)
 client.on_connect = on_connect
-client.on_message = on_message
-client.connect(MQTT_BROKER_HOST, MQTT_BROKER_PORT)
-# Start
-client.loop_start()
\ No newline at end of file
+client.on_message = on_message
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""
+Bulk writes of processed agent data in one transaction: a multi-row INSERT
+for small batches or when the new ids are wanted, COPY for large ones.
+"""
+import json
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+from sqlalchemy import Table, insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from geo import encode_geohash
+from partitions import naive_utc
+
+COLUMNS = ("road_state", "x", "y", "z", "latitude", "longitude", "timestamp", "summary", "aggregate", "geohash")
+JSON_COLUMNS = ("summary", "aggregate")
+
+
+def _json(value) -> Optional[dict]:
+    # Trusted records keep summary and aggregate as the decoded dicts, models convert themselves
+    return value if value is None or isinstance(value, dict) else value.dict()
+
+
+def _copy_value(column: str, value):
+    # asyncpg encodes jsonb from text
+    return json.dumps(value) if column in JSON_COLUMNS and value is not None else value
+
+
+def record_row(item) -> dict:
+    agent_data = item.agent_data
+    return {
+        "road_state": item.road_state,
+        "x": agent_data.accelerometer.x,
+        "y": agent_data.accelerometer.y,
+        "z": agent_data.accelerometer.z,
+        "latitude": agent_data.gps.latitude,
+        "longitude": agent_data.gps.longitude,
+        # TIMESTAMP columns hold naive UTC, asyncpg rejects aware datetimes for them
+        "timestamp": naive_utc(agent_data.timestamp),
+        "summary": _json(item.summary),
+        "aggregate": _json(getattr(item, "aggregate", None)),
+        "geohash": encode_geohash(agent_data.gps.latitude, agent_data.gps.longitude),
+    }
+
+
+async def insert_values(conn, table: Table, rows: List[dict]) -> List[int]:
+    """
+    Multi-row INSERT ... RETURNING id; SQLAlchemy packs the rows into as few
+    statements as the driver's parameter limit allows.
+    """
+    result = await conn.execute(insert(table).returning(table.c.id), rows)
+    return list(result.scalars())
+
+
+async def copy_rows(conn, table: Table, rows: List[dict]):
+    """
+    Stream the rows with binary COPY on the asyncpg connection.
+    """
+    records = [
+        tuple(_copy_value(column, row[column]) for column in COLUMNS)
+        for row in rows
+    ]
+    driver = (await conn.get_raw_connection()).driver_connection
+    # COPY bypasses the SQLAlchemy cursor, so it runs in a transaction of its own
+    async with driver.transaction():
+        await driver.copy_records_to_table(table.name, records=records, columns=COLUMNS)
+
+
+async def bulk_insert(
+    engine: AsyncEngine,
+    table: Table,
+    items: List,
+    return_ids: bool = False,
+    copy_threshold: int = 1000,
+    on_insert: Optional[Callable[[object, List[dict]], Awaitable]] = None,
+) -> Tuple[List[int], float]:
+    """
+    Write all items in one transaction. Returns the new ids (only with
+    return_ids) and the seconds the write took. on_insert(conn, rows) runs
+    in the same transaction after the rows are written.
+    """
+    rows = [record_row(item) for item in items]
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        if return_ids or len(rows) < copy_threshold:
+            ids = await insert_values(conn, table, rows)
+        else:
+            await copy_rows(conn, table, rows)
+            ids = []
+        if on_insert is not None:
+            await on_insert(conn, rows)
+    return (ids if return_ids else []), time.perf_counter() - started
@@ -12,6 +12,37 @@ POSTGRES_PORT = try_parse(int, os.environ.get("POSTGRES_PORT")) or 5432
 POSTGRES_USER = os.environ.get("POSTGRES_USER") or "user"
 POSTGRES_PASSWORD = os.environ.get("POSTGRES_PASS") or "pass"
 POSTGRES_DB = os.environ.get("POSTGRES_DB") or "test_db"
+# Connection pool of the write path: POSTGRES_POOL_SIZE kept open plus up to
+# POSTGRES_MAX_OVERFLOW more, waiting up to POSTGRES_POOL_TIMEOUT seconds for a free one;
+# connections are replaced after POSTGRES_POOL_RECYCLE seconds
+POSTGRES_POOL_SIZE = try_parse(int, os.environ.get("POSTGRES_POOL_SIZE")) or 10
+POSTGRES_MAX_OVERFLOW = try_parse(int, os.environ.get("POSTGRES_MAX_OVERFLOW")) or 10
+POSTGRES_POOL_TIMEOUT = try_parse(int, os.environ.get("POSTGRES_POOL_TIMEOUT")) or 30
+POSTGRES_POOL_RECYCLE = try_parse(int, os.environ.get("POSTGRES_POOL_RECYCLE")) or 1800
+# Prepared statements cached per connection
+POSTGRES_STATEMENT_CACHE_SIZE = try_parse(int, os.environ.get("POSTGRES_STATEMENT_CACHE_SIZE")) or 500
+# Read path: its own pool, on a replica if POSTGRES_READ_HOST is set
+POSTGRES_READ_HOST = os.environ.get("POSTGRES_READ_HOST") or POSTGRES_HOST
+POSTGRES_READ_PORT = try_parse(int, os.environ.get("POSTGRES_READ_PORT")) or POSTGRES_PORT
+POSTGRES_READ_POOL_SIZE = try_parse(int, os.environ.get("POSTGRES_READ_POOL_SIZE")) or 5
+# Records marked with this schema version by the edge skip validation (0 - validate everything)
+TRUST_SCHEMA_VERSION = try_parse(int, os.environ.get("TRUST_SCHEMA_VERSION")) or 0
+# Batches of at least this many rows are written with COPY instead of a multi-row INSERT
+COPY_THRESHOLD = try_parse(int, os.environ.get("COPY_THRESHOLD")) or 1000
+# Seconds a WebSocket subscriber may take to receive one message before it is dropped
+WS_SEND_TIMEOUT = try_parse(int, os.environ.get("WS_SEND_TIMEOUT")) or 5
+# processed_agent_data is partitioned by day: partitions are created PARTITION_DAYS_AHEAD
+# days in advance and dropped whole after RETENTION_DAYS days (0 - keep everything)
+PARTITION_DAYS_AHEAD = try_parse(int, os.environ.get("PARTITION_DAYS_AHEAD")) or 3
+RETENTION_DAYS = try_parse(int, os.environ.get("RETENTION_DAYS")) or 0
+# Hourly and daily rollups per geohash cell of ROLLUP_PRECISION characters, updated by every
+# insert; hours with updated or deleted rows are rebuilt every ROLLUP_INTERVAL seconds (and the
+# last ROLLUP_LOOKBACK_HOURS hours once at startup); hourly rows are kept
+# ROLLUP_HOURLY_RETENTION_DAYS days (0 - keep everything)
+ROLLUP_PRECISION = try_parse(int, os.environ.get("ROLLUP_PRECISION")) or 7
+ROLLUP_INTERVAL = try_parse(int, os.environ.get("ROLLUP_INTERVAL")) or 60
+ROLLUP_LOOKBACK_HOURS = try_parse(int, os.environ.get("ROLLUP_LOOKBACK_HOURS")) or 2
+ROLLUP_HOURLY_RETENTION_DAYS = try_parse(int, os.environ.get("ROLLUP_HOURLY_RETENTION_DAYS")) or 0
 
 # try:
 #     # Establish connection to the database
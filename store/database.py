@@ -0,0 +1,51 @@
+"""
+Async database engines of the store (SQLAlchemy on asyncpg): one pool for
+writes and a separate one for reads, optionally on a replica.
+"""
+from sqlalchemy import URL, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from config import (
+    POSTGRES_HOST, POSTGRES_PORT, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_DB,
+    POSTGRES_POOL_SIZE, POSTGRES_MAX_OVERFLOW, POSTGRES_POOL_TIMEOUT, POSTGRES_POOL_RECYCLE,
+    POSTGRES_STATEMENT_CACHE_SIZE, POSTGRES_READ_HOST, POSTGRES_READ_PORT, POSTGRES_READ_POOL_SIZE,
+)
+
+
+def create_engine(host: str, port: int, pool_size: int, max_overflow: int) -> AsyncEngine:
+    url = URL.create(
+        "postgresql+asyncpg",
+        username=POSTGRES_USER,
+        password=POSTGRES_PASSWORD,
+        host=host,
+        port=port,
+        database=POSTGRES_DB,
+        # Statements prepared by the dialect, reused per connection
+        query={"prepared_statement_cache_size": str(POSTGRES_STATEMENT_CACHE_SIZE)},
+    )
+    return create_async_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=POSTGRES_POOL_TIMEOUT,
+        pool_recycle=POSTGRES_POOL_RECYCLE,
+        # A connection dropped by the server is replaced instead of failing the request
+        pool_pre_ping=True,
+    )
+
+
+write_engine = create_engine(POSTGRES_HOST, POSTGRES_PORT, POSTGRES_POOL_SIZE, POSTGRES_MAX_OVERFLOW)
+read_engine = create_engine(POSTGRES_READ_HOST, POSTGRES_READ_PORT, POSTGRES_READ_POOL_SIZE, POSTGRES_MAX_OVERFLOW)
+
+
+async def test_connection(engine: AsyncEngine):
+    try:
+        async with engine.connect() as conn:
+            row = (await conn.execute(text("SELECT 1"))).fetchone()
+            print("Database connection successful:", row[0] == 1)
+    except Exception as e:
+        print("Error connecting to the database:", e)
+
+
+async def dispose():
+    await write_engine.dispose()
+    await read_engine.dispose()
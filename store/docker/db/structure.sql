@@ -1,10 +1,122 @@
+-- Partitioned by day on timestamp; the store creates the partitions ahead of time
+-- (processed_agent_data_pYYYYMMDD) and drops them whole once past the retention period
 CREATE TABLE processed_agent_data (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     road_state VARCHAR(255) NOT NULL,
     x FLOAT,
     y FLOAT,
     z FLOAT,
     latitude FLOAT,
     longitude FLOAT,
-    timestamp TIMESTAMP
+    timestamp TIMESTAMP NOT NULL,
+    -- Set on summaries of runs of normal samples sent by the edge
+    summary JSONB,
+    -- Set on per-cell windows pre-aggregated by the hub
+    aggregate JSONB,
+    -- Geohash of (latitude, longitude), set by the store; "C" collation keeps prefix ranges index scans
+    geohash VARCHAR(12) COLLATE "C",
+    -- The partition key has to be part of the primary key
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- An existing unpartitioned table is migrated by moving it aside before running this script:
+--   ALTER TABLE processed_agent_data RENAME TO processed_agent_data_old;
+--   ALTER INDEX processed_agent_data_pkey RENAME TO processed_agent_data_old_pkey;
+--   DROP INDEX IF EXISTS processed_agent_data_timestamp_id_idx, processed_agent_data_road_state_timestamp_id_idx,
+--       processed_agent_data_geohash_idx, processed_agent_data_road_state_geohash_idx;
+-- and copying the rows over afterwards, into partitions named the way the store names them:
+--   DO $$ DECLARE day DATE; BEGIN
+--       FOR day IN SELECT DISTINCT timestamp::DATE FROM processed_agent_data_old WHERE timestamp IS NOT NULL LOOP
+--           EXECUTE format('CREATE TABLE IF NOT EXISTS processed_agent_data_p%s PARTITION OF processed_agent_data '
+--               'FOR VALUES FROM (%L) TO (%L)', to_char(day, 'YYYYMMDD'), day, day + 1);
+--       END LOOP;
+--   END $$;
+--   INSERT INTO processed_agent_data SELECT * FROM processed_agent_data_old WHERE timestamp IS NOT NULL;
+--   SELECT setval(pg_get_serial_sequence('processed_agent_data', 'id'), (SELECT max(id) FROM processed_agent_data));
+
+-- Keyset pagination of the list endpoint: (timestamp, id) order, optionally within a road_state
+CREATE INDEX processed_agent_data_timestamp_id_idx ON processed_agent_data (timestamp, id);
+CREATE INDEX processed_agent_data_road_state_timestamp_id_idx ON processed_agent_data (road_state, timestamp, id);
+
+-- Same encoding as geo.encode_geohash in the store, for rows written before the geohash column
+CREATE OR REPLACE FUNCTION geohash_encode(latitude FLOAT, longitude FLOAT, precision INT DEFAULT 12)
+RETURNS VARCHAR AS $$
+DECLARE
+    alphabet CONSTANT TEXT := '0123456789bcdefghjkmnpqrstuvwxyz';
+    lat_low FLOAT := -90;
+    lat_high FLOAT := 90;
+    lon_low FLOAT := -180;
+    lon_high FLOAT := 180;
+    middle FLOAT;
+    bits INT := 0;
+    bit_count INT := 0;
+    even BOOLEAN := TRUE;
+    result TEXT := '';
+BEGIN
+    IF latitude IS NULL OR longitude IS NULL THEN
+        RETURN NULL;
+    END IF;
+    WHILE length(result) < precision LOOP
+        IF even THEN
+            middle := (lon_low + lon_high) / 2;
+            IF longitude >= middle THEN
+                bits := bits * 2 + 1;
+                lon_low := middle;
+            ELSE
+                bits := bits * 2;
+                lon_high := middle;
+            END IF;
+        ELSE
+            middle := (lat_low + lat_high) / 2;
+            IF latitude >= middle THEN
+                bits := bits * 2 + 1;
+                lat_low := middle;
+            ELSE
+                bits := bits * 2;
+                lat_high := middle;
+            END IF;
+        END IF;
+        even := NOT even;
+        bit_count := bit_count + 1;
+        IF bit_count = 5 THEN
+            result := result || substr(alphabet, bits + 1, 1);
+            bits := 0;
+            bit_count := 0;
+        END IF;
+    END LOOP;
+    RETURN result;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Spatial queries of the store (bbox, radius, nearest) are geohash prefix range scans.
+-- Idempotent, so it also migrates an existing database: add the column, backfill and index it
+ALTER TABLE processed_agent_data ADD COLUMN IF NOT EXISTS geohash VARCHAR(12) COLLATE "C";
+UPDATE processed_agent_data SET geohash = geohash_encode(latitude, longitude) WHERE geohash IS NULL AND latitude IS NOT NULL;
+CREATE INDEX IF NOT EXISTS processed_agent_data_geohash_idx ON processed_agent_data (geohash);
+CREATE INDEX IF NOT EXISTS processed_agent_data_road_state_geohash_idx ON processed_agent_data (road_state, geohash);
+
+-- Road-state rollups per geohash cell (geohash prefix), rebuilt by the store from the rows
+-- above: count samples, z_sum and z_squares give the mean and standard deviation of z
+CREATE TABLE IF NOT EXISTS processed_agent_data_rollup_hourly (
+    bucket TIMESTAMP NOT NULL,
+    cell VARCHAR(12) COLLATE "C" NOT NULL,
+    road_state VARCHAR(255) NOT NULL,
+    count BIGINT NOT NULL,
+    z_sum FLOAT NOT NULL,
+    z_squares FLOAT NOT NULL,
+    z_min FLOAT,
+    z_max FLOAT,
+    PRIMARY KEY (bucket, cell, road_state)
+);
+
+CREATE TABLE IF NOT EXISTS processed_agent_data_rollup_daily (
+    bucket TIMESTAMP NOT NULL,
+    cell VARCHAR(12) COLLATE "C" NOT NULL,
+    road_state VARCHAR(255) NOT NULL,
+    count BIGINT NOT NULL,
+    z_sum FLOAT NOT NULL,
+    z_squares FLOAT NOT NULL,
+    z_min FLOAT,
+    z_max FLOAT,
+    PRIMARY KEY (bucket, cell, road_state)
 );
@@ -0,0 +1,153 @@
+"""
+Spatial queries on processed_agent_data through its geohash column.
+
+Every row stores the 12-character geohash of its position (btree index, "C"
+collation). A bounding box is covered by at most max_cells geohash cells,
+each one a range scan of that index, and the candidates are then filtered
+exactly on latitude/longitude. Radius and nearest-k queries search the
+bounding box of the circle and order by great-circle distance.
+"""
+import math
+from typing import List, Optional, Tuple
+from sqlalchemy import Select, Table, and_, func, literal, or_, select
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+EARTH_RADIUS_M = 6371008.8
+METRES_PER_DEGREE = 111320.0
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            bounds[0] = middle
+        else:
+            bits = bits * 2
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """
+    Height and width in degrees of a geohash cell.
+    """
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def covering_cells(min_lat: float, min_lon: float, max_lat: float, max_lon: float, max_cells: int = 32) -> List[str]:
+    """
+    Geohash prefixes covering the box, at the finest precision needing at most max_cells of them.
+    """
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(candidate)
+        rows = math.floor((max_lat + 90) / height) - math.floor((min_lat + 90) / height) + 1
+        columns = math.floor((max_lon + 180) / width) - math.floor((min_lon + 180) / width) + 1
+        if rows * columns <= max_cells:
+            precision = candidate
+            break
+    height, width = cell_size(precision)
+    cells = set()
+    # Centres of the cells of the grid the box overlaps
+    latitude = (math.floor((min_lat + 90) / height) + 0.5) * height - 90
+    while latitude - height / 2 <= max_lat:
+        longitude = (math.floor((min_lon + 180) / width) + 0.5) * width - 180
+        while longitude - width / 2 <= max_lon:
+            cells.add(encode_geohash(min(latitude, 90.0), min(longitude, 180.0), precision))
+            longitude += width
+        latitude += height
+    return sorted(cells)
+
+
+def bbox_query(
+    table: Table,
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    road_state: Optional[str] = None,
+    limit: int = 1000,
+) -> Select:
+    # '~' sorts after every geohash character, so [prefix, prefix~) holds exactly the cell
+    cells = covering_cells(min_lat, min_lon, max_lat, max_lon)
+    conditions = [
+        or_(*(and_(table.c.geohash >= cell, table.c.geohash < cell + "~") for cell in cells)),
+        table.c.latitude.between(min_lat, max_lat),
+        table.c.longitude.between(min_lon, max_lon),
+    ]
+    if road_state is not None:
+        conditions.append(table.c.road_state == road_state)
+    return select(table).where(and_(*conditions)).limit(limit)
+
+
+def distance_expression(table: Table, latitude: float, longitude: float):
+    """
+    Haversine distance in metres from the point, computed by PostgreSQL.
+    """
+    lat1, lat2 = func.radians(literal(latitude)), func.radians(table.c.latitude)
+    half_dlat = (lat2 - lat1) / 2.0
+    half_dlon = (func.radians(table.c.longitude) - func.radians(literal(longitude))) / 2.0
+    chord = func.power(func.sin(half_dlat), 2) + func.cos(lat1) * func.cos(lat2) * func.power(func.sin(half_dlon), 2)
+    return 2 * EARTH_RADIUS_M * func.asin(func.sqrt(func.least(1.0, chord)))
+
+
+def radius_query(
+    table: Table,
+    latitude: float,
+    longitude: float,
+    radius_m: float,
+    road_state: Optional[str] = None,
+    limit: int = 1000,
+) -> Select:
+    """
+    Rows within radius_m of the point, nearest first, with their distance_m.
+    """
+    lat_delta = radius_m / METRES_PER_DEGREE
+    # Near the poles the circle spans all longitudes
+    lon_delta = min(180.0, radius_m / (METRES_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6)))
+    candidates = bbox_query(
+        table,
+        max(-90.0, latitude - lat_delta),
+        max(-180.0, longitude - lon_delta),
+        min(90.0, latitude + lat_delta),
+        min(180.0, longitude + lon_delta),
+        road_state,
+        limit=None,
+    ).subquery()
+    distance = distance_expression(candidates, latitude, longitude).label("distance_m")
+    return select(candidates, distance).where(distance <= radius_m).order_by(distance).limit(limit)
+
+
+async def nearest(
+    conn,
+    table: Table,
+    latitude: float,
+    longitude: float,
+    k: int,
+    road_state: Optional[str] = None,
+    start_radius_m: float = 100.0,
+    max_radius_m: float = 50000.0,
+) -> list:
+    """
+    The k rows nearest to the point, searching circles of doubling radius
+    until one holds k rows (the k nearest are then all inside it) or
+    max_radius_m is reached.
+    """
+    radius = start_radius_m
+    while True:
+        rows = (await conn.execute(radius_query(table, latitude, longitude, radius, road_state, limit=k))).mappings().all()
+        if len(rows) >= k or radius >= max_radius_m:
+            return rows
+        radius = min(max_radius_m, radius * 2)
@@ -1,45 +1,71 @@
-from config import POSTGRES_HOST, POSTGRES_PORT, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_DB
-from sqlalchemy import create_engine, MetaData, text, Table, Column, Integer, String, Float, DateTime
-from sqlalchemy.dialects.postgresql import insert
-from pydantic import BaseModel, ValidationError, ValidationInfo, ValidatorFunctionWrapHandler, validator
-from datetime import datetime
-from fastapi import FastAPI, WebSocket, HTTPException
-from typing import Set, List
+from config import (
+    TRUST_SCHEMA_VERSION, COPY_THRESHOLD, WS_SEND_TIMEOUT, PARTITION_DAYS_AHEAD, RETENTION_DAYS,
+    ROLLUP_PRECISION, ROLLUP_INTERVAL, ROLLUP_LOOKBACK_HOURS, ROLLUP_HOURLY_RETENTION_DAYS,
+)
+from sqlalchemy import MetaData, Table, Column, Index, Integer, String, Float, DateTime, select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import BaseModel, TypeAdapter, ValidationError, ValidationInfo, ValidatorFunctionWrapHandler, validator
+from datetime import datetime, timedelta
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Path, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Dict, Set, List, Optional
 import asyncio
 import json
+import asyncpg
+from codec import codec_for_content_type
+from trusted_record import decode_records
+from bulk_insert import bulk_insert
+from database import write_engine, read_engine, test_connection, dispose
+from geo import bbox_query, encode_geohash, nearest, radius_query
+from pagination import NDJSON_CONTENT_TYPE, encode_cursor, keyset_query, stream_ndjson
+from partitions import PartitionManager, naive_utc
+from rollups import RollupJob, rollup_hours, rollup_row, rollup_table
+import logging
 
-# SQLAlchemy setup
-DATABASE_URL = f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-engine = create_engine(DATABASE_URL)
+# SQLAlchemy setup; the engines are in database.py
 metadata = MetaData()
 
 # Define the ProcessedAgentData table
 processed_agent_data = Table(
 "processed_agent_data",
 metadata,
-Column("id", Integer, primary_key=True, index=True),
+# Partitioned by day on timestamp (see partitions.py), which makes it part of the key
+Column("id", Integer, primary_key=True, autoincrement=True, index=True),
 Column("road_state", String),
 Column("x", Float),
 Column("y", Float),
 Column("z", Float),
 Column("latitude", Float),
 Column("longitude", Float),
-Column("timestamp", DateTime),
+Column("timestamp", DateTime, primary_key=True, nullable=False),
+Column("summary", JSONB),
+Column("aggregate", JSONB),
+# Spatial queries, see geo.py
+Column("geohash", String(12, collation="C")),
+# Keyset pagination order, alone and within a road_state (see structure.sql)
+Index("processed_agent_data_timestamp_id_idx", "timestamp", "id"),
+Index("processed_agent_data_road_state_timestamp_id_idx", "road_state", "timestamp", "id"),
+Index("processed_agent_data_geohash_idx", "geohash"),
+Index("processed_agent_data_road_state_geohash_idx", "road_state", "geohash"),
 )
 
-def test_connection():
-    try:
-        with engine.connect() as conn:
-            # Create a SQL expression using SQLAlchemy's text() function
-            query = text('SELECT 1')
-            # Execute the query
-            result = conn.execute(query)
-            # Fetch the result (optional)
-            row = result.fetchone()
-            # Print the result
-            print("Database connection successful:", row[0] == 1)
-    except Exception as e:
-        print("Error connecting to the database:", e)
+# Per-cell rollups for dashboards, see rollups.py
+rollup_tables = {
+    "hourly": rollup_table("processed_agent_data_rollup_hourly", metadata),
+    "daily": rollup_table("processed_agent_data_rollup_daily", metadata),
+}
+
+partitions = PartitionManager(write_engine, processed_agent_data.name, PARTITION_DAYS_AHEAD, RETENTION_DAYS)
+rollups = RollupJob(
+write_engine,
+processed_agent_data.name,
+rollup_tables["hourly"],
+rollup_tables["daily"],
+ROLLUP_PRECISION,
+ROLLUP_LOOKBACK_HOURS,
+ROLLUP_HOURLY_RETENTION_DAYS,
+)
 
 # FastAPI models
 class AccelerometerData(BaseModel):
@@ -72,13 +98,49 @@ class AgentData(BaseModel):
         data_dict['timestamp'] = iso_timestamp
         return data_dict
 
+class RunSummary(BaseModel):
+    start: datetime
+    end: datetime
+    count: int
+    z_min: float
+    z_max: float
+    z_mean: float
+    path: List[GpsData]
+    def dict(self, *args, **kwargs):
+        data_dict = super().dict(*args, **kwargs)
+        data_dict['start'] = self.start.isoformat()
+        data_dict['end'] = self.end.isoformat()
+        return data_dict
+
+class CellAggregate(BaseModel):
+    cell: str
+    start: datetime
+    end: datetime
+    count: int
+    counts: Dict[str, int]
+    z_min: float
+    z_max: float
+    z_mean: float
+    z_std: float
+    def dict(self, *args, **kwargs):
+        data_dict = super().dict(*args, **kwargs)
+        data_dict['start'] = self.start.isoformat()
+        data_dict['end'] = self.end.isoformat()
+        return data_dict
+
 class ProcessedAgentData(BaseModel):
     road_state: str
     agent_data: AgentData
+    summary: Optional[RunSummary] = None
+    aggregate: Optional[CellAggregate] = None
     def dict(self, *args, **kwargs):
         # Remove agent_data from the dictionary to avoid recursion error
         data_dict = super().dict(*args, **kwargs)
         data_dict['agent_data'] = self.agent_data.dict()
+        if self.summary is not None:
+            data_dict['summary'] = self.summary.dict()
+        if self.aggregate is not None:
+            data_dict['aggregate'] = self.aggregate.dict()
         return data_dict
 
 # Database model
@@ -91,10 +153,61 @@ class ProcessedAgentDataInDB(BaseModel):
     latitude: float
     longitude: float
     timestamp: datetime
+    summary: Optional[dict] = None
+    aggregate: Optional[dict] = None
+    geohash: Optional[str] = None
+
+class ProcessedAgentDataNear(ProcessedAgentDataInDB):
+    distance_m: float
+
+class ProcessedAgentDataPage(BaseModel):
+    items: List[ProcessedAgentDataInDB]
+    next_cursor: Optional[str] = None
+
+class RollupInDB(BaseModel):
+    bucket: datetime
+    cell: str
+    road_state: str
+    count: int
+    z_mean: float
+    z_std: float
+    z_min: Optional[float] = None
+    z_max: Optional[float] = None
 
 
 # FastAPI app setup
 app = FastAPI()
+
+maintenance_task: Optional[asyncio.Task] = None
+
+async def maintain():
+    # Partitions ahead and past retention, then the rollups of what was written since the last run
+    while True:
+        try:
+            await partitions.refresh()
+            await partitions.ensure_ahead()
+            await partitions.drop_expired()
+            hours = await rollups.run_once()
+            if hours:
+                logging.info(f"Rollups rebuilt for {hours} hours")
+        except (SQLAlchemyError, asyncpg.PostgresError, OSError) as e:
+            logging.error(f"Storage maintenance failed: {e}")
+        await asyncio.sleep(ROLLUP_INTERVAL)
+
+@app.on_event("startup")
+async def check_database():
+    global maintenance_task
+    # Once at startup instead of before every request
+    await test_connection(write_engine)
+    await partitions.ensure_ahead()
+    maintenance_task = asyncio.create_task(maintain())
+
+@app.on_event("shutdown")
+async def close_database():
+    if maintenance_task is not None:
+        maintenance_task.cancel()
+        await asyncio.gather(maintenance_task, return_exceptions=True)
+    await dispose()
 # WebSocket subscriptions
 subscriptions: Set[WebSocket] = set()
 # FastAPI WebSocket endpoint
@@ -106,79 +219,156 @@ async def websocket_endpoint(websocket: WebSocket):
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        subscriptions.remove(websocket)
+        subscriptions.discard(websocket)
 
 # Function to send data to subscribed users
 async def send_data_to_subscribers(data):
-    for websocket in subscriptions:
-        data1 = [agent_data.dict() for agent_data in data]
-        # message = json.dumps(data1)
-        print('Send data WS', data1)
-        await websocket.send_json(data1)
+    if not subscriptions:
+        return
+    # Serialized once, sent to all subscribers concurrently so a slow one holds up nobody
+    message = json.dumps([agent_data.dict() for agent_data in data])
+    websockets = list(subscriptions)
+    print(f"Send data WS: {len(data)} records to {len(websockets)} subscribers")
+    results = await asyncio.gather(
+        *(asyncio.wait_for(websocket.send_text(message), WS_SEND_TIMEOUT) for websocket in websockets),
+        return_exceptions=True,
+    )
+    for websocket, result in zip(websockets, results):
+        if isinstance(result, Exception):
+            subscriptions.discard(websocket)
+
 
+processed_agent_data_list = TypeAdapter(List[ProcessedAgentData])
 
 @app.post("/processed_agent_data/")
-async def create_processed_agent_data(data: List[ProcessedAgentData]):
+async def create_processed_agent_data(request: Request, return_ids: bool = False):
     print("ACTION: STORE RECEIVE DATA FROM HUB")
-    test_connection()
-    inserted_data = []
-
-    async def insert_data(data):
-        with engine.connect() as conn:
-            for item in data:
-                query = insert(processed_agent_data).values(
-                    road_state=item.road_state,
-                    x=item.agent_data.accelerometer.x,
-                    y=item.agent_data.accelerometer.y,
-                    z=item.agent_data.accelerometer.z,
-                    latitude=item.agent_data.gps.latitude,
-                    longitude=item.agent_data.gps.longitude,
-                    timestamp=item.agent_data.timestamp
-                ).returning(*processed_agent_data.c)
-
-                result = conn.execute(query)
-                inserted_data.extend(result.fetchall())
-            conn.commit()
-
+    try:
+        codec = codec_for_content_type(request.headers.get("content-type"))
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    try:
+        payload = codec.decode(await request.body())
+        data = decode_records(payload if isinstance(payload, list) else [payload], processed_agent_data_list, TRUST_SCHEMA_VERSION)
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not data:
+        return {"success": True, "count": 0}
+    timestamps = [item.agent_data.timestamp for item in data]
+    try:
+        try:
+            await partitions.ensure_for(timestamps)
+            ids, seconds = await bulk_insert(write_engine, processed_agent_data, data, return_ids, COPY_THRESHOLD, rollups.add)
+        except (SQLAlchemyError, asyncpg.PostgresError):
+            # Another store worker may have dropped a partition this one still takes for existing
+            await partitions.refresh()
+            await partitions.ensure_for(timestamps)
+            ids, seconds = await bulk_insert(write_engine, processed_agent_data, data, return_ids, COPY_THRESHOLD, rollups.add)
+    except (SQLAlchemyError, asyncpg.PostgresError, OSError) as e:
+        logging.error(f"Failed to insert {len(data)} rows: {e}")
+        raise HTTPException(status_code=500, detail="Failed to insert data into the database")
+    rows_per_second = len(data) / seconds if seconds else 0.0
+    print(f"ACTION: STORE SAVES {len(data)} ROWS TO DB ({rows_per_second:.0f} rows/s)")
     await send_data_to_subscribers(data)
-    # await insert_data(data)
-    print("ACTION: STORE SAVES DATA TO DB")
 
-    if not inserted_data:
-        raise HTTPException(status_code=500, detail="Failed to insert data into the database")
+    response = {"success": True, "count": len(data), "rows_per_second": rows_per_second}
+    if return_ids:
+        response["ids"] = ids
+    return response
+
 
-    return { "success": True }
+# Declared before /{processed_agent_data_id}, which would take these paths otherwise
+@app.get("/processed_agent_data/bbox",response_model=list[ProcessedAgentDataInDB])
+async def bbox_processed_agent_data(
+    min_lat: float = Query(ge=-90, le=90),
+    min_lon: float = Query(ge=-180, le=180),
+    max_lat: float = Query(ge=-90, le=90),
+    max_lon: float = Query(ge=-180, le=180),
+    road_state: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Rows inside the box, e.g. the anomalies (road_state) of a map viewport.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        # A box across the antimeridian is two queries for the client
+        raise HTTPException(status_code=400, detail="min_lat/min_lon must not exceed max_lat/max_lon")
+    query = bbox_query(processed_agent_data, min_lat, min_lon, max_lat, max_lon, road_state, limit)
+    async with read_engine.connect() as conn:
+        return (await conn.execute(query)).mappings().all()
 
+@app.get("/processed_agent_data/radius",response_model=list[ProcessedAgentDataNear])
+async def radius_processed_agent_data(
+    lat: float = Query(ge=-90, le=90),
+    lon: float = Query(ge=-180, le=180),
+    radius_m: float = Query(gt=0, le=100000),
+    road_state: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Rows within radius_m metres of the point, nearest first.
+    """
+    query = radius_query(processed_agent_data, lat, lon, radius_m, road_state, limit)
+    async with read_engine.connect() as conn:
+        return (await conn.execute(query)).mappings().all()
+
+@app.get("/processed_agent_data/nearest",response_model=list[ProcessedAgentDataNear])
+async def nearest_processed_agent_data(
+    lat: float = Query(ge=-90, le=90),
+    lon: float = Query(ge=-180, le=180),
+    k: int = Query(10, ge=1, le=1000),
+    road_state: Optional[str] = None,
+):
+    """
+    The k rows nearest to the point within 50 km, nearest first.
+    """
+    async with read_engine.connect() as conn:
+        return await nearest(conn, processed_agent_data, lat, lon, k, road_state)
 
 @app.get("/processed_agent_data/{processed_agent_data_id}",response_model=ProcessedAgentDataInDB)
-def read_processed_agent_data(processed_agent_data_id: int):
+async def read_processed_agent_data(processed_agent_data_id: int):
     # Get data by id
     query = processed_agent_data.select().where(processed_agent_data.c.id == processed_agent_data_id)
-    with engine.connect() as conn:
-        result = conn.execute(query).first()
+    async with read_engine.connect() as conn:
+        result = (await conn.execute(query)).mappings().first()
         if result:
             return result
         else:
             raise HTTPException(status_code=404, detail="Item not found")
 
-@app.get("/processed_agent_data/",response_model=list[ProcessedAgentDataInDB])
-def list_processed_agent_data():
-    # Get list of data
-    query = processed_agent_data.select()
-    with engine.connect() as conn:
-        result = conn.execute(query).fetchall()
-        return result
+@app.get("/processed_agent_data/",response_model=ProcessedAgentDataPage)
+async def list_processed_agent_data(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    road_state: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """
+    A page of rows in (timestamp, id) order; pass next_cursor back for the
+    next one. With format=ndjson (or Accept: application/x-ndjson) all rows
+    after cursor are streamed instead, one JSON object per line.
+    """
+    try:
+        if format == "ndjson" or NDJSON_CONTENT_TYPE in request.headers.get("accept", ""):
+            query = keyset_query(processed_agent_data, cursor, start, end, road_state)
+            return StreamingResponse(stream_ndjson(read_engine, query), media_type=NDJSON_CONTENT_TYPE)
+        # One extra row tells whether there is a next page
+        query = keyset_query(processed_agent_data, cursor, start, end, road_state, limit + 1)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    async with read_engine.connect() as conn:
+        rows = (await conn.execute(query)).mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+    return {"items": rows, "next_cursor": next_cursor}
 
 @app.put("/processed_agent_data/{processed_agent_data_id}")
-def update_processed_agent_data(processed_agent_data_id: int, data: ProcessedAgentData):
-    # Check exists
-    query = processed_agent_data.select().where(processed_agent_data.c.id == processed_agent_data_id)
-    with engine.connect() as conn:
-        result = conn.execute(query).first()
-        if not result:
-            raise HTTPException(status_code=404, detail="Item not found")
-
-    
+async def update_processed_agent_data(processed_agent_data_id: int, data: ProcessedAgentData):
     # Update data
     query = processed_agent_data.update().where(processed_agent_data.c.id == processed_agent_data_id).values(
         road_state=data.road_state,
@@ -187,23 +377,70 @@ def update_processed_agent_data(processed_agent_data_id: int, data: ProcessedAge
         z=data.agent_data.accelerometer.z,
         latitude=data.agent_data.gps.latitude,
         longitude=data.agent_data.gps.longitude,
-        timestamp=data.agent_data.timestamp
+        timestamp=naive_utc(data.agent_data.timestamp),
+        summary=data.summary.dict() if data.summary else None,
+        aggregate=data.aggregate.dict() if data.aggregate else None,
+        geohash=encode_geohash(data.agent_data.gps.latitude, data.agent_data.gps.longitude)
     )
-    with engine.connect() as conn:
-        conn.execute(query)
-        conn.commit()
+    # A new timestamp may move the row to another partition
+    await partitions.ensure_for([data.agent_data.timestamp])
+    async with write_engine.begin() as conn:
+        # The rollups of the hour the row leaves need refreshing too
+        previous = select(processed_agent_data.c.timestamp).where(processed_agent_data.c.id == processed_agent_data_id).with_for_update()
+        timestamps = (await conn.execute(previous)).scalars().all()
+        if not timestamps:
+            raise HTTPException(status_code=404, detail="Item not found")
+        await conn.execute(query)
+    rollups.mark([*timestamps, data.agent_data.timestamp])
     return data
 
 @app.delete("/processed_agent_data/{processed_agent_data_id}")
-def delete_processed_agent_data(processed_agent_data_id: int):
+async def delete_processed_agent_data(processed_agent_data_id: int):
     # Delete by id
     query = processed_agent_data.delete().where(processed_agent_data.c.id == processed_agent_data_id)
-    with engine.connect() as conn:
-        result = conn.execute(query)
-        if result.rowcount == 0:
+    async with write_engine.begin() as conn:
+        timestamps = (await conn.execute(query.returning(processed_agent_data.c.timestamp))).scalars().all()
+        if not timestamps:
             raise HTTPException(status_code=404, detail="Item not found")
-        conn.commit()
-        return result
+    rollups.mark(timestamps)
+    return {"success": True}
+
+
+@app.get("/rollups/{granularity}",response_model=list[RollupInDB])
+async def list_rollups(
+    granularity: str = Path(pattern="^(hourly|daily)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cell: Optional[str] = Query(None, max_length=12),
+    road_state: Optional[str] = None,
+    limit: int = Query(10000, ge=1, le=100000),
+):
+    """
+    Per-cell road-state counts and z statistics in [start, end), bucket
+    order; cell is a geohash prefix, matching every cell inside it.
+    """
+    query = rollups.query(rollup_tables[granularity], start, end, cell, road_state, limit)
+    async with read_engine.connect() as conn:
+        rows = (await conn.execute(query)).mappings().all()
+    return [rollup_row(row) for row in rows]
+
+@app.post("/rollups/rebuild")
+async def rebuild_rollups(start: datetime, end: datetime):
+    """
+    Recompute the rollups of every hour in [start, end), e.g. after a backfill.
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if end - start > timedelta(days=366):
+        raise HTTPException(status_code=400, detail="At most a year at a time")
+    hours = rollup_hours(start, end)
+    try:
+        await rollups.rebuild(hours)
+    except (SQLAlchemyError, asyncpg.PostgresError, OSError) as e:
+        logging.error(f"Failed to rebuild rollups: {e}")
+        raise HTTPException(status_code=500, detail="Failed to rebuild rollups")
+    return {"success": True, "hours": len(hours)}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+"""
+Keyset pagination over (timestamp, id) with an opaque cursor, and NDJSON
+streaming of whole result sets through a server-side cursor.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+from sqlalchemy import Table, Select, and_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncEngine
+from partitions import naive_utc
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Position after which the next page starts; ValueError if the cursor is not ours.
+    """
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_query(
+    table: Table,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    road_state: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Select:
+    """
+    Rows in (timestamp, id) order after cursor, within [start, end) and of road_state.
+    Rows without a timestamp have no place in this order and are not listed.
+    """
+    conditions = [table.c.timestamp.is_not(None)]
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        conditions.append(tuple_(table.c.timestamp, table.c.id) > (naive_utc(timestamp), row_id))
+    # timestamp holds naive UTC
+    if start is not None:
+        conditions.append(table.c.timestamp >= naive_utc(start))
+    if end is not None:
+        conditions.append(table.c.timestamp < naive_utc(end))
+    if road_state is not None:
+        conditions.append(table.c.road_state == road_state)
+    query = select(table).where(and_(*conditions)).order_by(table.c.timestamp, table.c.id)
+    return query if limit is None else query.limit(limit)
+
+
+def ndjson_line(row) -> bytes:
+    item = dict(row)
+    item["timestamp"] = item["timestamp"].isoformat()
+    return json.dumps(item).encode() + b"\n"
+
+
+async def stream_ndjson(engine: AsyncEngine, query: Select, batch_size: int = 1000) -> AsyncIterator[bytes]:
+    """
+    One JSON object per line; rows are fetched batch_size at a time from a
+    server-side cursor, so memory stays flat whatever the result size.
+    """
+    async with engine.connect() as conn:
+        result = await conn.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.mappings().partitions():
+            yield b"".join(ndjson_line(row) for row in rows)
@@ -0,0 +1,105 @@
+"""
+Daily range partitions of processed_agent_data on timestamp, managed by the
+store: a partition is created before rows of its day are written (and
+days_ahead days in advance), and whole partitions older than retention_days
+are dropped.
+"""
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, Set
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+PARTITION_SUFFIX_FORMAT = "%Y%m%d"
+# Serializes partition creation between store workers
+PARTITION_LOCK_KEY = 0x5041525449
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """
+    The timestamp as stored in a TIMESTAMP column.
+    """
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class PartitionManager:
+    def __init__(self, engine: AsyncEngine, table: str, days_ahead: int = 3, retention_days: int = 0):
+        self.engine = engine
+        self.table = table
+        self.days_ahead = days_ahead
+        # 0 - keep everything
+        self.retention_days = retention_days
+        self.known: Set[date] = set()
+
+    def partition_name(self, day: date) -> str:
+        return f"{self.table}_p{day.strftime(PARTITION_SUFFIX_FORMAT)}"
+
+    async def ensure_for(self, timestamps: Iterable[datetime]):
+        """
+        Create the partitions the rows with these timestamps go to.
+        """
+        missing = {naive_utc(timestamp).date() for timestamp in timestamps} - self.known
+        if missing:
+            await self.create(sorted(missing))
+
+    async def ensure_ahead(self):
+        today = datetime.now(timezone.utc).date()
+        days = [today + timedelta(days=offset) for offset in range(self.days_ahead + 1)]
+        await self.create([day for day in days if day not in self.known])
+
+    async def create(self, days: List[date]):
+        if not days:
+            return
+        async with self.engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+            for day in days:
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {self.partition_name(day)} PARTITION OF {self.table} "
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                ))
+        self.known.update(days)
+        logging.info(f"Partitions of {self.table} ready for {', '.join(day.isoformat() for day in days)}")
+
+    async def partitions(self) -> List[date]:
+        async with self.engine.connect() as conn:
+            result = await conn.execute(text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "WHERE parent.relname = :table"
+            ), {"table": self.table})
+            names = result.scalars().all()
+        prefix = f"{self.table}_p"
+        days = []
+        for name in names:
+            try:
+                days.append(datetime.strptime(name[len(prefix):], PARTITION_SUFFIX_FORMAT).date())
+            except ValueError:
+                # Not one of ours (e.g. attached by hand)
+                continue
+        return sorted(days)
+
+    async def refresh(self):
+        """
+        Reload the partitions that exist; other store workers create and drop them as well.
+        """
+        self.known = set(await self.partitions())
+
+    async def drop_expired(self) -> List[date]:
+        """
+        Drop the partitions entirely older than retention_days, returns their days.
+        """
+        if not self.retention_days:
+            return []
+        cutoff = datetime.now(timezone.utc).date() - timedelta(days=self.retention_days)
+        expired = [day for day in await self.partitions() if day < cutoff]
+        if not expired:
+            return []
+        async with self.engine.begin() as conn:
+            for day in expired:
+                await conn.execute(text(f"DROP TABLE IF EXISTS {self.partition_name(day)}"))
+        self.known.difference_update(expired)
+        logging.info(f"Dropped partitions of {self.table} for {', '.join(day.isoformat() for day in expired)}")
+        return expired
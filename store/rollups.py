@@ -0,0 +1,279 @@
+"""
+Hourly and daily road-state rollups per geohash cell, rebuilt in the
+background from the raw samples, so dashboards over long periods read a few
+rows per cell instead of every sample.
+
+Inserted rows are added to their hourly and daily buckets in the
+transaction of the insert (add), so the rollups follow the writes without
+scanning the raw rows again. Updates and deletes cannot be subtracted
+that way: they mark their hours, and the next run rebuilds the marked
+hours from processed_agent_data and then the days of those hours from the
+hourly rollup. The first run also rebuilds the last lookback_hours, which
+covers marks lost on a restart. A rebuild replaces the buckets as a whole
+in one transaction; rebuilds of all store workers are serialized by an
+advisory lock, as two of them would insert the same bucket keys.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import BigInteger, Column, DateTime, Float, MetaData, PrimaryKeyConstraint, String, Table, and_, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from partitions import naive_utc
+
+# Serializes rebuilds between store workers
+ROLLUP_LOCK_KEY = 0x524F4C4C55
+
+def rollup_table(name: str, metadata: MetaData) -> Table:
+    return Table(
+        name,
+        metadata,
+        Column("bucket", DateTime, nullable=False),
+        Column("cell", String(12, collation="C"), nullable=False),
+        Column("road_state", String, nullable=False),
+        Column("count", BigInteger, nullable=False),
+        Column("z_sum", Float, nullable=False),
+        Column("z_squares", Float, nullable=False),
+        Column("z_min", Float),
+        Column("z_max", Float),
+        PrimaryKeyConstraint("bucket", "cell", "road_state"),
+    )
+
+
+# Samples per row: runs summarised by the edge count all their samples; windows
+# aggregated by the hub count their normal readings only, their anomalies are stored
+# as rows of their own. z statistics use the row's z (the mean of what it summarises).
+# row_sample below is the same rule for rows being inserted.
+HOURLY_SQL = """
+INSERT INTO {hourly} (bucket, cell, road_state, count, z_sum, z_squares, z_min, z_max)
+SELECT bucket, cell, road_state, SUM(weight), SUM(z * weight), SUM(z * z * weight), MIN(z), MAX(z)
+FROM (
+    SELECT
+        date_trunc('hour', timestamp) AS bucket,
+        left(geohash, :precision) AS cell,
+        CASE WHEN aggregate IS NOT NULL THEN 'normal' ELSE road_state END AS road_state,
+        CASE
+            WHEN aggregate IS NOT NULL THEN COALESCE((aggregate -> 'counts' ->> 'normal')::INT, 0)
+            WHEN summary IS NOT NULL THEN (summary ->> 'count')::INT
+            ELSE 1
+        END AS weight,
+        z
+    FROM {raw}
+    WHERE timestamp >= :start AND timestamp < :end AND geohash IS NOT NULL
+) AS samples
+GROUP BY bucket, cell, road_state
+HAVING SUM(weight) > 0
+"""
+
+DAILY_SQL = """
+INSERT INTO {daily} (bucket, cell, road_state, count, z_sum, z_squares, z_min, z_max)
+SELECT date_trunc('day', bucket), cell, road_state, SUM(count), SUM(z_sum), SUM(z_squares), MIN(z_min), MAX(z_max)
+FROM {hourly}
+WHERE bucket >= :start AND bucket < :end
+GROUP BY 1, cell, road_state
+"""
+
+
+class RollupJob:
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        raw_table: str,
+        hourly: Table,
+        daily: Table,
+        precision: int = 7,
+        lookback_hours: int = 2,
+        hourly_retention_days: int = 0,
+    ):
+        self.engine = engine
+        self.raw_table = raw_table
+        self.hourly = hourly
+        self.daily = daily
+        self.precision = precision
+        self.lookback_hours = lookback_hours
+        # 0 - keep everything
+        self.hourly_retention_days = hourly_retention_days
+        self.dirty: Set[datetime] = set()
+        self.started = False
+
+    async def add(self, conn, rows: List[dict]):
+        """
+        Add inserted rows (bulk_insert.record_row dicts) to their buckets, on
+        the connection and in the transaction of the insert.
+        """
+        buckets: Dict[Tuple[datetime, str, str], list] = {}
+        for row in rows:
+            sample = row_sample(row, self.precision)
+            if sample is None:
+                continue
+            hour, cell, road_state, weight, z = sample
+            bucket = buckets.get((hour, cell, road_state))
+            if bucket is None:
+                buckets[(hour, cell, road_state)] = [weight, z * weight, z * z * weight, z, z]
+            else:
+                bucket[0] += weight
+                bucket[1] += z * weight
+                bucket[2] += z * z * weight
+                bucket[3] = min(bucket[3], z)
+                bucket[4] = max(bucket[4], z)
+        if not buckets:
+            return
+        days: Dict[Tuple[datetime, str, str], list] = {}
+        for (hour, cell, road_state), (count, z_sum, z_squares, z_min, z_max) in buckets.items():
+            day = days.get((hour.replace(hour=0), cell, road_state))
+            if day is None:
+                days[(hour.replace(hour=0), cell, road_state)] = [count, z_sum, z_squares, z_min, z_max]
+            else:
+                day[0] += count
+                day[1] += z_sum
+                day[2] += z_squares
+                day[3] = min(day[3], z_min)
+                day[4] = max(day[4], z_max)
+        # Hourly before daily and keys in order, as in every writer, so concurrent inserts cannot deadlock
+        for table, sums in ((self.hourly, buckets), (self.daily, days)):
+            statement = insert(table).values([
+                {
+                    "bucket": bucket, "cell": cell, "road_state": road_state,
+                    "count": count, "z_sum": z_sum, "z_squares": z_squares, "z_min": z_min, "z_max": z_max,
+                }
+                for (bucket, cell, road_state), (count, z_sum, z_squares, z_min, z_max) in sorted(sums.items())
+            ])
+            await conn.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.bucket, table.c.cell, table.c.road_state],
+                set_={
+                    "count": table.c.count + statement.excluded.count,
+                    "z_sum": table.c.z_sum + statement.excluded.z_sum,
+                    "z_squares": table.c.z_squares + statement.excluded.z_squares,
+                    "z_min": func.least(table.c.z_min, statement.excluded.z_min),
+                    "z_max": func.greatest(table.c.z_max, statement.excluded.z_max),
+                },
+            ))
+
+    def mark(self, timestamps: Iterable[datetime]):
+        """
+        Remember the hours of updated or deleted samples for the next run.
+        """
+        self.dirty.update(naive_utc(timestamp).replace(minute=0, second=0, microsecond=0) for timestamp in timestamps)
+
+    async def run_once(self) -> int:
+        """
+        Rebuild the marked hours (and the recent ones on the first run) and
+        their days, returns the number of hours rebuilt.
+        """
+        hours, self.dirty = self.dirty, set()
+        if not self.started:
+            now = datetime.now(timezone.utc).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+            hours.update(now - timedelta(hours=offset) for offset in range(self.lookback_hours + 1))
+        try:
+            await self.rebuild(sorted(hours))
+            self.started = True
+        except Exception:
+            # Retried on the next run
+            self.dirty.update(hours)
+            raise
+        await self.drop_expired()
+        return len(hours)
+
+    async def rebuild(self, hours: List[datetime]):
+        if not hours:
+            return
+        async with self.engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ROLLUP_LOCK_KEY})
+            for start, end in _ranges(hours, timedelta(hours=1)):
+                await conn.execute(self.hourly.delete().where(and_(self.hourly.c.bucket >= start, self.hourly.c.bucket < end)))
+                await conn.execute(
+                    text(HOURLY_SQL.format(hourly=self.hourly.name, raw=self.raw_table)),
+                    {"precision": self.precision, "start": start, "end": end},
+                )
+            days = sorted({hour.replace(hour=0) for hour in hours})
+            for start, end in _ranges(days, timedelta(days=1)):
+                await conn.execute(self.daily.delete().where(and_(self.daily.c.bucket >= start, self.daily.c.bucket < end)))
+                await conn.execute(
+                    text(DAILY_SQL.format(daily=self.daily.name, hourly=self.hourly.name)),
+                    {"start": start, "end": end},
+                )
+
+    async def drop_expired(self):
+        if not self.hourly_retention_days:
+            return
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=self.hourly_retention_days)
+        async with self.engine.begin() as conn:
+            await conn.execute(self.hourly.delete().where(self.hourly.c.bucket < cutoff))
+
+    def query(
+        self,
+        table: Table,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        cell: Optional[str] = None,
+        road_state: Optional[str] = None,
+        limit: int = 10000,
+    ):
+        """
+        Rollup rows in bucket order, cell matching by prefix.
+        """
+        conditions = []
+        if start is not None:
+            conditions.append(table.c.bucket >= naive_utc(start))
+        if end is not None:
+            conditions.append(table.c.bucket < naive_utc(end))
+        if cell:
+            conditions.append(table.c.cell.startswith(cell, autoescape=True))
+        if road_state is not None:
+            conditions.append(table.c.road_state == road_state)
+        return select(table).where(and_(*conditions)).order_by(table.c.bucket, table.c.cell, table.c.road_state).limit(limit)
+
+
+def row_sample(row: dict, precision: int) -> Optional[Tuple[datetime, str, str, int, float]]:
+    """
+    (hour, cell, road_state, samples, z) a row adds to the rollups, None if it adds nothing.
+    """
+    if row["geohash"] is None or row["z"] is None:
+        return None
+    road_state, weight = row["road_state"], 1
+    if row["aggregate"] is not None:
+        road_state, weight = "normal", int(row["aggregate"].get("counts", {}).get("normal", 0))
+    elif row["summary"] is not None:
+        weight = int(row["summary"]["count"])
+    if weight <= 0:
+        return None
+    hour = naive_utc(row["timestamp"]).replace(minute=0, second=0, microsecond=0)
+    return hour, row["geohash"][:precision], road_state, weight, row["z"]
+
+
+def rollup_hours(start: datetime, end: datetime) -> List[datetime]:
+    """
+    Starts of the hours overlapping [start, end).
+    """
+    hour = naive_utc(start).replace(minute=0, second=0, microsecond=0)
+    end = naive_utc(end)
+    hours = []
+    while hour < end:
+        hours.append(hour)
+        hour += timedelta(hours=1)
+    return hours
+
+
+def rollup_row(row) -> dict:
+    item = dict(row)
+    count = item.pop("count")
+    z_sum, z_squares = item.pop("z_sum"), item.pop("z_squares")
+    z_mean = z_sum / count
+    return {
+        **item,
+        "count": count,
+        "z_mean": z_mean,
+        "z_std": max(0.0, z_squares / count - z_mean * z_mean) ** 0.5,
+    }
+
+
+def _ranges(starts: List[datetime], step: timedelta):
+    """
+    Sorted bucket starts merged into contiguous [start, end) ranges.
+    """
+    ranges = []
+    for start in starts:
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + step
+        else:
+            ranges.append([start, start + step])
+    return ranges